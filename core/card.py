@@ -3,36 +3,53 @@ class Card(object):
     Card stores the suit and rank of a single card
 
     Note:
-        The suit variable in a standard card game should be one of [S, H, D, C, BJ, RJ] meaning [Spades, Hearts, Diamonds, Clubs]
+        The suit variable in a standard card game should be one of [S, H, D, C] meaning [Spades, Hearts, Diamonds, Clubs]
         Similarly the rank variable should be one of [A, 2, 3, 4, 5, 6, 7, 8, 9, T, J, Q, K]
+
+        Cards are interned: there are exactly 52 immutable instances, Card(suit, rank) and the from_str and
+        from_id lookups return the same object for the same card. Equality is the identity of object,
+        the hash is precomputed. Every card has an id from 0 to 51, rank index * 4 + suit index,
+        which other modules use to index their own per card tables.
     """
 
-    suit = None
-    rank = None
+    __slots__ = ('suit', 'rank', 'id', '__hash')
     valid_suit = ['S', 'H', 'D', 'C']
     valid_rank = ['A', '2', '3', '4', '5', '6', '7', '8', '9', 'T', 'J', 'Q', 'K']
+    # All 52 cards by id, filled in below the class
+    deck = []
+    by_value = {}
+    by_text = {}
 
-    def __init__(self, suit, rank):
-        """ Initialize the suit and rank of a card
+    def __new__(cls, suit, rank):
+        """ The card with the suit and rank
 
         Args:
             suit: string, suit of the card, should be one of valid_suit
             rank: string, rank of the card, should be one of valid_rank
         """
-        self.suit = suit
-        self.rank = rank
+        try:
+            return Card.by_value[suit, rank]
+        except KeyError:
+            raise ValueError(f"Invalid card: suit {suit!r}, rank {rank!r}") from None
+
+    @staticmethod
+    def from_str(text):
+        """ The card of a hand history token of rank and suit, e.g. Ah, Td or 2S """
+        card = Card.by_text.get(text)
+        return card if card is not None else Card(text[1:2].upper(), text[:1])
+
+    @staticmethod
+    def from_id(card_id):
+        return Card.deck[card_id]
+
+    def __setattr__(self, name, value):
+        raise AttributeError("Cards are interned and immutable")
 
-    def __eq__(self, other):
-        if isinstance(other, Card):
-            return self.rank == other.rank and self.suit == other.suit
-        else:
-            # don't attempt to compare against unrelated types
-            return NotImplemented
+    def __reduce__(self):
+        return Card, (self.suit, self.rank)
 
     def __hash__(self):
-        suit_index = Card.valid_suit.index(self.suit)
-        rank_index = Card.valid_rank.index(self.rank)
-        return rank_index + 100 * suit_index
+        return self.__hash
 
     def __str__(self):
         """ Get string representation of a card.
@@ -52,3 +69,21 @@ class Card(object):
             string: the combination of suit and rank of a card. Eg: 1S, 2H, AD, BJ, RJ...
         """
         return self.suit + self.rank
+
+
+def _create_deck():
+    for rank_index, rank in enumerate(Card.valid_rank):
+        for suit_index, suit in enumerate(Card.valid_suit):
+            card = object.__new__(Card)
+            object.__setattr__(card, 'suit', suit)
+            object.__setattr__(card, 'rank', rank)
+            object.__setattr__(card, 'id', len(Card.deck))
+            # The hash of the former value type, so sets of cards keep their order
+            object.__setattr__(card, '_Card__hash', rank_index + 100 * suit_index)
+            Card.deck.append(card)
+            Card.by_value[suit, rank] = card
+            Card.by_text[rank + suit] = card
+            Card.by_text[rank + suit.lower()] = card
+
+
+_create_deck()
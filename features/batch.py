@@ -0,0 +1,277 @@
+from array import array
+from typing import Sequence, Iterator, Tuple
+
+import numpy as np
+
+from action import action_types_by_code, streets_by_code
+from core.types import ActionType, Street
+from features.features import FeaturesPack, feature_columns, CallTotalAmount, CheckTotalAmount, BetTotalAmount, \
+    RaiseTotalAmount, FoldTotalAmount, CallStreetAmount, CheckStreetAmount, BetStreetAmount, RaiseStreetAmount, \
+    FoldStreetAmount, PlayerPosition, PlayersInPot, AfterUsDecisionPlayers, PotSize, PlayerChips, PaidOnAllStreets, \
+    ShouldPayForContinue, CurrentBet
+from hand import Hand
+
+# Action types counted by the total and street counters, in the order of the columns of the counter matrices
+counted_types = np.array([t.value for t in [ActionType.CALL, ActionType.CHECK, ActionType.BET, ActionType.RAISE,
+                                            ActionType.FOLD]], dtype=np.uint8)
+total_counters = [CallTotalAmount, CheckTotalAmount, BetTotalAmount, RaiseTotalAmount, FoldTotalAmount]
+street_counters = [CallStreetAmount, CheckStreetAmount, BetStreetAmount, RaiseStreetAmount, FoldStreetAmount]
+SMALLBLIND, BIGBLIND = ActionType.SMALLBLIND.value, ActionType.BIGBLIND.value
+CALL, BET, RAISE, FOLD = ActionType.CALL.value, ActionType.BET.value, ActionType.RAISE.value, ActionType.FOLD.value
+
+# Player ids of an ActionLog are bytes, a player of the batch is hand * players_width + player id
+players_width = 256
+
+# The built in columns of FeaturesPack, features registered later are collected one hand at a time
+batch_columns = list(feature_columns)
+batch_features_names = FeaturesPack.features_names()
+# Features which __compute vectorizes
+vectorized_features = frozenset(total_counters + street_counters + [
+    PlayerPosition, PlayersInPot, AfterUsDecisionPlayers, PotSize, PlayerChips, PaidOnAllStreets,
+    ShouldPayForContinue, CurrentBet])
+
+
+def segment_cumsum(values: np.ndarray, starts: np.ndarray, initial: np.ndarray = None) -> np.ndarray:
+    """
+    Running sums of values restarted at every start, initial is added before the first value of a segment.
+    Values are added strictly left to right like the python loop of FeaturesPack does,
+    so the sums are bitwise equal to it, which a global cumsum minus segment offsets is not.
+    """
+    if not len(values):
+        return values.copy()
+    positions = np.arange(len(values))
+    segments = np.cumsum(starts) - 1
+    firsts = positions[starts]
+    offsets = positions - firsts[segments]
+    table = np.zeros((len(firsts), offsets.max() + 2))
+    if initial is not None:
+        table[:, 0] = initial
+    table[segments, offsets + 1] = values
+    np.cumsum(table, axis=1, out=table)
+    return table[segments, offsets + 1]
+
+
+def shift(values: np.ndarray, firsts: np.ndarray, fill) -> np.ndarray:
+    """ Value of the previous element, fill for the first element of every group """
+    previous = np.empty_like(values)
+    previous[1:] = values[:-1]
+    previous[firsts] = fill
+    return previous
+
+
+def forward_index(mask: np.ndarray) -> np.ndarray:
+    """ Index of the last element where mask is set up to and including every element, -1 before the first """
+    return np.maximum.accumulate(np.where(mask, np.arange(len(mask)), -1))
+
+
+class BatchFeaturesPack(object):
+    """
+    FeaturesPack columns of all decisions of the given players in many hands at once.
+    Action logs of the hands are concatenated and every feature is computed with numpy over the whole batch,
+    values are identical to collecting the actions of every hand one by one through FeaturesPack.
+    Rows are ordered like extract_features produces them: by hand, player and action.
+    """
+
+    def __init__(self, hands: Sequence[Hand], player_names: Sequence[Sequence[str]]):
+        assert {column.feature_type for column in batch_columns} == vectorized_features, \
+            "Built in feature columns and vectorized features differ"
+        self.__hands = hands
+        player_ids, action_types, streets, bet_sizes = array('B'), array('B'), array('B'), array('d')
+        lengths = []
+        followed, ranks, chips = [], [], []
+        # Seat of every player of the action logs in the order of FeaturesPack.order_players, -1 without a seat
+        seats, seat_offsets, seat_counts = [], [], []
+        for h, hand in enumerate(hands):
+            log = hand.actions
+            player_ids.extend(log.player_ids)
+            action_types.extend(log.action_types)
+            streets.extend(log.streets)
+            bet_sizes.extend(log.bet_sizes)
+            lengths.append(len(log))
+            hand_seats = {player.nick: seat for seat, player in enumerate(FeaturesPack.order_players(hand.players))}
+            seat_offsets.append(len(seats))
+            seats.extend(hand_seats.get(player_name, -1) for player_name in log.players)
+            seat_counts.append(len(hand_seats))
+            for rank, player_name in enumerate(player_names[h]):
+                if player_name in log.players:
+                    followed.append(h * players_width + log.players.index(player_name))
+                    ranks.append(rank)
+                    chips.append(hand.players[player_name].chips)
+        self.__seats = np.array(seats, dtype=np.int64)
+        self.__seat_offsets = np.array(seat_offsets, dtype=np.int64)
+        self.__seat_counts = np.array(seat_counts, dtype=np.int64)
+        self.__hand = np.repeat(np.arange(len(hands)), np.array(lengths, dtype=np.int64))
+        self.__player_ids = np.frombuffer(player_ids, dtype=np.uint8) if player_ids else np.zeros(0, np.uint8)
+        self.__action_types = np.frombuffer(action_types, dtype=np.uint8) if action_types else np.zeros(0, np.uint8)
+        self.__streets = np.frombuffer(streets, dtype=np.uint8) if streets else np.zeros(0, np.uint8)
+        self.__bet_sizes = np.frombuffer(bet_sizes, dtype=np.float64) if bet_sizes else np.zeros(0)
+        # Sorted for searchsorted lookups of players
+        followed_order = np.argsort(np.array(followed, dtype=np.int64), kind='stable')
+        self.__followed = np.array(followed, dtype=np.int64)[followed_order]
+        self.__ranks = np.array(ranks, dtype=np.int64)[followed_order]
+        self.__chips = np.array(chips, dtype=np.float64)[followed_order]
+        self.__compute()
+
+    def __len__(self):
+        return len(self.__rows)
+
+    @staticmethod
+    def features_names():
+        """ Columns of rows, the same as FeaturesPack has without registered extra features """
+        return list(batch_features_names)
+
+    def __compute(self):
+        n = len(self.__action_types)
+        positions = np.arange(n)
+        hand, types, bets = self.__hand, self.__action_types, self.__bet_sizes
+        players = hand * players_width + self.__player_ids
+
+        hand_first = np.ones(n, dtype=bool)
+        hand_first[1:] = hand[1:] != hand[:-1]
+        street_first = hand_first.copy()
+        street_first[1:] |= self.__streets[1:] != self.__streets[:-1]
+        hand_start = np.maximum.accumulate(np.where(hand_first, positions, 0))
+        street_start = np.maximum.accumulate(np.where(street_first, positions, 0))
+
+        # Actions of a player on a street, in the order they were made
+        order = np.argsort(players * 8 + self.__streets, kind='stable')
+        sorted_players = players[order]
+        player_first = np.ones(n, dtype=bool)
+        player_first[1:] = sorted_players[1:] != sorted_players[:-1]
+        player_street_first = player_first.copy()
+        player_street_first[1:] |= self.__streets[order][1:] != self.__streets[order][:-1]
+        sorted_types, sorted_bets = types[order], bets[order]
+
+        def unsort(values):
+            result = np.empty_like(values)
+            result[order] = values
+            return result
+
+        # CurrentBet.get_player_bet: blinds, bets and raises set the street bet of a player, calls add to it
+        sets = np.isin(sorted_types, [SMALLBLIND, BIGBLIND, BET, RAISE])
+        adds = (sorted_types == CALL) | sets
+        player_bet = segment_cumsum(np.where(adds, sorted_bets, 0.), player_street_first | sets)
+        player_bet_before = unsort(shift(player_bet, player_street_first, 0.))
+
+        # Chips put in the pot by the action, the same for PotSize and PlayerChips
+        pays = np.isin(types, [SMALLBLIND, BIGBLIND, CALL, BET])
+        cost = np.where(pays, bets, 0.)
+        raises = types == RAISE
+        cost[raises] = bets[raises] - player_bet_before[raises]
+
+        pot = segment_cumsum(cost, hand_first)
+        pot_before = shift(pot, hand_first, 0.)
+
+        # PlayerChips starts from the stack, only the stacks of followed players are known
+        followed_index = np.searchsorted(self.__followed, sorted_players)
+        followed_index[followed_index == len(self.__followed)] = 0
+        is_followed = self.__followed[followed_index] == sorted_players if len(self.__followed) else \
+            np.zeros(n, dtype=bool)
+        initial_chips = np.where(is_followed, self.__chips[followed_index] if len(self.__chips) else 0., 0.)
+        stack = segment_cumsum(-cost[order], player_first, initial_chips[player_first])
+        stack_before = unsort(shift(stack, player_first, initial_chips[player_first]))
+        initial_chips = unsort(initial_chips)
+
+        # MoneyPaidOnCurrentStreet: raises set the amount, blinds, calls and bets add to it
+        paid_sets = sorted_types == RAISE
+        paid_adds = paid_sets | np.isin(sorted_types, [SMALLBLIND, BIGBLIND, CALL, BET])
+        paid = segment_cumsum(np.where(paid_adds, sorted_bets, 0.), player_street_first | paid_sets)
+        paid_before = unsort(shift(paid, player_street_first, 0.))
+
+        # CurrentBet: size of the last blind, bet, raise or call on the street
+        last_bet = shift(forward_index(np.isin(types, [SMALLBLIND, BIGBLIND, BET, RAISE, CALL])), hand_first, -1)
+        current_bet = np.where(last_bet >= street_start, bets[np.maximum(last_bet, 0)], 0.)
+
+        # PlayerPosition: index on the street of the first action of the player
+        first_action = np.maximum.accumulate(np.where(player_street_first, positions, 0))
+        position = unsort(order[first_action]) - street_start
+
+        # PlayersInPot: calls, bets and raises put a player in the pot, folds take him out
+        in_pot_types = np.isin(sorted_types, [CALL, BET, RAISE, FOLD])
+        last_in_pot = forward_index(in_pot_types)
+        player_start = np.maximum.accumulate(np.where(player_first, positions, 0))
+        in_pot = np.where(last_in_pot >= player_start, sorted_types[np.maximum(last_in_pot, 0)] != FOLD, False)
+        in_pot = in_pot.astype(np.int64)
+        changes = unsort(in_pot - shift(in_pot, player_first, 0))
+        players_in_pot = np.cumsum(changes) - changes
+        players_in_pot -= players_in_pot[hand_start]
+
+        # Action counters on all streets and on the current street
+        counted = (types[:, None] == counted_types[None, :]).astype(np.int64)
+        counts = np.cumsum(counted, axis=0) - counted
+        total_counts = counts - counts[hand_start]
+        street_counts = counts - counts[street_start]
+
+        decisions = np.isin(players, self.__followed) & ~np.isin(types, [SMALLBLIND, BIGBLIND])
+        rows = positions[decisions]
+        row_ranks = self.__ranks[np.searchsorted(self.__followed, players[rows])] if len(rows) else rows
+        rows = rows[np.lexsort((rows, row_ranks, hand[rows]))]
+        self.__rows = rows
+
+        big_blind = np.array([h.big_blind for h in self.__hands], dtype=np.float64)[hand[rows]]
+        values = {
+            PlayerPosition: position[rows],
+            PlayersInPot: players_in_pot[rows],
+            AfterUsDecisionPlayers: self.__after_us(rows, types, hand_first, street_start),
+            PotSize: pot_before[rows],
+            PlayerChips: stack_before[rows],
+            PaidOnAllStreets: initial_chips[rows] - stack_before[rows],
+            ShouldPayForContinue: current_bet[rows] - paid_before[rows],
+            CurrentBet: current_bet[rows],
+        }
+        for i, (total_counter, street_counter) in enumerate(zip(total_counters, street_counters)):
+            values[total_counter] = total_counts[rows, i]
+            values[street_counter] = street_counts[rows, i]
+        self.__bet_sizes_row = bets[rows] / big_blind
+        self.__columns = [values[column.feature_type] / big_blind if column.in_big_blinds
+                          else values[column.feature_type] for column in batch_columns]
+
+    def __after_us(self, rows: np.ndarray, types: np.ndarray, hand_first: np.ndarray,
+                   street_start: np.ndarray) -> np.ndarray:
+        """ AfterUsDecisionPlayers: players without a fold seated after us up to the last bettor of the street """
+        n = len(types)
+        if not len(rows):
+            return np.zeros(0, dtype=np.int64)
+        hand = self.__hand
+        seat = self.__seats[self.__seat_offsets[hand] + self.__player_ids] if n else np.zeros(0, dtype=np.int64)
+        width = self.__seat_counts.max()
+        folds = np.zeros((n, width), dtype=np.int32)
+        seated_folds = (types == FOLD) & (seat >= 0)
+        folds[np.arange(n)[seated_folds], seat[seated_folds]] = 1
+        folded = np.cumsum(folds, axis=0) - folds
+        folded = (folded[rows] - folded[np.maximum.accumulate(np.where(hand_first, np.arange(n), 0))[rows]]) > 0
+
+        last_bettor = shift(forward_index(np.isin(types, [BIGBLIND, BET, RAISE])), hand_first, -1)[rows]
+        our_seat = seat[rows]
+        finish_seat = np.where(last_bettor >= street_start[rows], seat[np.maximum(last_bettor, 0)], -1)
+        finish_seat = np.where(finish_seat >= 0, finish_seat, our_seat)
+        players_count = self.__seat_counts[hand[rows]][:, None]
+        # Distance round the table from us to the finish seat, all the way round when it is our seat
+        distance = (finish_seat - our_seat)[:, None] % players_count
+        distance = np.where(distance == 0, players_count, distance)
+        after_us = (np.arange(width)[None, :] - our_seat[:, None]) % players_count
+        between = (after_us >= 1) & (after_us < distance) & (np.arange(width)[None, :] < players_count)
+        return (between & ~folded).sum(axis=1)
+
+    @property
+    def hand_indexes(self) -> np.ndarray:
+        """ Index of the hand of every row """
+        return self.__hand[self.__rows]
+
+    def rows(self) -> Iterator[Tuple[int, str, Street, list]]:
+        """
+        Hand index, player name, street and the FeaturesPack part of the row:
+        hand_id, player_name, street, action, player_bet_size and collect_features()
+        """
+        hands = self.__hand[self.__rows].tolist()
+        player_ids = self.__player_ids[self.__rows].tolist()
+        streets = self.__streets[self.__rows].tolist()
+        action_types = self.__action_types[self.__rows].tolist()
+        columns = [column.tolist() for column in self.__columns]
+        for h, player_id, street, action_type, bet_size, *values in zip(hands, player_ids, streets, action_types,
+                                                                        self.__bet_sizes_row.tolist(), *columns):
+            hand = self.__hands[h]
+            player_name = hand.actions.players[player_id]
+            street = streets_by_code[street]
+            yield h, player_name, street, [hand.hand_id, player_name, street.name,
+                                           action_types_by_code[action_type].name, bet_size] + values
@@ -1,7 +1,73 @@
-from typing import List
+from functools import lru_cache
+from typing import List, Tuple, FrozenSet
 
 from core.card import Card
 
+# Column order of the rank and suit counts of Board
+ranks = 'AKQJT98765432'
+suits = 'SHDC'
+rank_indexes = {rank: i for i, rank in enumerate(ranks)}
+suit_indexes = {suit: i for i, suit in enumerate(suits)}
+# Rank bits with the deuce as bit 1, the ace is also bit 0 as the low end of the wheel
+rank_bits = {rank: 1 << (13 - i) for i, rank in enumerate(ranks)}
+straight_windows = [0b11111 << i for i in range(10)]
+# Rank and suit columns of every card by Card id
+card_ranks = [rank_indexes[card.rank] for card in Card.deck]
+card_suits = [len(ranks) + suit_indexes[card.suit] for card in Card.deck]
+
+
+def board_key(board: List[Card]) -> FrozenSet[int]:
+    return frozenset(card.id for card in board)
+
+
+def canonical_board(board: List[Card]) -> Tuple[str, ...]:
+    """
+    Key of the board which is the same for all boards equal up to a renaming of suits:
+    sorted ranks of every suit present on the board, without the suits themselves
+    """
+    suited = {}
+    for card in board:
+        suited[card.suit] = suited.get(card.suit, '') + card.rank
+    return tuple(sorted(''.join(sorted(suit_ranks, key=rank_indexes.get)) for suit_ranks in suited.values()))
+
+
+@lru_cache(maxsize=1 << 16)
+def board_counts(key: FrozenSet[int]) -> Tuple[int, ...]:
+    """ Rank counts from ace to deuce and suit counts in one pass over the board """
+    counts = [0] * (len(ranks) + len(suits))
+    for card_id in key:
+        counts[card_ranks[card_id]] += 1
+        counts[card_suits[card_id]] += 1
+    return tuple(counts)
+
+
+@lru_cache(maxsize=1 << 16)
+def board_texture(key: Tuple[str, ...]) -> Tuple[int, ...]:
+    """ Texture of a canonical board, see Board.texture_names """
+    rank_counts = {}
+    mask = 0
+    for suit_ranks in key:
+        for rank in suit_ranks:
+            rank_counts[rank] = rank_counts.get(rank, 0) + 1
+            mask |= rank_bits[rank]
+    if mask & rank_bits['A']:
+        mask |= 1
+    cards = sum(rank_counts.values())
+    max_suit = max(map(len, key), default=0)
+    # Distinct board ranks inside each five rank straight window
+    window_ranks = [bin(mask & window).count('1') for window in straight_windows]
+    return (
+        sum(1 for count in rank_counts.values() if count == 2),
+        sum(1 for count in rank_counts.values() if count >= 3),
+        max_suit,
+        int(cards >= 3 and len(key) == 1),
+        int(cards >= 2 and max_suit == 1),
+        int(max_suit >= 3),
+        max(window_ranks),
+        sum(1 for count in window_ranks if count >= 3),
+        max((14 - rank_indexes[rank] for rank in rank_counts), default=0),
+    )
+
 
 class Board(object):
     def __init__(self, board: List[Card]):
@@ -33,24 +99,28 @@ class Board(object):
             "board_clubs_amount",
         ]
 
-    def extract_features(self):
+    @staticmethod
+    def texture_names():
         return [
-            len(list(filter(lambda c: c.rank == 'A', self.board))),
-            len(list(filter(lambda c: c.rank == 'K', self.board))),
-            len(list(filter(lambda c: c.rank == 'Q', self.board))),
-            len(list(filter(lambda c: c.rank == 'J', self.board))),
-            len(list(filter(lambda c: c.rank == 'T', self.board))),
-            len(list(filter(lambda c: c.rank == '9', self.board))),
-            len(list(filter(lambda c: c.rank == '8', self.board))),
-            len(list(filter(lambda c: c.rank == '7', self.board))),
-            len(list(filter(lambda c: c.rank == '6', self.board))),
-            len(list(filter(lambda c: c.rank == '5', self.board))),
-            len(list(filter(lambda c: c.rank == '4', self.board))),
-            len(list(filter(lambda c: c.rank == '3', self.board))),
-            len(list(filter(lambda c: c.rank == '2', self.board))),
-
-            len(list(filter(lambda c: c.suit == 'S', self.board))),
-            len(list(filter(lambda c: c.suit == 'H', self.board))),
-            len(list(filter(lambda c: c.suit == 'D', self.board))),
-            len(list(filter(lambda c: c.suit == 'C', self.board)))
+            "board_pairs",
+            "board_trips",
+            "board_max_suit_amount",
+            "board_monotone",
+            "board_rainbow",
+            "board_flush_possible",
+            "board_connectedness",
+            "board_straights_possible",
+            "board_high_rank",
         ]
+
+    def extract_features(self):
+        """ Rank and suit counts, memoized by the set of board cards """
+        return list(board_counts(board_key(self.board)))
+
+    def texture_features(self):
+        """
+        Suit independent texture, memoized by the canonical board: pairs and trips, size of the largest suit,
+        monotone and rainbow flags, whether a flush is possible, the most distinct ranks within five
+        consecutive ranks, the number of straights two hole cards can complete and the highest rank, ace is 14
+        """
+        return list(board_texture(canonical_board(self.board)))
@@ -1,6 +1,8 @@
 from enum import Enum, auto
-from typing import List
-import copy
+from typing import List, Tuple, Iterable
+
+import numpy as np
+
 from core.card import Card
 
 
@@ -27,12 +29,210 @@ class DrawCombinationType(Enum):
     DOUBLE_BACKDOOR = auto()
 
 
+RANK_LOOKUP = "23456789TJQKA"
+SUIT_LOOKUP = "SCDH"
+# A card is bit rank + 16 * suit of a 64 bit mask, every suit is a 13 bit lane of ranks from deuce to ace
+LANE_WIDTH = 16
+RANKS_MASK = (1 << len(RANK_LOOKUP)) - 1
+# Rank and suit indexes and bits of every card by Card id
+card_ranks = [RANK_LOOKUP.index(card.rank) for card in Card.deck]
+card_suits = [SUIT_LOOKUP.index(card.suit) for card in Card.deck]
+card_bits = [1 << (rank + LANE_WIDTH * suit) for rank, suit in zip(card_ranks, card_suits)]
+
+
+def card_mask(cards: Iterable[Card]) -> int:
+    mask = 0
+    for card in cards:
+        mask |= card_bits[card.id]
+    return mask
+
+
+def with_low_ace(ranks: int) -> int:
+    """ Ranks shifted by one with the ace repeated below the deuce, bit i starts the straight window i """
+    return (ranks << 1) | (ranks >> (len(RANK_LOOKUP) - 1))
+
+
+def window_tables():
+    """ Tables over 13 bit rank masks used by the evaluator """
+    popcount, high_rank, straight = [], [], []
+    open_ended, three_windows, board_three_windows, gutshot_ends = [], [], [], []
+    for ranks in range(1 << len(RANK_LOOKUP)):
+        extended = with_low_ace(ranks)
+        windows = [bin(extended & (0b11111 << i)).count('1') for i in range(10)]
+        popcount.append(bin(ranks).count('1'))
+        high_rank.append(ranks.bit_length() - 1)
+        straight.append(5 in windows)
+        # Draws check the windows starting from the wheel up to nine to king, ten to ace is never a draw
+        ends = [(1 << i) | (1 << (i + 4)) for i in range(9)]
+        open_ended.append(any(windows[i] == 4 and extended & ends[i] != ends[i] for i in range(9)))
+        gutshot_ends.append(tuple(ends[i] for i in range(9) if windows[i] == 4 and extended & ends[i] == ends[i]))
+        three_windows.append(3 in windows[:9])
+        # Windows of the board alone start from the deuce
+        board_three_windows.append(any(bin(ranks & (0b11111 << i)).count('1') == 3 for i in range(8)))
+    return popcount, high_rank, straight, open_ended, three_windows, board_three_windows, gutshot_ends
+
+
+popcount, high_rank, straight, open_ended, three_windows, board_three_windows, gutshot_ends = window_tables()
+
+# Summary of the cards the categories are computed from: rank masks of ranks present at least once, twice,
+# three and four times among all cards, suit counts of all cards, the same for the board and the highest ranks
+Profile = Tuple[int, int, int, int, Tuple[int, ...], int, int, Tuple[int, ...], int, int]
+
+
+def lanes_profile(lanes: List[int]) -> Tuple[int, int, int, int]:
+    a, b, c, d = lanes
+    return (a | b | c | d,
+            (a & b) | (a & c) | (a & d) | (b & c) | (b & d) | (c & d),
+            (a & b & (c | d)) | (c & d & (a | b)),
+            a & b & c & d)
+
+
+def mask_profile(board: int, hole: int) -> Profile:
+    lanes = [((board | hole) >> (LANE_WIDTH * s)) & RANKS_MASK for s in range(len(SUIT_LOOKUP))]
+    board_lanes = [(board >> (LANE_WIDTH * s)) & RANKS_MASK for s in range(len(SUIT_LOOKUP))]
+    board_suits = tuple(popcount[lane] for lane in board_lanes)
+    board_ranks = board_lanes[0] | board_lanes[1] | board_lanes[2] | board_lanes[3]
+    hole_ranks = 0
+    for s in range(len(SUIT_LOOKUP)):
+        hole_ranks |= (hole >> (LANE_WIDTH * s)) & RANKS_MASK
+    return lanes_profile(lanes) + (tuple(popcount[lane] for lane in lanes), board_ranks, sum(board_suits),
+                                   board_suits, high_rank[hole_ranks], high_rank[board_ranks])
+
+
+def cards_profile(board: List[Card], hole: List[Card]) -> Profile:
+    """ Profile counted card by card, unlike masks it keeps repeated cards """
+    rank_counts = [0] * len(RANK_LOOKUP)
+    suits = [0] * len(SUIT_LOOKUP)
+    board_suits = [0] * len(SUIT_LOOKUP)
+    board_ranks, hole_ranks = 0, 0
+    for card in board:
+        rank = card_ranks[card.id]
+        board_ranks |= 1 << rank
+        board_suits[card_suits[card.id]] += 1
+        rank_counts[rank] += 1
+    for card in hole:
+        hole_ranks |= 1 << card_ranks[card.id]
+        rank_counts[card_ranks[card.id]] += 1
+    for card in board + hole:
+        suits[card_suits[card.id]] += 1
+    at_least = [sum(1 << rank for rank, count in enumerate(rank_counts) if count >= n) for n in range(1, 5)]
+    return tuple(at_least) + (tuple(suits), board_ranks, len(board), tuple(board_suits),
+                              high_rank[hole_ranks], high_rank[board_ranks])
+
+
+def ready_category(profile: Profile) -> ReadyCombinationType:
+    ranks, pairs, trips, quads, suits, _, _, _, hole_high, board_high = profile
+    flush = max(suits) >= 5
+    if flush and straight[ranks]:
+        # Flush and straight anywhere among the cards, not necessarily the same five
+        return ReadyCombinationType.STRAIGHT_FLUSH
+    elif quads:
+        return ReadyCombinationType.FOUR_OF_A_KIND
+    elif trips and popcount[pairs] >= 2:
+        return ReadyCombinationType.FULL_HOUSE
+    elif flush:
+        return ReadyCombinationType.FLUSH
+    elif straight[ranks]:
+        return ReadyCombinationType.STRAIGHT
+    elif trips:
+        return ReadyCombinationType.THREE_OF_A_KIND
+    elif popcount[pairs] >= 2:
+        return ReadyCombinationType.TWO_PAIR
+    elif pairs:
+        return ReadyCombinationType.ONE_PAIR
+    elif 0 < board_high < hole_high:
+        # A board of deuces has no high card
+        return ReadyCombinationType.HIGH_CARD
+    return ReadyCombinationType.AIR
+
+
+def draw_category(profile: Profile) -> DrawCombinationType:
+    ranks, pairs, _, _, suits, board_ranks, board_cards, board_suits, _, _ = profile
+    if 4 in suits:
+        return DrawCombinationType.FLUSH_DRAW
+    backdoor_straight = board_cards == 3 and not board_three_windows[board_ranks] and three_windows[ranks]
+    backdoor_flush = board_cards == 3 and 3 not in board_suits and 3 in suits
+    if backdoor_straight and backdoor_flush:
+        return DrawCombinationType.DOUBLE_BACKDOOR
+    elif open_ended[ranks]:
+        return DrawCombinationType.DOUBLE_STRAIGHT_DRAW
+    singles = with_low_ace(ranks & ~pairs)
+    if any(singles & ends == ends for ends in gutshot_ends[ranks]):
+        return DrawCombinationType.GUTSHOT
+    elif backdoor_straight:
+        return DrawCombinationType.BACKDOOR_STRAIGHT
+    elif backdoor_flush:
+        return DrawCombinationType.BACKDOOR_FLUSH
+    return DrawCombinationType.NO_DRAW_COMBINATIONS
+
+
+def evaluate(board: int, hole: int) -> Tuple[ReadyCombinationType, DrawCombinationType]:
+    """ Ready and draw categories of the board and hole cards given as card masks """
+    profile = mask_profile(board, hole)
+    return ready_category(profile), draw_category(profile)
+
+
+# The same tables as numpy arrays for the batch evaluator, gutshot ends padded with zeros
+np_popcount = np.array(popcount, dtype=np.int64)
+np_high_rank = np.array(high_rank, dtype=np.int64)
+np_straight = np.array(straight, dtype=bool)
+np_open_ended = np.array(open_ended, dtype=bool)
+np_three_windows = np.array(three_windows, dtype=bool)
+np_board_three_windows = np.array(board_three_windows, dtype=bool)
+np_gutshot_ends = np.array([ends + (0,) * (9 - len(ends)) for ends in gutshot_ends], dtype=np.int64)
+
+
+def evaluate_batch(boards: np.ndarray, holes: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Ready and draw categories of arrays of board and hole card masks as values of ReadyCombinationType
+    and DrawCombinationType, the same as evaluate gives for every pair. Masks can't hold repeated cards.
+    """
+    boards = np.asarray(boards, dtype=np.int64)
+    holes = np.asarray(holes, dtype=np.int64)
+    cards = boards | holes
+    lanes = [(cards >> (LANE_WIDTH * s)) & RANKS_MASK for s in range(len(SUIT_LOOKUP))]
+    board_lanes = [(boards >> (LANE_WIDTH * s)) & RANKS_MASK for s in range(len(SUIT_LOOKUP))]
+    hole_lanes = [(holes >> (LANE_WIDTH * s)) & RANKS_MASK for s in range(len(SUIT_LOOKUP))]
+    ranks, pairs, trips, quads = lanes_profile(lanes)
+    suits = np_popcount[np.stack(lanes)]
+    board_suits = np_popcount[np.stack(board_lanes)]
+    board_ranks = board_lanes[0] | board_lanes[1] | board_lanes[2] | board_lanes[3]
+    hole_ranks = hole_lanes[0] | hole_lanes[1] | hole_lanes[2] | hole_lanes[3]
+    board_cards = board_suits.sum(axis=0)
+    board_high = np_high_rank[board_ranks]
+
+    flush = suits.max(axis=0) >= 5
+    straights = np_straight[ranks]
+    pair_ranks = np_popcount[pairs]
+    high_card = (board_high > 0) & (board_high < np_high_rank[hole_ranks])
+    ready = np.select([flush & straights, quads != 0, (trips != 0) & (pair_ranks >= 2), flush, straights,
+                       trips != 0, pair_ranks >= 2, pairs != 0, high_card],
+                      [ReadyCombinationType.STRAIGHT_FLUSH.value, ReadyCombinationType.FOUR_OF_A_KIND.value,
+                       ReadyCombinationType.FULL_HOUSE.value, ReadyCombinationType.FLUSH.value,
+                       ReadyCombinationType.STRAIGHT.value, ReadyCombinationType.THREE_OF_A_KIND.value,
+                       ReadyCombinationType.TWO_PAIR.value, ReadyCombinationType.ONE_PAIR.value,
+                       ReadyCombinationType.HIGH_CARD.value],
+                      ReadyCombinationType.AIR.value)
+
+    backdoor_straight = (board_cards == 3) & ~np_board_three_windows[board_ranks] & np_three_windows[ranks]
+    backdoor_flush = (board_cards == 3) & ~(board_suits == 3).any(axis=0) & (suits == 3).any(axis=0)
+    singles = with_low_ace(ranks & ~pairs)
+    ends = np_gutshot_ends[ranks]
+    gutshot = ((ends != 0) & (singles[:, None] & ends == ends)).any(axis=1)
+    draw = np.select([(suits == 4).any(axis=0), backdoor_straight & backdoor_flush, np_open_ended[ranks], gutshot,
+                      backdoor_straight, backdoor_flush],
+                     [DrawCombinationType.FLUSH_DRAW.value, DrawCombinationType.DOUBLE_BACKDOOR.value,
+                      DrawCombinationType.DOUBLE_STRAIGHT_DRAW.value, DrawCombinationType.GUTSHOT.value,
+                      DrawCombinationType.BACKDOOR_STRAIGHT.value, DrawCombinationType.BACKDOOR_FLUSH.value],
+                     DrawCombinationType.NO_DRAW_COMBINATIONS.value)
+    return ready, draw
+
+
 class Combination(object):
     def __init__(self, board: List[Card], player_cards: List[Card]):
         self.__board = board
         self.__player_cards = player_cards
-        self.RANK_LOOKUP = "23456789TJQKA"
-        self.SUIT_LOOKUP = "SCDH"
+        self.__profile = None
 
     @staticmethod
     def features_names():
@@ -48,201 +248,17 @@ class Combination(object):
     def player_cards(self):
         return self.__player_cards
 
-    def ready_combination(self) -> ReadyCombinationType:
-        all_cards = self.board + self.player_cards
-        board = self.board
-        hand = self.player_cards
-        rank_counters_all = [0] * len(self.RANK_LOOKUP)
-        rank_counters_board = [0] * len(self.RANK_LOOKUP)
-        rank_counters_hand = [0] * len(self.RANK_LOOKUP)
-        suit_counters_all = [0] * len(self.SUIT_LOOKUP)
-
-        for card in hand:
-            rank_counters_hand[self.RANK_LOOKUP.index(card.rank)] += 1
-        for card in board:
-            rank_counters_board[self.RANK_LOOKUP.index(card.rank)] += 1
-        for card in all_cards:
-            rank_counters_all[self.RANK_LOOKUP.index(card.rank)] += 1
-            suit_counters_all[self.SUIT_LOOKUP.index(card.suit)] += 1
-
-        highest_player_card = self.RANK_LOOKUP.index(
-            sorted(self.player_cards, key=lambda c: self.RANK_LOOKUP.index(c.rank))[-1].rank)
-
-        sorted_board_cards = sorted(self.board, key=lambda c: self.RANK_LOOKUP.index(c.rank))
-        highest_board_card = None
-        if sorted_board_cards:
-            highest_board_card = self.RANK_LOOKUP.index(sorted_board_cards[-1].rank)
-
-        if self.__is_flush(suit_counters_all) and self.__is_straight(rank_counters_all):
-            return ReadyCombinationType.STRAIGHT_FLUSH
-        elif self.__is_four_of_a_kind(rank_counters_all):
-            return ReadyCombinationType.FOUR_OF_A_KIND
-        elif self.__is_full_house(rank_counters_all):
-            return ReadyCombinationType.FULL_HOUSE
-        elif self.__is_flush(suit_counters_all):
-            return ReadyCombinationType.FLUSH
-        elif self.__is_straight(rank_counters_all):
-            return ReadyCombinationType.STRAIGHT
-        elif self.__is_three_of_a_kind(rank_counters_all):
-            return ReadyCombinationType.THREE_OF_A_KIND
-        elif self.__is_two_pairs(rank_counters_all):
-            return ReadyCombinationType.TWO_PAIR
-        elif self.__is_one_pair(rank_counters_all):
-            return ReadyCombinationType.ONE_PAIR
-        elif self.__is_high_card(highest_player_card, highest_board_card):
-            return ReadyCombinationType.HIGH_CARD
-        return ReadyCombinationType.AIR
-
-    def __is_high_card(self, highest_player_card, highest_board_card):
-        return highest_board_card and highest_board_card < highest_player_card
-
-    def __is_four_of_a_kind(self, rank_counters):
-        for c in rank_counters:
-            if c >= 4:
-                return True
-        return False
-
-    def __is_full_house(self, rank_counters):
-        pair_ranks, set_ranks = set(), set()
-        for rank, c in enumerate(rank_counters):
-            if c >= 2:
-                pair_ranks.add(rank)
-            if c >= 3:
-                set_ranks.add(rank)
-        return len(pair_ranks.union(set_ranks)) >= 2 and len(set_ranks) > 0
-
-    def __is_flush(self, suit_counters):
-        for c in suit_counters:
-            if c >= 5:
-                return True
-        return False
-
-    def __is_straight(self, rank_counters):
-        r_c = copy.deepcopy(rank_counters)
-        r_c.insert(0, r_c[-1])
-        seq = 0
-        for c in r_c:
-            if c > 0:
-                seq += 1
-                if seq == 5:
-                    return True
+    def __get_profile(self) -> Profile:
+        if self.__profile is None:
+            board, hole = card_mask(self.board), card_mask(self.player_cards)
+            if bin(board | hole).count('1') == len(self.board) + len(self.player_cards):
+                self.__profile = mask_profile(board, hole)
             else:
-                seq = 0
-        return False
-
-    def __is_three_of_a_kind(self, rank_counters):
-        for c in rank_counters:
-            if c >= 3:
-                return True
-        return False
-
-    def __is_two_pairs(self, rank_counters):
-        p = 0
-        for c in rank_counters:
-            if c >= 2:
-                p += 1
-        return p >= 2
-
-    def __is_one_pair(self, rank_counters):
-        for c in rank_counters:
-            if c >= 2:
-                return True
-        return False
+                self.__profile = cards_profile(self.board, self.player_cards)
+        return self.__profile
+
+    def ready_combination(self) -> ReadyCombinationType:
+        return ready_category(self.__get_profile())
 
     def draw_combination(self) -> DrawCombinationType:
-        all_cards = self.board + self.player_cards
-        board = self.board
-        hand = self.player_cards
-        rank_counters_all = [0] * len(self.RANK_LOOKUP)
-        rank_counters_board = [0] * len(self.RANK_LOOKUP)
-        suit_counters_hand = [0] * len(self.SUIT_LOOKUP)
-        suit_counters_board = [0] * len(self.SUIT_LOOKUP)
-        rank_counters_hand = [0] * len(self.RANK_LOOKUP)
-        suit_counters_all = [0] * len(self.SUIT_LOOKUP)
-
-        for card in hand:
-            rank_counters_hand[self.RANK_LOOKUP.index(card.rank)] += 1
-            suit_counters_hand[self.SUIT_LOOKUP.index(card.suit)] += 1
-        for card in board:
-            rank_counters_board[self.RANK_LOOKUP.index(card.rank)] += 1
-            suit_counters_board[self.SUIT_LOOKUP.index(card.suit)] += 1
-        for card in all_cards:
-            rank_counters_all[self.RANK_LOOKUP.index(card.rank)] += 1
-            suit_counters_all[self.SUIT_LOOKUP.index(card.suit)] += 1
-
-        if self.__is_flush_draw(suit_counters_all):
-            return DrawCombinationType.FLUSH_DRAW
-        elif self.__is_backdoor_straight(rank_counters_all, rank_counters_board) and \
-                self.__is_backdoor_flush(suit_counters_all, rank_counters_board, suit_counters_board):
-            return DrawCombinationType.DOUBLE_BACKDOOR
-        elif self.__is_double_straight_draw(rank_counters_all):
-            return DrawCombinationType.DOUBLE_STRAIGHT_DRAW
-        elif self.__is_gutshot(rank_counters_all):
-            return DrawCombinationType.GUTSHOT
-        elif self.__is_backdoor_straight(rank_counters_all, rank_counters_board):
-            return DrawCombinationType.BACKDOOR_STRAIGHT
-        elif self.__is_backdoor_flush(suit_counters_all, rank_counters_board, suit_counters_board):
-            return DrawCombinationType.BACKDOOR_FLUSH
-        return DrawCombinationType.NO_DRAW_COMBINATIONS
-
-    def __is_flush_draw(self, suit_counters):
-        """флэш дро"""
-        for c in suit_counters:
-            if c == 4:
-                return True
-        return False
-
-    def __is_double_straight_draw(self, rank_counters):
-        """двусторонний стрит дро"""
-        rank_counters = [rank_counters[-1]] + rank_counters[:]
-        for i in range(len(rank_counters) - 5):
-            counter = 0
-            if rank_counters[i] == 0 or rank_counters[i + 4] == 0:
-                for j in range(5):
-                    if rank_counters[i + j]:
-                        counter += 1
-                if counter == 4:
-                    return True
-        return False
-
-    def __is_gutshot(self, rank_counters):
-        """гатшот"""
-        rank_counters = [rank_counters[-1]] + rank_counters[:]
-        for i in range(len(rank_counters) - 5):
-            counter = 0
-            if rank_counters[i] == 1 and rank_counters[i + 4] == 1:
-                for j in range(5):
-                    if rank_counters[i + j]:
-                        counter += 1
-                if counter == 4:
-                    return True
-        return False
-
-    def __is_backdoor_flush(self, suit_counters_all, rank_counter_board, suit_counters_board):
-        """бэкдор флэш дро"""
-        if sum(rank_counter_board) == 3:
-            for board_suit in suit_counters_board:
-                if board_suit == 3:
-                    return False
-            for all_suit in suit_counters_all:
-                if all_suit == 3:
-                    return True
-
-    def __is_backdoor_straight(self, rank_counters_all, rank_counters_board):
-        """бэкдор стрит дро"""
-        if sum(rank_counters_board) == 3:
-            rank_counters_all = [rank_counters_all[-1]] + rank_counters_all[:]
-            for i in range(len(rank_counters_board) - 5):
-                counter = 0
-                for j in range(5):
-                    if rank_counters_board[i + j]:
-                        counter += 1
-                if counter == 3:
-                    return False
-            for i in range(len(rank_counters_all) - 5):
-                counter = 0
-                for j in range(5):
-                    if rank_counters_all[i + j]:
-                        counter += 1
-                if counter == 3:
-                    return True
+        return draw_category(self.__get_profile())
@@ -1,4 +1,6 @@
-from collections import Counter
+import inspect
+from abc import ABC, abstractmethod
+from collections import Counter, namedtuple
 from typing import List, Dict
 
 from action import Action
@@ -6,16 +8,36 @@ from core.types import Street, ActionType
 from player import Player
 
 
-class Feature(object):
+class Feature(ABC):
+    """ A feature which misses any abstract method fails when it is registered or created """
+
+    @classmethod
+    def create(cls, pack: 'FeaturesPack') -> 'Feature':
+        """ Feature for the pack, features which depend on other features take them from pack.feature """
+        return cls()
+
+    @abstractmethod
     def street_start(self, street: Street):
-        raise NotImplemented()
+        pass
 
+    @abstractmethod
     def handle_action(self, action: Action):
-        raise NotImplemented()
+        pass
+
+    def snapshot(self):
+        """
+        Copy of the state which later actions do not change. Features with state override it and restore,
+        features derived from others have no state.
+        """
+        return None
+
+    def restore(self, state):
+        pass
 
     @property
+    @abstractmethod
     def value(self):
-        raise NotImplemented()
+        pass
 
 
 class CurrentBet(Feature):
@@ -42,6 +64,13 @@ class CurrentBet(Feature):
     def get_player_bet(self, player_name: str) -> float:
         return self.__player2bet.get(player_name, 0.0)
 
+    def snapshot(self):
+        return self.__current_bet, tuple(self.__player2bet.items())
+
+    def restore(self, state):
+        self.__current_bet, player2bet = state
+        self.__player2bet = Counter(dict(player2bet))
+
     @property
     def value(self):
         return self.__current_bet
@@ -63,6 +92,12 @@ class ActionTotalAmount(Feature):
         if action.action_type == self.__action_type:
             self.__action_amount += 1
 
+    def snapshot(self):
+        return self.__action_amount
+
+    def restore(self, state):
+        self.__action_amount = state
+
     @property
     def value(self):
         return self.__action_amount
@@ -139,6 +174,10 @@ class PlayerPosition(Feature):
     Позиция игрока за столом, sb-0, bb-1, utg-2 etc...
     """
 
+    @classmethod
+    def create(cls, pack: 'FeaturesPack') -> 'Feature':
+        return cls(pack.player_name)
+
     def __init__(self, player_name: str):
         self.__player_name = player_name
         self.__current_move = 0
@@ -153,6 +192,13 @@ class PlayerPosition(Feature):
             self.__player2position[action.player] = self.__current_move
         self.__current_move += 1
 
+    def snapshot(self):
+        return self.__current_move, tuple(self.__player2position.items())
+
+    def restore(self, state):
+        self.__current_move, player2position = state
+        self.__player2position = dict(player2position)
+
     @property
     def value(self):
         return self.__player2position.get(self.__player_name, self.__current_move)
@@ -163,6 +209,10 @@ class PotSize(Feature):
     Текущий размер банка
     """
 
+    @classmethod
+    def create(cls, pack: 'FeaturesPack') -> 'Feature':
+        return cls(pack.feature(CurrentBet))
+
     def __init__(self, current_bet: CurrentBet):
         self.__pot_size = 0
         self.__current_bet = current_bet
@@ -176,6 +226,12 @@ class PotSize(Feature):
         if action.action_type == ActionType.RAISE:
             self.__pot_size += action.bet_size - self.__current_bet.get_player_bet(action.player)
 
+    def snapshot(self):
+        return self.__pot_size
+
+    def restore(self, state):
+        self.__pot_size = state
+
     @property
     def value(self):
         return self.__pot_size
@@ -196,6 +252,12 @@ class LastRaisePlayer(Feature):
         if action.action_type in [ActionType.BIGBLIND, ActionType.BET, ActionType.RAISE]:
             self.__last_raise_player = action.player
 
+    def snapshot(self):
+        return self.__last_raise_player
+
+    def restore(self, state):
+        self.__last_raise_player = state
+
     @property
     def value(self) -> str:
         return self.__last_raise_player
@@ -216,6 +278,12 @@ class FoldPlayers(Feature):
         if action.action_type in [ActionType.FOLD]:
             self.__fold_players.add(action.player)
 
+    def snapshot(self):
+        return frozenset(self.__fold_players)
+
+    def restore(self, state):
+        self.__fold_players = set(state)
+
     @property
     def value(self) -> List[str]:
         return list(self.__fold_players)
@@ -238,6 +306,12 @@ class PlayersInPot(Feature):
         elif action.action_type in [ActionType.CALL, ActionType.BET, ActionType.RAISE]:
             self.__players_in_pot.add(action.player)
 
+    def snapshot(self):
+        return frozenset(self.__players_in_pot)
+
+    def restore(self, state):
+        self.__players_in_pot = set(state)
+
     @property
     def value(self):
         return len(self.__players_in_pot)
@@ -248,6 +322,10 @@ class PlayerChips(Feature):
     Сколько на текущий момент у нас денег
     """
 
+    @classmethod
+    def create(cls, pack: 'FeaturesPack') -> 'Feature':
+        return cls(pack.player_name, pack.players[pack.player_name].chips, pack.feature(CurrentBet))
+
     def __init__(self, player_name: str, chips: float, current_bet: CurrentBet):
         self.__player_name = player_name
         self.__chips = chips
@@ -264,6 +342,12 @@ class PlayerChips(Feature):
             elif action.action_type == ActionType.RAISE:
                 self.__chips -= (action.bet_size - self.__current_bet.get_player_bet(action.player))
 
+    def snapshot(self):
+        return self.__chips
+
+    def restore(self, state):
+        self.__chips = state
+
     @property
     def value(self):
         return self.__chips
@@ -274,6 +358,10 @@ class PaidOnAllStreets(Feature):
     Сколько денег мы уже заплатили на ВСЕХ улицах
     """
 
+    @classmethod
+    def create(cls, pack: 'FeaturesPack') -> 'Feature':
+        return cls(pack.players[pack.player_name].chips, pack.feature(PlayerChips))
+
     def __init__(self, init_chips: float, player_chips: PlayerChips):
         self.__init_chips = init_chips
         self.__player_chips = player_chips
@@ -294,6 +382,10 @@ class MoneyPaidOnCurrentStreet(Feature):
     Сколько денег мы уже внесли в рамках текущей улицы
     """
 
+    @classmethod
+    def create(cls, pack: 'FeaturesPack') -> 'Feature':
+        return cls(pack.player_name)
+
     def __init__(self, player_name: str):
         self.__player_name = player_name
         self.__amount = 0.0
@@ -308,6 +400,12 @@ class MoneyPaidOnCurrentStreet(Feature):
             elif action.action_type == ActionType.RAISE:
                 self.__amount = action.bet_size
 
+    def snapshot(self):
+        return self.__amount
+
+    def restore(self, state):
+        self.__amount = state
+
     @property
     def value(self):
         return self.__amount
@@ -318,6 +416,10 @@ class ShouldPayForContinue(Feature):
     Сколько денег мы должны довнести чтобы продолжить играть
     """
 
+    @classmethod
+    def create(cls, pack: 'FeaturesPack') -> 'Feature':
+        return cls(pack.feature(MoneyPaidOnCurrentStreet), pack.feature(CurrentBet))
+
     def __init__(self, paid_on_curr_street: MoneyPaidOnCurrentStreet, current_bet: CurrentBet):
         self.__paid_on_curr_street = paid_on_curr_street
         self.__current_bet = current_bet
@@ -338,78 +440,111 @@ class AfterUsDecisionPlayers(Feature):
     Количество игроков которые примут решение после того как примем мы
     """
 
+    @classmethod
+    def create(cls, pack: 'FeaturesPack') -> 'Feature':
+        return cls(pack.player_name, FeaturesPack.order_players(pack.players), pack.feature(LastRaisePlayer))
+
     def __init__(self,
                  player_name: str,
                  ordered_players: List[Player],
-                 fold_players: FoldPlayers,
                  last_raise_player: LastRaisePlayer):
-        self.__player_name = player_name
-        self.__ordered_players = ordered_players
-        self.__fold_players = fold_players
+        # Players are bits of masks in the order of their seats, folded players are cleared from __active
+        self.__seats = {player.nick: seat for seat, player in enumerate(ordered_players)}
+        self.__players_count = len(ordered_players)
+        self.__our_seat = FeaturesPack.get_our_position(ordered_players, player_name)
+        self.__active = (1 << self.__players_count) - 1
         self.__last_raise_player = last_raise_player
 
     def street_start(self, street: Street):
         pass
 
     def handle_action(self, action: Action):
-        pass
+        if action.action_type == ActionType.FOLD and action.player in self.__seats:
+            self.__active &= ~(1 << self.__seats[action.player])
+
+    def snapshot(self):
+        return self.__active
+
+    def restore(self, state):
+        self.__active = state
 
     @property
     def value(self):
-        players_count = len(self.__ordered_players)
-        our_pos = FeaturesPack.get_our_position(self.__ordered_players, self.__player_name) % players_count
-        next_pos = (our_pos + 1) % players_count
-        answer = 0
-        if self.__last_raise_player.value is None:
-            finish_player = self.__ordered_players[our_pos].nick
+        """
+        Active players after us up to the last bettor of the street, or all the way round to us without a bettor.
+        The last bettor and we are not counted, a bettor without a seat counts as no bettor
+        """
+        our_seat = self.__our_seat
+        finish_seat = self.__seats.get(self.__last_raise_player.value, our_seat)
+        # Seats strictly after ours and before the finish one, going round the table
+        if finish_seat > our_seat:
+            between = (1 << finish_seat) - (1 << (our_seat + 1))
         else:
-            finish_player = self.__last_raise_player.value
-
-        while self.__ordered_players[next_pos].nick != finish_player:
-            if self.__ordered_players[next_pos].nick not in self.__fold_players.value:
-                answer += 1
-            next_pos = (next_pos + 1) % len(self.__ordered_players)
-
-        if self.__ordered_players[next_pos].nick not in self.__fold_players.value and \
-                self.__ordered_players[next_pos].nick != self.__ordered_players[our_pos].nick and \
-                self.__ordered_players[next_pos].nick != finish_player:
-            answer += 1
-        return answer
+            between = ((1 << self.__players_count) - (1 << (our_seat + 1))) | ((1 << finish_seat) - 1)
+        return bin(self.__active & between).count('1')
+
+
+FeatureColumn = namedtuple('FeatureColumn', ['name', 'feature_type', 'in_big_blinds'])
+
+# Columns of FeaturesPack in output order, amounts of chips are divided by the big blind
+feature_columns: List[FeatureColumn] = [
+    FeatureColumn('total_call_amount', CallTotalAmount, False),
+    FeatureColumn('total_check_amount', CheckTotalAmount, False),
+    FeatureColumn('total_bet_amount', BetTotalAmount, False),
+    FeatureColumn('total_raise_amount', RaiseTotalAmount, False),
+    FeatureColumn('total_fold_amount', FoldTotalAmount, False),
+
+    FeatureColumn('street_call_amount', CallStreetAmount, False),
+    FeatureColumn('street_check_amount', CheckStreetAmount, False),
+    FeatureColumn('street_bet_amount', BetStreetAmount, False),
+    FeatureColumn('street_raise_amount', RaiseStreetAmount, False),
+    FeatureColumn('street_fold_amount', FoldStreetAmount, False),
+
+    FeatureColumn('player_position', PlayerPosition, False),
+    FeatureColumn('players_in_pot', PlayersInPot, False),
+    FeatureColumn('after_us_decision_players', AfterUsDecisionPlayers, False),
+    FeatureColumn('current_pot_size', PotSize, True),
+    FeatureColumn('player_stack_size', PlayerChips, True),
+    FeatureColumn('paid_on_all_streets', PaidOnAllStreets, True),
+    FeatureColumn('pay_for_continue_play', ShouldPayForContinue, True),
+    FeatureColumn('current_bet', CurrentBet, True),
+]
+
+
+def register_feature(name: str, feature_type: type, in_big_blinds: bool = False):
+    """ Appends a column to every FeaturesPack, the feature is created by feature_type.create """
+    if any(column.name == name for column in feature_columns):
+        raise ValueError(f"Feature column {name} is already registered")
+    if inspect.isabstract(feature_type):
+        missing = ', '.join(sorted(feature_type.__abstractmethods__))
+        raise TypeError(f"{feature_type.__name__} does not implement {missing}")
+    feature_columns.append(FeatureColumn(name, feature_type, in_big_blinds))
 
 
 class FeaturesPack(object):
+    """
+    Features of one player collected action by action. Features are created once per pack from feature_columns
+    together with the features they depend on. A feature handles every action before the features it depends on,
+    so it sees their state before the action, e.g. PotSize reads the bet of the raiser before CurrentBet updates it.
+    """
+
     def __init__(self, players: Dict[str, Player], player_name: str, big_blind: float):
+        self.players = players
         self.player_name = player_name
         self.big_blind = big_blind
-        current_bet = CurrentBet()
-        player_chips = PlayerChips(player_name, players[player_name].chips, current_bet)
-        paid_on_curr_street = MoneyPaidOnCurrentStreet(player_name)
-        fold_players = FoldPlayers()
-        last_raise_player = LastRaisePlayer()
-        self.__pack = [
-            CallTotalAmount(),
-            CheckTotalAmount(),
-            BetTotalAmount(),
-            RaiseTotalAmount(),
-            FoldTotalAmount(),
-
-            CallStreetAmount(),
-            CheckStreetAmount(),
-            BetStreetAmount(),
-            RaiseStreetAmount(),
-            FoldStreetAmount(),
-
-            PlayerPosition(player_name),
-            PlayersInPot(),
-            PotSize(current_bet),
-            player_chips,
-            PaidOnAllStreets(players[player_name].chips, player_chips),
-            current_bet,
-            paid_on_curr_street,
-            ShouldPayForContinue(paid_on_curr_street, current_bet),
-            last_raise_player,
-            fold_players,
-        ]
+        self.__features: Dict[type, Feature] = {}
+        self.__created: List[Feature] = []
+        self.__columns = [(self.feature(column.feature_type), column.in_big_blinds) for column in feature_columns]
+        self.__pack = self.__created[::-1]
+        self.__values = [0] * len(self.__columns)
+
+    def feature(self, feature_type: type) -> Feature:
+        """ The instance of feature_type in the pack, created on first request """
+        if feature_type not in self.__features:
+            feature = feature_type.create(self)
+            self.__features[feature_type] = feature
+            self.__created.append(feature)
+        return self.__features[feature_type]
 
     @staticmethod
     def features_names():
@@ -419,27 +554,7 @@ class FeaturesPack(object):
             'street',
             'action',
             'player_bet_size',
-
-            'total_call_amount',
-            'total_check_amount',
-            'total_bet_amount',
-            'total_raise_amount',
-            'total_fold_amount',
-
-            'street_call_amount',
-            'street_check_amount',
-            'street_bet_amount',
-            'street_raise_amount',
-            'street_fold_amount',
-
-            'player_position',
-            'players_in_pot',
-            'current_pot_size',
-            'player_stack_size',
-            'paid_on_all_streets',
-            'pay_for_continue_play',
-            'current_bet',
-        ]
+        ] + [column.name for column in feature_columns]
 
     @staticmethod
     def order_players(players_dict: Dict):
@@ -464,29 +579,21 @@ class FeaturesPack(object):
         for feature in self.__pack:
             feature.street_start(street)
 
-    def collect_features(self):
-        return [
-            self.__collect_feature(CallTotalAmount),
-            self.__collect_feature(CheckTotalAmount),
-            self.__collect_feature(BetTotalAmount),
-            self.__collect_feature(RaiseTotalAmount),
-            self.__collect_feature(FoldTotalAmount),
-
-            self.__collect_feature(CallStreetAmount),
-            self.__collect_feature(CheckStreetAmount),
-            self.__collect_feature(BetStreetAmount),
-            self.__collect_feature(RaiseStreetAmount),
-            self.__collect_feature(FoldStreetAmount),
-
-            self.__collect_feature(PlayerPosition),  # Player position
-            self.__collect_feature(PlayersInPot),  # Players in pot
-            self.__collect_feature(PotSize) / self.big_blind,  # Current pot size
-            self.__collect_feature(PlayerChips) / self.big_blind,  # Current player stack size
-            self.__collect_feature(PaidOnAllStreets) / self.big_blind,  # Paid on all streets
-            self.__collect_feature(ShouldPayForContinue) / self.big_blind,  # How much we should pay for continue play
-            self.__collect_feature(CurrentBet) / self.big_blind
-        ]
-
-    def __collect_feature(self, feature_type: type):
-        x = list(filter(lambda f: isinstance(f, feature_type), self.__pack))[0]
-        return x.value
+    def snapshot(self) -> tuple:
+        """
+        State of all features as a tuple of immutable values, e.g. before trying a hypothetical action.
+        Taking and restoring a snapshot costs a few copies of per player dicts, no actions are replayed.
+        """
+        return tuple(feature.snapshot() for feature in self.__pack)
+
+    def restore(self, snapshot: tuple):
+        """ Returns all features to the snapshot, the same snapshot can be restored any number of times """
+        for feature, state in zip(self.__pack, snapshot):
+            feature.restore(state)
+
+    def collect_features(self, out: list = None) -> list:
+        """ Values of feature_columns, written into out when it is given, e.g. a preallocated row """
+        values = self.__values if out is None else out
+        for i, (feature, in_big_blinds) in enumerate(self.__columns):
+            values[i] = feature.value / self.big_blind if in_big_blinds else feature.value
+        return list(values) if out is None else out
@@ -8,18 +8,26 @@ turn_start = '** Dealing turn **'
 river_start = '** Dealing river **'
 showdown = '** Summary **'
 
-hand_regexp = re.compile('#Game No : [0-9]')
+hand_regexp = re.compile('^#Game No : ([0-9]+)')
+game_type_regexp = re.compile(r"^[$€£]?(\d+(?:\.\d+)?)/[$€£]?(\d+(?:\.\d+)?) Blinds (No Limit Holdem|Pot Limit Omaha)")
+hand_date_regexp = re.compile(r"\*\*\* (\d{1,2}) (\d{1,2}) (\d{4}) ")
 seat_regexp = re.compile('^Seat (\d): (.*) \( (.\d+(\.\d+)?) \)') # +
 button_regexp = re.compile('^Seat (\d) is the button')  # +
 small_blind_regexp = re.compile('(.*) posts small blind.*')  # +
 big_blind_regexp = re.compile('(.*) posts big blind.*') # +
-preflop_cards_regexp = re.compile("(.*) shows \[(.*)\]") # +
+preflop_cards_regexp = re.compile("^Dealt to (.*) \[(.*)\]")
 fold_action_regexp = re.compile("^(.*) folds") #  +
 call_action_regexp = re.compile("(.*) calls [$€£]?(\d+(\.\d+)?)")
 bet_action_regexp = re.compile("(.*) bets [$€£]?(\d+(\.\d+)?)")
 raise_action_regexp = re.compile("(.*) raises [$€£]?(\d+(\.\d+)?)")
 check_action_regexp = re.compile("(.*) checks")
+# Same named groups as the PokerStars action_regexp, raises report the chips added rather than the total
+action_regexp = re.compile(r"^(?P<player>.*) (?:(?P<fold>folds)|(?P<check>checks)"
+                           r"|calls \[[$€£]?(?P<call>[\d,]+(?:\.\d+)?)\]"
+                           r"|bets \[[$€£]?(?P<bet>[\d,]+(?:\.\d+)?)\]"
+                           r"|raises \[[$€£]?(?P<raise>[\d,]+(?:\.\d+)?)\])")
 flop_cards_regexp = re.compile('\*\* Dealing flop \*\* \[(.*)\]')   # +
 turn_card_regexp = re.compile('\*\* Dealing turn \*\* \[(.*)\]')    # +
 river_card_regexp = re.compile('\*\* Dealing river \*\* \[(.*)\]')  # +
-summary_total_pot_regexp = re.compile('(.*) collected [$€£]?(\d+(\.\d+)?)')
\ No newline at end of file
+summary_total_pot_regexp = re.compile('^(.*) collected \[ ?[$€£]?([\d,]+(?:\.\d+)?) ?\]')
+showdown_player_cards_regexp = re.compile("^(.*) shows \[(.*)\]")
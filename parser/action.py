@@ -1,6 +1,10 @@
 import math
+import sys
+from array import array
+from collections.abc import Sequence
+from typing import List, Dict
 
-from core.types import ActionType
+from core.types import ActionType, Street
 
 
 class Action(object):
@@ -34,3 +38,108 @@ class Action(object):
 
     def __str__(self):
         return f"{self.player}, {self.action_type}, {self.bet_size}"
+
+
+action_types_by_code = {action_type.value: action_type for action_type in ActionType}
+streets_by_code = {street.value: street for street in Street}
+
+
+class ActionLog(object):
+    """
+    Compact storage of all actions of one hand: parallel typed arrays of player index, action type, street
+    and bet size, plus a table of interned player names. Actions of a street occupy a contiguous range.
+    """
+
+    def __init__(self):
+        self.__players: List[str] = []
+        self.__player_index: Dict[str, int] = {}
+        self.__player_ids = array('B')
+        self.__action_types = array('B')
+        self.__streets = array('B')
+        # float64, float32 would change bet sizes like 4.3 and the features computed from them
+        self.__bet_sizes = array('d')
+
+    def __len__(self):
+        return len(self.__action_types)
+
+    @classmethod
+    def from_arrays(cls, players: List[str], player_ids: array, action_types: array, streets: array,
+                    bet_sizes: array) -> 'ActionLog':
+        """ Log over already built arrays, which it takes ownership of """
+        log = cls()
+        log.__players = [sys.intern(player) for player in players]
+        log.__player_index = {player: i for i, player in enumerate(log.__players)}
+        log.__player_ids, log.__action_types, log.__streets, log.__bet_sizes = player_ids, action_types, streets, \
+            bet_sizes
+        return log
+
+    @property
+    def players(self) -> List[str]:
+        return self.__players
+
+    @property
+    def player_ids(self) -> array:
+        return self.__player_ids
+
+    @property
+    def action_types(self) -> array:
+        return self.__action_types
+
+    @property
+    def streets(self) -> array:
+        return self.__streets
+
+    @property
+    def bet_sizes(self) -> array:
+        return self.__bet_sizes
+
+    def append(self, player: str, action_type: ActionType, street: Street, bet_size: float = 0):
+        if player not in self.__player_index:
+            self.__player_index[player] = len(self.__players)
+            self.__players.append(sys.intern(player))
+        self.__player_ids.append(self.__player_index[player])
+        self.__action_types.append(action_type.value)
+        self.__streets.append(street.value)
+        self.__bet_sizes.append(bet_size)
+
+    def action(self, i: int) -> Action:
+        return Action(self.__players[self.__player_ids[i]], action_types_by_code[self.__action_types[i]],
+                      self.__bet_sizes[i])
+
+    def view(self, start: int = 0, end: int = None) -> 'ActionView':
+        return ActionView(self, start, len(self) if end is None else end)
+
+
+class ActionView(Sequence):
+    """
+    Read only list-like view over a range of an ActionLog, Action objects are created on access
+    """
+
+    def __init__(self, log: ActionLog, start: int, end: int):
+        self.__log = log
+        self.__start = start
+        self.__end = end
+
+    def __len__(self):
+        return self.__end - self.__start
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError("action index out of range")
+        return self.__log.action(self.__start + i)
+
+    def __iter__(self):
+        for i in range(self.__start, self.__end):
+            yield self.__log.action(i)
+
+    def __eq__(self, other):
+        if isinstance(other, (list, tuple, ActionView)):
+            return len(self) == len(other) and all(a == b for a, b in zip(self, other))
+        return NotImplemented
+
+    def __repr__(self):
+        return repr(list(self))
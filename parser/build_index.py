@@ -0,0 +1,53 @@
+import logging
+import multiprocessing
+import os
+from typing import List
+
+import click as click
+
+from hand import Hand
+from main import setup_logging, list_archive_members
+from parser import Parser
+from pool import WorkItem, open_item
+from search_index import SearchIndex, IndexEntry
+
+log = logging.getLogger(__name__)
+
+
+def index_item(item: WorkItem) -> List[IndexEntry]:
+    entries = []
+    with open_item(item) as lines:
+        for hand_lines in Parser.split_hands(lines):
+            try:
+                entries.append(SearchIndex.entry(Hand(item.dir, hand_lines), hand_lines, item.dir))
+            except Exception as e:
+                log.debug(e)
+    return entries
+
+
+def build_index_impl(input_dir: str, index_path: str, processes: int = None):
+    items = []
+    for dirname in sorted(os.listdir(input_dir)):
+        path = os.path.join(input_dir, dirname)
+        if os.path.isdir(path):
+            items.extend(list_archive_members(path))
+    index = SearchIndex(index_path)
+    added = 0
+    with multiprocessing.Pool(processes) as pool:
+        for entries in pool.imap_unordered(index_item, items):
+            added += index.add(entries)
+    log.info(f"Indexed {added} new hands from {len(items)} files, {len(index)} hands in the index")
+    index.close()
+
+
+@click.command()
+@click.option('--input_dir', type=click.Path(), help='Path to directory with directories of zip archives')
+@click.option('--index_path', type=click.Path(), help='Path to sqlite search index, created if missing')
+@click.option('--n_jobs', type=int, default=None, help='Number of worker processes, all cores by default')
+def build_index(input_dir, index_path, n_jobs):
+    setup_logging()
+    build_index_impl(input_dir, index_path, n_jobs)
+
+
+if __name__ == '__main__':
+    build_index()
@@ -0,0 +1,107 @@
+import codecs
+from typing import BinaryIO, Iterator, Tuple, List
+
+boms = [
+    (codecs.BOM_UTF32_LE, 'utf-32-le'),
+    (codecs.BOM_UTF32_BE, 'utf-32-be'),
+    (codecs.BOM_UTF8, 'utf-8'),
+    (codecs.BOM_UTF16_LE, 'utf-16-le'),
+    (codecs.BOM_UTF16_BE, 'utf-16-be'),
+]
+
+
+def sniff_encoding(head: bytes, fallback: str = 'cp1252') -> Tuple[str, int]:
+    """
+    Encoding of a file and the length of its BOM, sniffed from the first block.
+    Files without a BOM are utf-8 if the block decodes as utf-8, otherwise the fallback codepage,
+    which covers euro and pound signs of histories saved by old clients. LineReader switches to the fallback
+    later if the first non-ASCII bytes of the file are not utf-8.
+    """
+    for bom, encoding in boms:
+        if head.startswith(bom):
+            return encoding, len(bom)
+    try:
+        # The block may end in the middle of a multibyte character
+        codecs.getincrementaldecoder('utf-8')().decode(head, final=False)
+        return 'utf-8', 0
+    except UnicodeDecodeError:
+        return fallback, 0
+
+
+def split_lines(text: str) -> List[str]:
+    """
+    Lines of text without line endings. Only \\n, \\r\\n and \\r end a line, unlike str.splitlines
+    which also splits on form feeds, \\x1c-\\x1e, \\x85 and unicode separators, e.g. inside nicknames.
+    """
+    if '\r' in text:
+        text = text.replace('\r\n', '\n').replace('\r', '\n')
+    lines = text.split('\n')
+    if lines[-1] == '':
+        lines.pop()
+    return lines
+
+
+class LineReader(object):
+    """
+    Reads lines of a hand history file in large binary blocks. The encoding is sniffed once per file,
+    \\r\\n and \\r line endings are normalized and lines are yielded without line endings.
+    A file sniffed as utf-8 without a BOM, whose first block is ASCII only, turns out to be in the fallback
+    encoding if the first non-ASCII bytes don't decode as utf-8.
+    Undecodable bytes are replaced instead of failing the whole file and counted in replaced.
+    raw is any binary file object with read(size): a file, a zip member or an mmap.
+    """
+
+    def __init__(self, raw: BinaryIO, block_size: int = 1 << 20, fallback: str = 'cp1252'):
+        self.__raw = raw
+        self.__block_size = block_size
+        # At least as long as the longest BOM
+        self.__head = raw.read(max(block_size, 4))
+        self.__encoding, self.__bom_length = sniff_encoding(self.__head, fallback)
+        self.__fallback = fallback
+        # Bytes decoded so far are all ASCII, which reads the same in utf-8 and in the fallback
+        self.__ascii = True
+        self.__decoder = None
+        self.__replaced = 0
+
+    @property
+    def encoding(self) -> str:
+        return self.__encoding
+
+    @property
+    def replaced(self) -> int:
+        return self.__replaced
+
+    def __decode(self, block: bytes, final: bool = False) -> str:
+        try:
+            text = self.__decoder.decode(block, final)
+        except UnicodeDecodeError:
+            # Only utf-8 without a BOM is decoded strictly, a failed decode keeps the state of the decoder
+            state = self.__decoder.getstate()
+            if self.__ascii:
+                self.__encoding = self.__fallback
+                self.__decoder = codecs.getincrementaldecoder(self.__fallback)(errors='replace')
+            else:
+                self.__decoder = codecs.getincrementaldecoder(self.__encoding)(errors='replace')
+                self.__decoder.setstate(state)
+            text = self.__decoder.decode(block, final)
+        self.__ascii = self.__ascii and block.isascii()
+        self.__replaced += text.count('\ufffd')
+        return text
+
+    def __iter__(self) -> Iterator[str]:
+        strict = self.__encoding == 'utf-8' and not self.__bom_length
+        self.__decoder = codecs.getincrementaldecoder(self.__encoding)(errors='strict' if strict else 'replace')
+        block = self.__head[self.__bom_length:]
+        self.__head = None
+        tail = ''
+        while block:
+            text = tail + self.__decode(block)
+            # \r at the end of a block may be the first half of \r\n
+            carry = ''
+            if text.endswith('\r'):
+                text, carry = text[:-1], '\r'
+            end = max(text.rfind('\n'), text.rfind('\r')) + 1
+            yield from split_lines(text[:end])
+            tail = text[end:] + carry
+            block = self.__raw.read(self.__block_size)
+        yield from split_lines(tail + self.__decode(b'', final=True))
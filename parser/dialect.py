@@ -0,0 +1,293 @@
+import datetime
+import importlib
+from abc import ABC, abstractmethod
+from collections import namedtuple
+from typing import List, Dict, Optional, Tuple, Iterator
+
+import regexp as pokerstars
+from core.types import ActionType, GameType
+
+poker888 = importlib.import_module('888poker.regexp')
+
+HandHeader = namedtuple('HandHeader', ['hand_id', 'site', 'game_type', 'date', 'small_blind', 'big_blind', 'button'])
+
+action_group_types = {
+    'fold': ActionType.FOLD,
+    'check': ActionType.CHECK,
+    'call': ActionType.CALL,
+    'bet': ActionType.BET,
+    'raise': ActionType.RAISE,
+}
+
+game_types = {
+    "Hold'em No Limit": GameType.HOLDEM_NO_LIMIT,
+    "Omaha Pot Limit": GameType.OMAHA_POT_LIMIT,
+    "No Limit Holdem": GameType.HOLDEM_NO_LIMIT,
+    "Pot Limit Omaha": GameType.OMAHA_POT_LIMIT,
+}
+
+
+def parse_amount(value: str) -> float:
+    return float(value.replace(',', ''))
+
+
+class Dialect(ABC):
+    """
+    Hand history format of one site: street markers, compiled regexps and the rules which differ between sites.
+    Parser and Hand read raw lines only through a dialect, a new site is supported by registering one in dialects.
+    Amounts are normalized to the PokerStars conventions: calls and bets are the chips added, raises the total.
+    A dialect which misses any abstract method fails when it is created, not in the middle of a parse.
+    """
+    name = None
+    marker_prefix = None
+    # Every hand starts with a line beginning with this prefix, used to split files on bytes
+    hand_start_prefix = None
+
+    def __init__(self, rules):
+        self.rules = rules
+        self.currency = rules.currency
+        self.preflop_start = rules.preflop_start
+        self.first_flop_start = getattr(rules, 'first_flop_start', None)
+        self.flop_start = rules.flop_start
+        self.turn_start = rules.turn_start
+        self.river_start = rules.river_start
+        self.showdown = rules.showdown
+        self.street_markers = tuple(marker for marker in (self.preflop_start, self.first_flop_start, self.flop_start,
+                                                          self.turn_start, self.river_start, self.showdown) if marker)
+        self.seat_regexp = rules.seat_regexp
+        self.small_blind_regexp = rules.small_blind_regexp
+        self.big_blind_regexp = rules.big_blind_regexp
+        self.preflop_cards_regexp = rules.preflop_cards_regexp
+        self.action_regexp = rules.action_regexp
+
+    def __reduce__(self):
+        # Dialects hold modules of regexps, pickled hands refer to the registered dialect by name
+        return dialect_by_name, (self.name,)
+
+    @abstractmethod
+    def is_hand_start(self, line: str) -> bool:
+        pass
+
+    def is_separator(self, line: str) -> bool:
+        """ Lines between hands which are not part of any hand """
+        return False
+
+    @abstractmethod
+    def game_type(self, lines: List[str]) -> GameType:
+        """ Cheap game type check of raw lines, used to filter hands before parsing """
+
+    @abstractmethod
+    def seats_start(self, lines: List[str]) -> int:
+        pass
+
+    @abstractmethod
+    def parse_header(self, lines: List[str]) -> HandHeader:
+        pass
+
+    def match_action(self, line: str) -> Optional[Tuple[str, ActionType, float]]:
+        """ Player, action type and bet size of an action line, None for any other line """
+        match = self.action_regexp.match(line)
+        if not match:
+            return None
+        action_type = action_group_types[match.lastgroup]
+        if action_type in (ActionType.FOLD, ActionType.CHECK):
+            return match.group('player'), action_type, 0
+        return match.group('player'), action_type, parse_amount(match.group(match.lastgroup))
+
+    def street_actions(self, lines: List[str], start: int, end: int,
+                       invested: Dict[str, float]) -> Iterator[Tuple[str, ActionType, float]]:
+        """ Actions of lines[start:end], invested holds chips put in the pot on this street so far per player """
+        for i in range(start, end):
+            fields = self.match_action(lines[i])
+            if fields:
+                yield fields
+
+    @staticmethod
+    def split_cards(cards: str) -> List[str]:
+        return cards.split()
+
+    @abstractmethod
+    def flop_cards(self, line: str) -> List[str]:
+        pass
+
+    @abstractmethod
+    def turn_cards(self, line: str, flop_cards: List[str]) -> List[str]:
+        """ Board after the turn, four cards """
+
+    @abstractmethod
+    def river_cards(self, line: str, turn_cards: List[str]) -> List[str]:
+        """ Board after the river, five cards """
+
+    @abstractmethod
+    def parse_summary(self, lines: List[str], start: int) -> Tuple[float, float, List[Tuple[str, List[str]]]]:
+        """ Total pot, rake and cards shown at showdown per player, start is the offset of the summary marker """
+
+
+class PokerStarsDialect(Dialect):
+    name = 'PokerStars'
+    marker_prefix = '*** '
+    hand_start_prefix = 'PokerStars '
+
+    def __init__(self):
+        super().__init__(pokerstars)
+
+    def is_hand_start(self, line: str) -> bool:
+        return pokerstars.game_type_regexp.match(line) is not None
+
+    def is_separator(self, line: str) -> bool:
+        return pokerstars.hand_regexp.match(line) is not None
+
+    def game_type(self, lines: List[str]) -> GameType:
+        if "Hold'em No Limit" in lines[0]:
+            return GameType.HOLDEM_NO_LIMIT
+        elif "Omaha Pot Limit" in lines[0]:
+            return GameType.OMAHA_POT_LIMIT
+        return GameType.UNKNOWN
+
+    def seats_start(self, lines: List[str]) -> int:
+        return 2
+
+    def parse_header(self, lines: List[str]) -> HandHeader:
+        line = lines[0]
+        match = pokerstars.game_type_regexp.search(line)
+        date_match = pokerstars.hand_date_regexp.search(line)
+        small_blind, big_blind = match.group(3).split('/')
+        return HandHeader(hand_id=match.group(1),
+                          site=line.split(' ', 1)[0],
+                          game_type=game_types.get(match.group(2), GameType.UNKNOWN),
+                          date=datetime.date(*map(int, date_match.groups())) if date_match else None,
+                          small_blind=float(small_blind.strip(self.currency)),
+                          big_blind=float(big_blind.strip(self.currency)),
+                          button=pokerstars.button_regexp.search(lines[1]).group(1))
+
+    def flop_cards(self, line: str) -> List[str]:
+        return pokerstars.flop_cards_regexp.search(line).group(1).split(' ')
+
+    def turn_cards(self, line: str, flop_cards: List[str]) -> List[str]:
+        match = pokerstars.turn_cards_regexp.search(line)
+        return match.group(1).split(' ') + [match.group(2)]
+
+    def river_cards(self, line: str, turn_cards: List[str]) -> List[str]:
+        match = pokerstars.river_cards_regexp.search(line)
+        return match.group(1).split(' ') + [match.group(2)]
+
+    def parse_summary(self, lines: List[str], start: int) -> Tuple[float, float, List[Tuple[str, List[str]]]]:
+        iteration = start + 1
+        match = pokerstars.summary_total_pot_regexp.search(lines[iteration])
+        total_pot, rake = float(match.group(1)), float(match.group(3))
+        iteration += 1
+        if lines[iteration].startswith('Board'):
+            iteration += 1
+        showdown_cards = []
+        while iteration < len(lines) and lines[iteration].startswith('Seat'):
+            match = pokerstars.showdown_player_cards_regexp.search(lines[iteration])
+            iteration += 1
+            if not match:
+                continue
+            player, cards = match.group(2), match.group(3).split()
+            if player and cards:
+                for suffix in (' (big blind)', ' (small blind)', ' (button)'):
+                    if player.endswith(suffix):
+                        player = player[:-len(suffix)]
+                showdown_cards.append((player, cards))
+        return total_pot, rake, showdown_cards
+
+
+class Poker888Dialect(Dialect):
+    """
+    888poker: the game type line follows the game number line, cards are comma separated,
+    board lines show only the new cards and raises report the chips added by the raise.
+    The summary has no total pot or rake, the pot is the sum of collected amounts and the rake is unknown.
+    """
+    name = '888poker'
+    marker_prefix = '** '
+    hand_start_prefix = '#Game No : '
+
+    def __init__(self):
+        super().__init__(poker888)
+
+    def is_hand_start(self, line: str) -> bool:
+        return poker888.hand_regexp.match(line.lstrip('\ufeff')) is not None
+
+    def game_type(self, lines: List[str]) -> GameType:
+        for line in lines[1:4]:
+            match = poker888.game_type_regexp.match(line)
+            if match:
+                return game_types[match.group(3)]
+        return GameType.UNKNOWN
+
+    def seats_start(self, lines: List[str]) -> int:
+        for i in range(1, len(lines)):
+            if poker888.seat_regexp.match(lines[i]):
+                return i
+        return len(lines)
+
+    def parse_header(self, lines: List[str]) -> HandHeader:
+        game_match, date_match, button = None, None, None
+        for line in lines[1:self.seats_start(lines)]:
+            game_match = game_match or poker888.game_type_regexp.match(line)
+            date_match = date_match or poker888.hand_date_regexp.search(line)
+            button_match = poker888.button_regexp.match(line)
+            if button_match:
+                button = button_match.group(1)
+        day, month, year = map(int, date_match.groups()) if date_match else (None, None, None)
+        return HandHeader(hand_id=poker888.hand_regexp.match(lines[0].lstrip('\ufeff')).group(1),
+                          site=self.name,
+                          game_type=game_types[game_match.group(3)],
+                          date=datetime.date(year, month, day) if date_match else None,
+                          small_blind=float(game_match.group(1)),
+                          big_blind=float(game_match.group(2)),
+                          button=button)
+
+    def street_actions(self, lines: List[str], start: int, end: int,
+                       invested: Dict[str, float]) -> Iterator[Tuple[str, ActionType, float]]:
+        for player, action_type, bet_size in super().street_actions(lines, start, end, invested):
+            if bet_size:
+                invested[player] = round(invested.get(player, 0) + bet_size, 2)
+                if action_type == ActionType.RAISE:
+                    bet_size = invested[player]
+            yield player, action_type, bet_size
+
+    @staticmethod
+    def split_cards(cards: str) -> List[str]:
+        return cards.replace(',', ' ').split()
+
+    def flop_cards(self, line: str) -> List[str]:
+        return self.split_cards(poker888.flop_cards_regexp.search(line).group(1))
+
+    def turn_cards(self, line: str, flop_cards: List[str]) -> List[str]:
+        return flop_cards + self.split_cards(poker888.turn_card_regexp.search(line).group(1))
+
+    def river_cards(self, line: str, turn_cards: List[str]) -> List[str]:
+        return turn_cards + self.split_cards(poker888.river_card_regexp.search(line).group(1))
+
+    def parse_summary(self, lines: List[str], start: int) -> Tuple[float, float, List[Tuple[str, List[str]]]]:
+        total_pot = 0.
+        showdown_cards = []
+        for line in lines[start + 1:]:
+            match = poker888.summary_total_pot_regexp.match(line)
+            if match:
+                total_pot += parse_amount(match.group(2))
+                continue
+            match = poker888.showdown_player_cards_regexp.match(line)
+            if match:
+                showdown_cards.append((match.group(1), self.split_cards(match.group(2))))
+        return round(total_pot, 2), 0., showdown_cards
+
+
+dialects = {
+    PokerStarsDialect.name: PokerStarsDialect(),
+    Poker888Dialect.name: Poker888Dialect(),
+}
+
+
+def dialect_by_name(name: str) -> Dialect:
+    return dialects[name]
+
+
+def detect_dialect(line: str) -> Optional[Dialect]:
+    """ Dialect of the hand history which starts with the line, None if no site recognizes it """
+    for dialect in dialects.values():
+        if dialect.is_hand_start(line):
+            return dialect
+    return None
@@ -0,0 +1,84 @@
+import pickle
+import sqlite3
+import zlib
+from typing import List, Dict, Tuple
+
+from hand import Hand
+from hand_codec import encode_hand, decode_hand
+
+
+def pack(value) -> bytes:
+    return zlib.compress(pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))
+
+
+def unpack(data: bytes):
+    return pickle.loads(zlib.decompress(data))
+
+
+class FeatureCache(object):
+    """
+    Content addressed cache of the feature pipeline in sqlite, keyed by the hash of raw hand lines.
+    It holds parsed hands in the binary hand format and the rows of every feature group per hand and player,
+    tagged with the group version.
+    A group whose version changed, or a new group, is computed from the cached parsed hand and joined
+    with the cached groups, so adding a column does not recompute or reparse anything else.
+    The same hand exported into several files is featurized once, its hand_id is not part of the cached rows.
+    Several workers may share the cache, every batch is written in one transaction.
+    """
+
+    def __init__(self, path: str):
+        self.__connection = sqlite3.connect(path, timeout=60)
+        self.__connection.execute("PRAGMA journal_mode=WAL")
+        self.__connection.execute("PRAGMA synchronous=NORMAL")
+        with self.__connection:
+            self.__connection.execute("CREATE TABLE IF NOT EXISTS hands ("
+                                      "hash BLOB PRIMARY KEY, hand BLOB) WITHOUT ROWID")
+            self.__connection.execute("CREATE TABLE IF NOT EXISTS features (hash BLOB, player TEXT, "
+                                      "feature_group TEXT, version TEXT, rows BLOB, "
+                                      "PRIMARY KEY (hash, player, feature_group, version)) WITHOUT ROWID")
+
+    def hands(self, keys: List[bytes], batch_size: int = 500) -> Dict[bytes, Hand]:
+        """ Parsed hands by content hash, hands which are not cached are missing """
+        unique_keys = list(set(keys))
+        hands = {}
+        for i in range(0, len(unique_keys), batch_size):
+            batch = unique_keys[i:i + batch_size]
+            for key, hand in self.__connection.execute(
+                    f"SELECT hash, hand FROM hands WHERE hash IN ({','.join('?' * len(batch))})", batch):
+                hands[key] = decode_hand(hand)
+        return hands
+
+    def features(self, keys: List[bytes], players: List[List[str]], versions: Dict[str, str],
+                 batch_size: int = 500) -> Dict[Tuple[bytes, str, str], List[list]]:
+        """ Cached rows of the players of every hand by hand hash, player and group, for current group versions """
+        wanted = {(key, player_name) for key, hand_players in zip(keys, players) for player_name in hand_players}
+        unique_keys = list({key for key, player_name in wanted})
+        features = {}
+        for i in range(0, len(unique_keys), batch_size):
+            batch = unique_keys[i:i + batch_size]
+            for key, player_name, group, version, rows in self.__connection.execute(
+                    f"SELECT hash, player, feature_group, version, rows FROM features "
+                    f"WHERE hash IN ({','.join('?' * len(batch))})", batch):
+                if versions.get(group) == version and (key, player_name) in wanted:
+                    features[key, player_name, group] = unpack(rows)
+        return features
+
+    def add(self, hands: List[Tuple[bytes, Hand]], features: List[Tuple[bytes, str, str, str, List[list]]]):
+        """ Stores parsed hands and rows of feature groups, rows of older versions of the groups are replaced """
+        if not hands and not features:
+            return
+        with self.__connection:
+            self.__connection.executemany("INSERT OR IGNORE INTO hands VALUES (?, ?)",
+                                          ((key, encode_hand(hand)) for key, hand in hands))
+            self.__connection.executemany("DELETE FROM features WHERE hash = ? AND player = ? AND feature_group = ?",
+                                          ((key, player_name, group) for key, player_name, group, version, rows
+                                           in features))
+            self.__connection.executemany("INSERT INTO features VALUES (?, ?, ?, ?, ?)",
+                                          ((key, player_name, group, version, pack(rows))
+                                           for key, player_name, group, version, rows in features))
+
+    def __len__(self):
+        return self.__connection.execute("SELECT COUNT(*) FROM hands").fetchone()[0]
+
+    def close(self):
+        self.__connection.close()
@@ -1,10 +1,17 @@
-from typing import List
+import zlib
+from collections import namedtuple
+from typing import List, FrozenSet, Iterable
 
+from action import streets_by_code
 from core.types import Street, ActionType
+from dialect import detect_dialect
+from feature_cache import FeatureCache
+from features.batch import BatchFeaturesPack
 from features.board import Board
 from features.combinations import Combination
 from features.features import FeaturesPack
 from hand import Hand, GameType
+from player_stats import PlayerStats
 
 
 def extract_features_for_player(hand: Hand, player_name: str):
@@ -30,25 +37,232 @@ def extract_features_for_player(hand: Hand, player_name: str):
     return features
 
 
-def extract_features(hand: Hand, nicknames: List[str]):
+def followed_players(hand: Hand, nicknames: FrozenSet[str]) -> List[str]:
+    """ Followed players with known cards, features are extracted only for them """
+    return [player_name for player_name, player in hand.players.items()
+            if player_name in nicknames and player.player_cards]
+
+
+def extract_features(hand: Hand, nicknames: FrozenSet[str]):
+    features = []
+    for player_name in followed_players(hand, nicknames):
+        features.extend(extract_features_for_player(hand, player_name))
+    return features
+
+
+def street_board_cards(hand: Hand, street: Street):
+    return {Street.PREFLOP: [], Street.FLOP: hand.flop_cards, Street.TURN: hand.turn_cards,
+            Street.RIVER: hand.river_cards}[street]
+
+
+blind_codes = (ActionType.SMALLBLIND.value, ActionType.BIGBLIND.value)
+
+
+def decision_streets(hand: Hand, player_name: str) -> List[Street]:
+    """ Street of every decision of the player, one per row of extract_features_for_player """
+    log = hand.actions
+    if player_name not in log.players:
+        return []
+    player_id = log.players.index(player_name)
+    return [streets_by_code[street] for player, action_type, street in zip(log.player_ids, log.action_types,
+                                                                          log.streets)
+            if player == player_id and action_type not in blind_codes]
+
+
+def extract_pack_features(hand: Hand, player_name: str) -> List[list]:
+    """ FeaturesPack part of the rows of extract_features_for_player """
+    features = []
+    pack = FeaturesPack(hand.players, player_name, hand.big_blind)
+    for street, actions in [(Street.PREFLOP, hand.preflop_actions), (Street.FLOP, hand.flop_actions),
+                            (Street.TURN, hand.turn_actions), (Street.RIVER, hand.river_actions)]:
+        pack.street_start(street)
+        for action in actions:
+            if action.player == player_name and action.action_type not in [ActionType.SMALLBLIND, ActionType.BIGBLIND]:
+                features.append([hand.hand_id, player_name, street.name, action.action_type.name,
+                                 action.bet_size / hand.big_blind] + pack.collect_features())
+            pack.collect_action(action)
+    return features
+
+
+def pack_group(hands: List[Hand], players: List[List[str]]) -> List[List[List[list]]]:
+    """
+    FeaturesPack columns for all hands at once. Features registered in FeaturesPack beyond the built in ones
+    are not vectorized, then hands go one by one.
+    """
+    if BatchFeaturesPack.features_names() != FeaturesPack.features_names():
+        return [[[row[2:] for row in extract_pack_features(hand, player_name)] for player_name in hand_players]
+                for hand, hand_players in zip(hands, players)]
+    features = [{player_name: [] for player_name in hand_players} for hand_players in players]
+    for h, player_name, street, row in BatchFeaturesPack(hands, players).rows():
+        features[h][player_name].append(row[2:])
+    return [list(hand_features.values()) for hand_features in features]
+
+
+def board_group(hands: List[Hand], players: List[List[str]]) -> List[List[List[list]]]:
+    """ Board columns depend only on the street, they are computed once per street of a hand """
     features = []
-    for player_name, player in hand.players.items():
-        if player_name in nicknames and player.player_cards:
-            features.extend(extract_features_for_player(hand, player_name))
+    for hand, hand_players in zip(hands, players):
+        boards = {}
+        hand_features = []
+        for player_name in hand_players:
+            rows = []
+            for street in decision_streets(hand, player_name):
+                if street not in boards:
+                    boards[street] = Board(street_board_cards(hand, street)).extract_features()
+                rows.append(boards[street])
+            hand_features.append(rows)
+        features.append(hand_features)
+    return features
+
+
+def combination_group(hands: List[Hand], players: List[List[str]]) -> List[List[List[list]]]:
+    features = []
+    for hand, hand_players in zip(hands, players):
+        hand_features = []
+        for player_name in hand_players:
+            combinations = {}
+            rows = []
+            for street in decision_streets(hand, player_name):
+                if street not in combinations:
+                    comb = Combination(street_board_cards(hand, street), hand.players[player_name].player_cards)
+                    combinations[street] = [comb.ready_combination().name]
+                rows.append(combinations[street])
+            hand_features.append(rows)
+        features.append(hand_features)
+    return features
+
+
+# Columns of a row after hand_id and player_name, computed and cached by group.
+# extract computes rows of every followed player of every hand: hand -> player -> rows.
+# Bump the version when values of a group change, a change of its columns is detected from the names.
+FeatureGroup = namedtuple('FeatureGroup', ['name', 'version', 'features_names', 'extract'])
+
+feature_groups = [
+    FeatureGroup('pack', 1, lambda: FeaturesPack.features_names()[2:], pack_group),
+    FeatureGroup('board', 1, Board.features_names, board_group),
+    FeatureGroup('combination', 1, Combination.features_names, combination_group),
+]
+
+
+def group_version(group: FeatureGroup) -> str:
+    return f"{group.version}:{zlib.crc32(','.join(group.features_names()).encode()):08x}"
+
+
+def extract_features_batch(hands: List[Hand], nicknames: FrozenSet[str], cache: FeatureCache = None) -> List[list]:
+    """
+    Same rows as extract_features for every hand, each feature group is computed for all hands at once.
+    With a cache, groups cached for the content of a hand and a player are not computed again,
+    and hands which miss a group are taken parsed from the cache instead of parsing their actions.
+    """
+    players = [followed_players(hand, nicknames) for hand in hands]
+    versions = {group.name: group_version(group) for group in feature_groups}
+    keys = [hand.content_hash for hand in hands]
+    cached = cache.features(keys, players, versions) if cache is not None else {}
+    # Hands with the same content, e.g. exported into several files, are computed once
+    unique = list({key: h for h, key in reversed(list(enumerate(keys)))}.values())
+    missing_hands = {group.name: [h for h in sorted(unique) if any(
+        (keys[h], player_name, group.name) not in cached for player_name in players[h])] for group in feature_groups}
+    needed = sorted({h for missing in missing_hands.values() for h in missing})
+    cached_hands = cache.hands([keys[h] for h in needed]) if cache is not None else {}
+    parsed = {}
+    new_hands, new_features = [], []
+    for h in needed:
+        parsed[h] = cached_hands.get(keys[h])
+        if parsed[h] is None:
+            parsed[h] = hands[h]
+            parsed[h].parse_actions()
+            new_hands.append((keys[h], parsed[h]))
+    for group in feature_groups:
+        missing = missing_hands[group.name]
+        if not missing:
+            continue
+        group_features = group.extract([parsed[h] for h in missing], [players[h] for h in missing])
+        for h, hand_features in zip(missing, group_features):
+            for player_name, rows in zip(players[h], hand_features):
+                cached[keys[h], player_name, group.name] = rows
+                new_features.append((keys[h], player_name, group.name, versions[group.name], rows))
+    if cache is not None:
+        cache.add(new_hands, new_features)
+    features = []
+    for h, hand in enumerate(hands):
+        hand_features = []
+        for player_name in players[h]:
+            groups = [cached[keys[h], player_name, group.name] for group in feature_groups]
+            hand_features.extend([hand.hand_id, player_name] + [value for group_row in group_rows
+                                                               for value in group_row]
+                                 for group_rows in zip(*groups))
+        features.append(hand_features)
     return features
 
 
 class FeatureExtractor(object):
-    def __init__(self, nicknames: List[str]):
-        self.__nicknames = nicknames
+    """
+    With player_stats every row also gets statistics of the opponents at the table, from hands before this one.
+    With cache batches reuse feature groups and parsed hands of hands with the same content from earlier runs.
+    """
+
+    def __init__(self, nicknames: Iterable[str], player_stats: PlayerStats = None, cache: FeatureCache = None):
+        self.__nicknames = frozenset(nicknames)
+        self.__player_stats = player_stats
+        self.__cache = cache
+
+    @staticmethod
+    def features_names(player_stats: bool = False):
+        names = FeaturesPack.features_names() + Board.features_names() + Combination.features_names()
+        if player_stats:
+            names += PlayerStats.features_names()
+        return names
 
     @property
     def nicknames(self):
         return self.__nicknames
 
+    @property
+    def player_stats(self) -> PlayerStats:
+        return self.__player_stats
+
+    @property
+    def cache(self) -> FeatureCache:
+        return self.__cache
+
+    def accepts_lines(self, lines: List[str]) -> bool:
+        """
+        Cheap check of raw hand lines before the hand is parsed:
+        only no limit hold'em hands with at least one followed player at the table are accepted
+        """
+        dialect = detect_dialect(lines[0])
+        if not self.__nicknames or dialect is None or dialect.game_type(lines) != GameType.HOLDEM_NO_LIMIT:
+            return False
+        for line in lines[dialect.seats_start(lines):]:
+            if not line.startswith('Seat '):
+                break
+            match = dialect.seat_regexp.match(line)
+            if match and match.group(2) in self.__nicknames:
+                return True
+        return False
+
     def extract_features(self, hand: Hand):
         features = []
         if hand.game_type != GameType.HOLDEM_NO_LIMIT:
             return features
         features.extend(extract_features(hand, self.nicknames))
+        return self.__add_player_stats(hand, features)
+
+    def extract_features_batch(self, hands: List[Hand]) -> List[list]:
+        """ Features of every hand, the same as extract_features of each of them """
+        holdem = [hand for hand in hands if hand.game_type == GameType.HOLDEM_NO_LIMIT]
+        features = dict(zip(map(id, holdem), extract_features_batch(holdem, self.nicknames, self.__cache)))
+        return [self.__add_player_stats(hand, features.get(id(hand), [])) for hand in hands]
+
+    def __add_player_stats(self, hand: Hand, features: List[list]) -> List[list]:
+        """ Appends pooled statistics of the opponents, looked up once per followed player """
+        if self.__player_stats is None:
+            return features
+        opponents_stats = {}
+        for row in features:
+            player_name = row[1]
+            if player_name not in opponents_stats:
+                opponents_stats[player_name] = self.__player_stats.features(
+                    [opponent for opponent in hand.players if opponent != player_name], hand.date)
+            row.extend(opponents_stats[player_name])
         return features
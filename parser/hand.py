@@ -1,33 +1,81 @@
-from typing import List, Dict
+import datetime
+import hashlib
+import sys
+from typing import List, Dict, Optional
 
-from action import Action
+from action import Action, ActionLog, ActionView
 from core.card import Card
-from core.types import ActionType, GameType
+from core.types import ActionType, GameType, Street
+from dialect import Dialect, HandHeader, dialects, detect_dialect
 from player import Player
-from regexp import *
 
+street_codes = [(street, street.value) for street in Street]
 
-def create_card(val: str):
-    rank, suit = val[0], val[1].upper()
-    return Card(suit, rank)
 
+def parse_action(line: str) -> Optional[Action]:
+    fields = dialects['PokerStars'].match_action(line)
+    return Action(*fields) if fields else None
 
-def create_cards(cards: List[str]):
-    return [create_card(c) for c in cards]
+
+def create_card(val: str) -> Card:
+    return Card.from_str(val)
+
+
+def create_cards(cards: List[str]) -> List[Card]:
+    return list(map(Card.from_str, cards))
 
 
 class Hand(object):
+    """
+    Parsed hand history. The header and seats are parsed on construction,
+    actions, board cards and summary are parsed by parse_actions and parse_summary.
+    Hand parses everything right away, LazyHand postpones it until the matching property is accessed.
+    """
+    lazy = False
+
     @property
     def hand_id(self):
         return f"{self.__id_prefix}_{self.__id}"
 
     @property
-    def game_type(self):
-        if self.__game_type == "Hold'em No Limit":
-            return GameType.HOLDEM_NO_LIMIT
-        elif self.__game_type == "Omaha Pot Limit":
-            return GameType.OMAHA_POT_LIMIT
-        return GameType.UNKNOWN
+    def id_prefix(self) -> str:
+        return self.__id_prefix
+
+    @property
+    def header(self) -> HandHeader:
+        return HandHeader(self.__id, self.__site, self.__game_type, self.__date, self.__small_blind, self.__big_blind,
+                          self.__button)
+
+    @property
+    def site_hand_id(self) -> str:
+        """ Id of the hand on its site, the same in every file the hand was exported to """
+        return f"{self.__site}_{self.__id}"
+
+    @property
+    def site(self) -> str:
+        return self.__site
+
+    @property
+    def content_hash(self) -> bytes:
+        """ Hash of the raw lines, the same for the same hand in every file it was exported to """
+        return self.__content_hash
+
+    @property
+    def dialect(self) -> Dialect:
+        return self.__dialect
+
+    @property
+    def date(self) -> Optional[datetime.date]:
+        return self.__date
+
+    @property
+    def button(self) -> int:
+        """ Seat of the button """
+        return int(self.__button)
+
+    @property
+    def game_type(self) -> GameType:
+        return self.__game_type
 
     @property
     def big_blind(self) -> float:
@@ -39,6 +87,7 @@ class Hand(object):
 
     @property
     def players(self) -> Dict[str, Player]:
+        self.parse_summary()
         return self.__players
 
     @property
@@ -47,62 +96,132 @@ class Hand(object):
 
     @property
     def flop_cards(self) -> List[Card]:
+        self.parse_actions()
         return self.__flop_cards
 
     @property
     def turn_cards(self) -> List[Card]:
+        self.parse_actions()
         return self.__turn_cards
 
     @property
     def river_cards(self) -> List[Card]:
+        self.parse_actions()
         return self.__river_cards
 
     @property
-    def preflop_actions(self) -> List[Action]:
-        return self.__pre_flop_actions
+    def preflop_actions(self) -> ActionView:
+        return self.__street_actions(Street.PREFLOP)
 
     @property
-    def flop_actions(self) -> List[Action]:
-        return self.__flop_actions
+    def flop_actions(self) -> ActionView:
+        return self.__street_actions(Street.FLOP)
 
     @property
-    def turn_actions(self) -> List[Action]:
-        return self.__turn_actions
+    def turn_actions(self) -> ActionView:
+        return self.__street_actions(Street.TURN)
 
     @property
-    def river_actions(self) -> List[Action]:
-        return self.__river_actions
+    def river_actions(self) -> ActionView:
+        return self.__street_actions(Street.RIVER)
+
+    @property
+    def actions(self) -> ActionLog:
+        self.parse_actions()
+        return self.__actions
+
+    def __street_actions(self, street: Street) -> ActionView:
+        self.parse_actions()
+        return self.__actions.view(*self.__street_ranges.get(street, (0, 0)))
 
     @property
     def total_pot(self) -> float:
+        self.parse_summary()
         return self.__total_pot
 
     @property
     def rake(self) -> float:
+        self.parse_summary()
         return self.__rake
 
-    def __init__(self, id_prefix, lines: List[str]):
+    def __init__(self, id_prefix, lines: List[str], dialect: Dialect = None):
         self.__id_prefix = id_prefix
+        self.__dialect = dialect = dialect or detect_dialect(lines[0])
+        if dialect is None:
+            raise ValueError(f"Unknown hand history format: {lines[0]}")
+        self.__lines = lines
+        self.__content_hash = hashlib.blake2b('\n'.join(lines).encode(), digest_size=16).digest()
+        self.__actions_parsed = False
+        self.__summary_parsed = False
         self.__turn_cards = []
         self.__flop_cards = []
         self.__river_cards = []
 
-        self.__pre_flop_actions = []
-        self.__flop_actions = []
-        self.__turn_actions = []
-        self.__river_actions = []
+        self.__actions = ActionLog()
+        self.__street_ranges = {}
 
         self.__players = {}
-        self.__skip_players = []
-        self.__extract_game_type_and_hand_id(lines[0])
-        self.__extract_button(lines[1])
-        iteration = 2
+        self.__extract_header(lines)
+        iteration = dialect.seats_start(lines)
         while True:
             if not lines[iteration].startswith('Seat'):
                 break
             self.__extract_player(lines[iteration])
             iteration += 1
-
+        self.__seats_end = iteration
+
+        # Offsets of street markers, the first occurrence of each marker after the seats
+        self.__offsets = {}
+        for i in range(iteration, len(lines)):
+            if lines[i].startswith(dialect.marker_prefix):
+                for marker in dialect.street_markers:
+                    if lines[i].startswith(marker) and marker not in self.__offsets:
+                        self.__offsets[marker] = i
+        if dialect.preflop_start not in self.__offsets or dialect.showdown not in self.__offsets:
+            raise ValueError(f"Hand {self.hand_id} has no hole cards or summary section")
+
+        if not self.lazy:
+            self.parse_actions()
+            self.parse_summary()
+
+    @classmethod
+    def restore(cls, id_prefix: str, header: HandHeader, dialect: Dialect, content_hash: bytes,
+                players: List[Player], actions: ActionLog, flop_cards: List[Card], turn_cards: List[Card],
+                river_cards: List[Card], total_pot: float, rake: float) -> 'Hand':
+        """ Fully parsed hand from its parts, e.g. decoded from the binary format, without any lines """
+        hand = cls.__new__(cls)
+        hand.__id_prefix = id_prefix
+        hand.__dialect = dialect
+        hand.__lines = None
+        hand.__content_hash = content_hash
+        hand.__actions_parsed = hand.__summary_parsed = True
+        hand.__id, hand.__site, hand.__game_type = header.hand_id, header.site, header.game_type
+        hand.__date = header.date
+        hand.__small_blind, hand.__big_blind, hand.__button = header.small_blind, header.big_blind, header.button
+        hand.__players = {player.nick: player for player in players}
+        hand.__actions = actions
+        # Actions of a street are contiguous, preflop includes the blinds
+        streets = actions.streets.tobytes()
+        hand.__street_ranges = {street: (streets.find(code), streets.rfind(code) + 1)
+                                for street, code in street_codes if code in streets}
+        hand.__flop_cards, hand.__turn_cards, hand.__river_cards = flop_cards, turn_cards, river_cards
+        hand.__total_pot, hand.__rake = total_pot, rake
+        return hand
+
+    def __section_end(self, start: int) -> int:
+        """ Offset of the first street marker after start """
+        return min([i for i in self.__offsets.values() if i > start], default=len(self.__lines))
+
+    def __release_lines(self):
+        if self.__actions_parsed and self.__summary_parsed:
+            self.__lines = None
+
+    def parse_actions(self):
+        if self.__actions_parsed:
+            return
+        lines = self.__lines
+        dialect = self.__dialect
+        iteration = self.__seats_end
         while True:
             if 'small blind' in lines[iteration]:
                 self.__extract_small_blind_player(lines[iteration])
@@ -116,193 +235,97 @@ class Hand(object):
                 break
             iteration += 1
 
-        self.__pre_flop_actions.append(Action(self.__small_blind_player, ActionType.SMALLBLIND, self.__small_blind))
-        self.__pre_flop_actions.append(Action(self.__big_blind_player, ActionType.BIGBLIND, self.__big_blind))
+        self.__actions.append(self.__small_blind_player, ActionType.SMALLBLIND, Street.PREFLOP, self.__small_blind)
+        self.__actions.append(self.__big_blind_player, ActionType.BIGBLIND, Street.PREFLOP, self.__big_blind)
 
-        while lines[iteration] != preflop_start:
-            iteration += 1
-
-        assert lines[iteration] == preflop_start
-
-        iteration += 1
-        if self.__extract_preflop_cards(lines[iteration]):
-            iteration += 1
+        hole = self.__offsets[dialect.preflop_start]
+        assert hole >= iteration and lines[hole] == dialect.preflop_start
 
         # Collect all preflop actions
-        while iteration < len(lines) and not lines[iteration].startswith(flop_start) and not lines[
-            iteration].startswith(showdown) \
-                and not lines[iteration].startswith(first_flop_start):
-            action = self.__handle_action(lines[iteration])
-            if action:
-                self.__pre_flop_actions.append(action)
-            iteration += 1
-
-        if lines[iteration].startswith(flop_start):
-            self.__extract_flop_cards(lines[iteration])
-            iteration += 1
-            # Collect all flop actions
-            while iteration < len(lines) and not lines[iteration].startswith(turn_start) \
-                    and not lines[iteration].startswith(showdown):
-                action = self.__handle_action(lines[iteration])
-                if action:
-                    self.__flop_actions.append(action)
-                iteration += 1
-
-        if lines[iteration].startswith(turn_start):
-            self.__extract_turn_cards(lines[iteration])
-            iteration += 1
-            while iteration < len(lines) and not lines[iteration].startswith(river_start) and not lines[
-                iteration].startswith(showdown):
-                action = self.__handle_action(lines[iteration])
-                if action:
-                    self.__turn_actions.append(action)
-                iteration += 1
-
-        if lines[iteration].startswith(river_start):
-            self.__extract_river_cards(lines[iteration])
-            iteration += 1
-            while iteration < len(lines) and not lines[iteration].startswith(showdown):
-                action = self.__handle_action(lines[iteration])
-                if action:
-                    self.__river_actions.append(action)
-                iteration += 1
-
-        # Collect summary information
-        assert lines[iteration].startswith(showdown), lines[iteration]
-        iteration += 1
-        self.__extract_total_pot(lines[iteration])
-        iteration += 1
-        if lines[iteration].startswith('Board'):
-            iteration += 1
-        # Collect showdown actions
-        while iteration < len(lines) and lines[iteration].startswith('Seat'):
-            self.__extract_showdown_player_cards(lines[iteration])
-            iteration += 1
+        iteration = self.__section_end(hole)
+        # Blinds are already in the pot, some sites report raises relative to them
+        blinds = {self.__small_blind_player: self.__small_blind, self.__big_blind_player: self.__big_blind}
+        self.__collect_actions(hole + 1, iteration, Street.PREFLOP, blinds)
+        assert not dialect.first_flop_start or not lines[iteration].startswith(dialect.first_flop_start), \
+            "Run it twice hands are not supported"
+
+        board = []
+        if lines[iteration].startswith(dialect.flop_start):
+            board = dialect.flop_cards(lines[iteration])
+            self.__flop_cards = create_cards(board)
+            start, iteration = iteration + 1, self.__section_end(iteration)
+            self.__collect_actions(start, iteration, Street.FLOP)
+
+        if lines[iteration].startswith(dialect.turn_start):
+            board = dialect.turn_cards(lines[iteration], board)
+            self.__turn_cards = create_cards(board)
+            start, iteration = iteration + 1, self.__section_end(iteration)
+            self.__collect_actions(start, iteration, Street.TURN)
+
+        if lines[iteration].startswith(dialect.river_start):
+            self.__river_cards = create_cards(dialect.river_cards(lines[iteration], board))
+            start, iteration = iteration + 1, self.__section_end(iteration)
+            self.__collect_actions(start, iteration, Street.RIVER)
+
+        assert lines[iteration].startswith(dialect.showdown), lines[iteration]
+        self.__actions_parsed = True
+        self.__release_lines()
+
+    def __collect_actions(self, start: int, end: int, street: Street, invested: Dict[str, float] = None):
+        first = len(self.__actions)
+        for player, action_type, bet_size in self.__dialect.street_actions(self.__lines, start, end, invested or {}):
+            self.__actions.append(player, action_type, street, bet_size)
+        self.__street_ranges[street] = (0 if street == Street.PREFLOP else first, len(self.__actions))
+
+    def parse_summary(self):
+        if self.__summary_parsed:
+            return
+        lines = self.__lines
+        dialect = self.__dialect
+        self.__extract_preflop_cards(lines[self.__offsets[dialect.preflop_start] + 1])
 
-    def __handle_action(self, line):
-        if fold_action_regexp.search(line):
-            return self.__extract_fold_action(line)
-        elif call_action_regexp.search(line):
-            return self.__extract_call_action(line)
-        elif bet_action_regexp.search(line):
-            return self.__extract_bet_action(line)
-        elif check_action_regexp.search(line):
-            return self.__extract_check_action(line)
-        elif raise_action_regexp.search(line):
-            return self.__extract_raise_action(line)
-        elif line.find("doesn't show hand") != -1:
-            pass
-        elif line.find("leaves the table") != -1:
-            pass
-        elif line.find("Uncalled bet") != -1:
-            pass
-        elif line.find("is disconnected") != -1:
-            pass
-        elif line.find("said,") != -1:
-            pass
-        elif line.find(" collected ") != -1:
-            pass
-        elif line.find("has timed out") != -1:
-            pass
-        elif line.find("joins the table at seat") != -1:
-            pass
-        elif line.find("is connected") != -1:
-            pass
-        elif line.find("was removed from the table for failing to post") != -1:
-            pass
-        else:
-            return None
-
-    def __extract_total_pot(self, line):
-        match = summary_total_pot_regexp.search(line)
-        self.__total_pot = float(match.group(1))
-        self.__rake = float(match.group(3))
-
-    def __extract_fold_action(self, line):
-        player = fold_action_regexp.search(line).group(1)
-        return Action(player, ActionType.FOLD)
-
-    def __extract_check_action(self, line):
-        player = check_action_regexp.search(line).group(1)
-        return Action(player, ActionType.CHECK)
-
-    def __extract_call_action(self, line):
-        match = call_action_regexp.search(line)
-        player, call_size = match.group(1), float(match.group(2))
-        return Action(player, ActionType.CALL, call_size)
-
-    def __extract_bet_action(self, line):
-        match = bet_action_regexp.search(line)
-        player, bet_size = match.group(1), float(match.group(2))
-        return Action(player, ActionType.BET, bet_size)
-
-    def __extract_raise_action(self, line):
-        match = raise_action_regexp.search(line)
-        player, raise_size, bet_size = match.group(1), float(match.group(2)), float(match.group(4))
-        return Action(player, ActionType.RAISE, float(bet_size))
+        # Collect summary information and showdown cards
+        self.__total_pot, self.__rake, showdown_cards = dialect.parse_summary(lines, self.__offsets[dialect.showdown])
+        for player, cards in showdown_cards:
+            self.__players[player].player_cards = create_cards(cards)
+        self.__summary_parsed = True
+        self.__release_lines()
 
     def __extract_preflop_cards(self, line) -> bool:
-        match = preflop_cards_regexp.search(line)
+        match = self.__dialect.preflop_cards_regexp.search(line)
         if not match:
             return False
         player = match.group(1)
-        cards = create_cards(match.group(2).split())
+        cards = create_cards(self.__dialect.split_cards(match.group(2)))
         if player and cards:
-            self.players[player].player_cards = cards
+            self.__players[player].player_cards = cards
             return True
         return False
 
-    def __extract_flop_cards(self, line):
-        self.__flop_cards = create_cards(flop_cards_regexp.search(line).group(1).split(' '))
-
-    def __extract_turn_cards(self, line):
-        match = turn_cards_regexp.search(line)
-        c = match.group(1).split(' ')
-        c.append(match.group(2))
-        self.__turn_cards = create_cards(c)
-
-    def __extract_river_cards(self, line):
-        match = river_cards_regexp.search(line)
-        c = match.group(1).split(' ')
-        c.append(match.group(2))
-        self.__river_cards = create_cards(c)
-
-    def __extract_showdown_player_cards(self, line):
-        match = showdown_player_cards_regexp.search(line)
-        if not match:
-            return
-        player = match.group(2)
-        cards = create_cards(match.group(3).split())
-        if player and cards:
-            if player.endswith(' (big blind)'):
-                player = player[:-12]
-            if player.endswith(' (small blind)'):
-                player = player[:-14]
-            if player.endswith(' (button)'):
-                player = player[:-9]
-            self.players[player].player_cards = cards
-
-    def __extract_button(self, line):
-        self.__button = button_regexp.search(line).group(1)
-
-    def __extract_game_type_and_hand_id(self, line):
-        match = game_type_regexp.search(line)
-        self.__id = match.group(1)
-        self.__game_type = match.group(2)
-        self.__small_blind, self.__big_blind = match.group(3).split('/')
-        self.__small_blind = self.__small_blind.strip(currency)
-        self.__big_blind = self.__big_blind.strip(currency)
-        self.__small_blind, self.__big_blind = float(self.__small_blind), float(self.__big_blind)
-
-    def __extract_skip_players(self, line):
-        self.__skip_players.append(skip_player_regexp.search(line).group(1))
+    def __extract_header(self, lines: List[str]):
+        header = self.__dialect.parse_header(lines)
+        self.__id = header.hand_id
+        self.__site = header.site
+        self.__game_type = header.game_type
+        self.__date = header.date
+        self.__small_blind, self.__big_blind = header.small_blind, header.big_blind
+        self.__button = header.button
 
     def __extract_small_blind_player(self, line):
-        self.__small_blind_player = small_blind_regexp.search(line).group(1)
+        self.__small_blind_player = self.__dialect.small_blind_regexp.search(line).group(1)
 
     def __extract_big_blind_player(self, line):
-        self.__big_blind_player = big_blind_regexp.search(line).group(1)
+        self.__big_blind_player = self.__dialect.big_blind_regexp.search(line).group(1)
 
     def __extract_player(self, line):
-        match = seat_regexp.search(line)
-        self.__players[match.group(2)] = Player(match.group(1), match.group(2), match.group(3))
+        match = self.__dialect.seat_regexp.search(line)
+        nickname = sys.intern(match.group(2))
+        self.__players[nickname] = Player(match.group(1), nickname, match.group(3))
+
+
+class LazyHand(Hand):
+    """
+    Hand which parses only the header and seats on construction.
+    Actions and board cards are parsed on first access to them, summary on first access to players or pot.
+    """
+    lazy = True
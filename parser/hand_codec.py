@@ -0,0 +1,250 @@
+"""
+Binary format of parsed hands. A file starts with the magic and holds one record per hand:
+the payload length and the payload. A payload has
+
+    strings: id prefix, hand id, site, dialect, nicknames of the seats and other players of the action log,
+             utf-8 joined by new lines and prefixed by the byte length
+    header: game type, date ordinal (0 if unknown), small and big blinds, total pot, rake, button,
+            the content hash of the raw lines and the numbers of seats, action log players and actions
+    seats: position and chips of every seat
+    cards: known cards of every seat, then flop, turn and river cards, each list prefixed by its length
+    actions: the string of every player of the action log, then the arrays of player ids, action types
+             and streets (a byte per action) and bet sizes (a float64 per action)
+
+A card is one byte, its Card id. Everything is decoded with a handful of struct calls,
+which is several times faster than parsing the text again.
+The index file next to it maps a 64-bit hash of every hand_id to the record offset, sorted by the hash.
+"""
+import datetime
+import hashlib
+import os
+import struct
+from array import array
+from typing import Optional, Iterator, BinaryIO
+
+import numpy as np
+
+from action import ActionLog
+from core.card import Card
+from core.types import GameType
+from dialect import HandHeader, dialect_by_name
+from hand import Hand
+from player import Player
+
+MAGIC = b'PHB1'
+BINARY_SUFFIX = '.bin'
+INDEX_SUFFIX = '.idx'
+index_dtype = np.dtype([('key', '<u8'), ('offset', '<u8')])
+index_struct = struct.Struct('<QQ')
+
+record_length = struct.Struct('<I')
+strings_length = struct.Struct('<H')
+header_struct = struct.Struct('<BiddddB16sBBH')
+seat_struct = struct.Struct('<Bd')
+NO_BUTTON = 0xff
+# id prefix, hand id, site and dialect come before the nicknames
+FIXED_STRINGS = 4
+
+game_types_by_code = {game_type.value: game_type for game_type in GameType}
+deck = Card.deck
+
+
+def hand_key(hand_id: str) -> int:
+    return int.from_bytes(hashlib.blake2b(hand_id.encode(), digest_size=8).digest(), 'little')
+
+
+def encode_hand(hand: Hand) -> bytes:
+    """ Payload of a fully parsed hand """
+    header = hand.header
+    players = list(hand.players.values())
+    log = hand.actions
+    strings = [hand.id_prefix, header.hand_id, header.site, hand.dialect.name] + [player.nick for player in players]
+    string_index = {player.nick: FIXED_STRINGS + i for i, player in enumerate(players)}
+    for player_name in log.players:
+        if player_name not in string_index:
+            string_index[player_name] = len(strings)
+            strings.append(player_name)
+    text = '\n'.join(strings).encode()
+    out = bytearray(strings_length.pack(len(text)))
+    out += text
+    out += header_struct.pack(header.game_type.value, header.date.toordinal() if header.date else 0,
+                              header.small_blind, header.big_blind, hand.total_pot, hand.rake,
+                              NO_BUTTON if header.button is None else int(header.button), hand.content_hash,
+                              len(players), len(log.players), len(log))
+    for player in players:
+        out += seat_struct.pack(player.position, player.chips)
+    for cards in [player.player_cards for player in players] + [hand.flop_cards, hand.turn_cards, hand.river_cards]:
+        cards = cards or []
+        out.append(len(cards))
+        out += bytes(card.id for card in cards)
+    out += bytes(string_index[player_name] for player_name in log.players)
+    out += log.player_ids.tobytes()
+    out += log.action_types.tobytes()
+    out += log.streets.tobytes()
+    out += log.bet_sizes.tobytes()
+    return bytes(out)
+
+
+def decode_array(typecode: str, data: memoryview) -> array:
+    values = array(typecode)
+    values.frombytes(data)
+    return values
+
+
+def decode_hand(data: bytes, hand_class=Hand) -> Hand:
+    data = memoryview(data)
+    length, = strings_length.unpack_from(data)
+    offset = strings_length.size + length
+    strings = str(data[strings_length.size:offset], 'utf-8').split('\n')
+    (game_type, date, small_blind, big_blind, total_pot, rake, button, content_hash, seats, log_players,
+     actions) = header_struct.unpack_from(data, offset)
+    offset += header_struct.size
+    header = HandHeader(strings[1], strings[2], game_types_by_code[game_type],
+                        datetime.date.fromordinal(date) if date else None, small_blind, big_blind,
+                        None if button == NO_BUTTON else str(button))
+    positions = list(seat_struct.iter_unpack(data[offset:offset + seats * seat_struct.size]))
+    offset += seats * seat_struct.size
+    cards = []
+    for _ in range(seats + 3):
+        count = data[offset]
+        cards.append([deck[code] for code in data[offset + 1:offset + 1 + count]])
+        offset += count + 1
+    players = [Player(position, nick, chips, cards[i] or None)
+               for i, ((position, chips), nick) in enumerate(zip(positions, strings[FIXED_STRINGS:]))]
+    names = [strings[i] for i in data[offset:offset + log_players]]
+    offset += log_players
+    player_ids, action_types, streets = (decode_array('B', data[offset + i * actions:offset + (i + 1) * actions])
+                                         for i in range(3))
+    offset += 3 * actions
+    bet_sizes = decode_array('d', data[offset:offset + actions * 8])
+    return hand_class.restore(strings[0], header, dialect_by_name(strings[3]), content_hash, players,
+                              ActionLog.from_arrays(names, player_ids, action_types, streets, bet_sizes),
+                              cards[seats], cards[seats + 1], cards[seats + 2], total_pot, rake)
+
+
+def hidden_path(path: str) -> str:
+    directory, name = os.path.split(path)
+    return os.path.join(directory, '.' + name)
+
+
+class HandWriter(object):
+    """
+    Appends parsed hands to a binary file and their offsets to the index, which is sorted on close.
+    Hands are written as they come, memory does not grow with the number of hands.
+    Both files are written under hidden names and renamed on close, so readers never see unfinished files.
+    """
+
+    def __init__(self, path: str):
+        self.__path = path
+        self.__file = open(hidden_path(path), 'wb')
+        self.__file.write(MAGIC)
+        self.__index = open(hidden_path(path + INDEX_SUFFIX), 'wb')
+        self.__count = 0
+
+    def __len__(self):
+        return self.__count
+
+    def write(self, hand: Hand):
+        payload = encode_hand(hand)
+        self.__index.write(index_struct.pack(hand_key(hand.hand_id), self.__file.tell()))
+        self.__file.write(record_length.pack(len(payload)))
+        self.__file.write(payload)
+        self.__count += 1
+
+    def close(self):
+        if self.__file.closed:
+            return
+        self.__file.close()
+        self.__index.close()
+        index = np.fromfile(self.__index.name, dtype=index_dtype)
+        index.sort(order='key', kind='stable')
+        index.tofile(self.__index.name)
+        os.replace(self.__index.name, self.__path + INDEX_SUFFIX)
+        os.replace(self.__file.name, self.__path)
+
+    def discard(self):
+        """ Removes the unfinished files, e.g. when the source of the hands failed """
+        self.__file.close()
+        self.__index.close()
+        for path in (self.__file.name, self.__index.name):
+            if os.path.exists(path):
+                os.remove(path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.discard()
+
+
+def read_records(fin: BinaryIO) -> Iterator[bytes]:
+    if fin.read(len(MAGIC)) != MAGIC:
+        raise ValueError(f"Not a binary hands file: {fin.name}")
+    while True:
+        prefix = fin.read(record_length.size)
+        if not prefix:
+            return
+        length, = record_length.unpack(prefix)
+        yield fin.read(length)
+
+
+class HandReader(object):
+    """
+    Reads hands written by HandWriter: all of them in the order they were written, or by hand_id through the index.
+    hand_class is Hand or LazyHand, decoded hands are fully parsed either way.
+    """
+
+    def __init__(self, path: str, hand_class=Hand):
+        self.__path = path
+        self.__hand_class = hand_class
+        self.__file = open(path, 'rb', buffering=1 << 20)
+        self.__index = np.fromfile(path + INDEX_SUFFIX, dtype=index_dtype) if os.path.exists(path + INDEX_SUFFIX) \
+            else None
+
+    def __len__(self):
+        if self.__index is None:
+            raise ValueError(f"No index for {self.__path}")
+        return len(self.__index)
+
+    def __iter__(self) -> Iterator[Hand]:
+        with open(self.__path, 'rb', buffering=1 << 20) as fin:
+            for payload in read_records(fin):
+                yield decode_hand(payload, self.__hand_class)
+
+    def hand(self, hand_id: str) -> Optional[Hand]:
+        """ Hand with the hand_id, None if it was not written """
+        if self.__index is None:
+            raise ValueError(f"No index for {self.__path}")
+        key = hand_key(hand_id)
+        keys = self.__index['key']
+        for i in range(np.searchsorted(keys, key), np.searchsorted(keys, key, side='right')):
+            self.__file.seek(int(self.__index['offset'][i]))
+            length, = record_length.unpack(self.__file.read(record_length.size))
+            hand = decode_hand(self.__file.read(length), self.__hand_class)
+            # Different hand ids may share the 64-bit hash
+            if hand.hand_id == hand_id:
+                return hand
+        return None
+
+    def close(self):
+        self.__file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+def read_hands(path: str, hand_class=Hand) -> Iterator[Hand]:
+    """ Hands of a binary file, or of every binary file in a directory in the order of file names """
+    paths = [path]
+    if os.path.isdir(path):
+        paths = [os.path.join(path, name) for name in sorted(os.listdir(path))
+                 if name.endswith(BINARY_SUFFIX) and not name.startswith('.')]
+    for hands_path in paths:
+        with HandReader(hands_path, hand_class) as reader:
+            yield from reader
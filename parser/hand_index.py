@@ -0,0 +1,61 @@
+import sqlite3
+from typing import List, Set, Dict
+
+
+class HandIndex(object):
+    """
+    Persistent set of hand ids shared by all files and worker processes, stored in sqlite.
+    The same hand is exported into the histories of every followed player at the table,
+    the first source to claim a hand owns it and only the owner parses and featurizes it.
+    A source which is parsed again, e.g. after a crash, gets its own hands back.
+    A large file split into parts is one source, the part which claims a hand first in a run owns it,
+    so the file may be split differently on every run.
+    """
+
+    def __init__(self, path: str):
+        self.__connection = sqlite3.connect(path, timeout=60)
+        self.__connection.execute("PRAGMA journal_mode=WAL")
+        self.__connection.execute("PRAGMA synchronous=NORMAL")
+        with self.__connection:
+            self.__connection.execute("CREATE TABLE IF NOT EXISTS sources (id INTEGER PRIMARY KEY, name TEXT UNIQUE)")
+            self.__connection.execute("CREATE TABLE IF NOT EXISTS hands ("
+                                      "hand_id TEXT PRIMARY KEY, source INTEGER, run TEXT, part INTEGER) WITHOUT ROWID")
+        self.__sources: Dict[str, int] = {}
+
+    def __source_id(self, source: str) -> int:
+        if source not in self.__sources:
+            with self.__connection:
+                self.__connection.execute("INSERT OR IGNORE INTO sources (name) VALUES (?)", (source,))
+            self.__sources[source] = self.__connection.execute("SELECT id FROM sources WHERE name = ?",
+                                                               (source,)).fetchone()[0]
+        return self.__sources[source]
+
+    def claim(self, hand_ids: List[str], source: str, run: str = None, part: int = None,
+              batch_size: int = 500) -> Set[str]:
+        """
+        Registers hand ids for the source and returns the ones it owns, all in one transaction.
+        A part of a split source passes the id of the run and its offset, it takes over hands of the source
+        claimed in other runs and leaves the ones claimed by other parts in this run.
+        """
+        if not hand_ids:
+            return set()
+        claimed = set()
+        source_id = self.__source_id(source)
+        with self.__connection:
+            self.__connection.executemany("INSERT OR IGNORE INTO hands VALUES (?, ?, ?, ?)",
+                                          ((hand_id, source_id, run, part) for hand_id in hand_ids))
+            for i in range(0, len(hand_ids), batch_size):
+                batch = hand_ids[i:i + batch_size]
+                placeholders = ','.join('?' * len(batch))
+                self.__connection.execute(f"UPDATE hands SET run = ?, part = ? WHERE source = ? AND run IS NOT ? "
+                                          f"AND hand_id IN ({placeholders})", (run, part, source_id, run, *batch))
+                claimed.update(row[0] for row in self.__connection.execute(
+                    f"SELECT hand_id FROM hands WHERE source = ? AND part IS ? AND hand_id IN ({placeholders})",
+                    (source_id, part, *batch)))
+        return claimed
+
+    def __len__(self):
+        return self.__connection.execute("SELECT COUNT(*) FROM hands").fetchone()[0]
+
+    def close(self):
+        self.__connection.close()
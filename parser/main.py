@@ -1,18 +1,16 @@
 import logging
 import os
 import zipfile
+from collections import Counter
 from os import walk
+from typing import List, FrozenSet, Dict, Iterable, Optional, Callable
 
 import click as click
-import pandas as pd
-from joblib import Parallel, delayed
 from tqdm import tqdm
 
-from feature_extractor import FeatureExtractor
-from features.board import Board
-from features.combinations import Combination
-from features.features import FeaturesPack
-from parser import Parser
+from manifest import Manifest
+from metrics import MetricsReport
+from pool import WorkItem, parse_items, item_origin
 import tempfile
 
 log = logging.getLogger(__name__)
@@ -28,73 +26,188 @@ def setup_logging():
     )
 
 
-def extract_data(input_dir: str, output_dir: str):
+def start_archive(manifest: Manifest, archive_path: str):
+    """ Registers the archive in the manifest and removes outputs of its previous version """
+    for output in manifest.start_archive(archive_path):
+        if os.path.exists(output):
+            os.remove(output)
+
+
+def extract_data(input_dir: str, output_dir: str, manifest: Manifest = None) -> Dict[str, str]:
+    """ Extracts every archive into a directory of its own, returns archive paths by directory name """
     log.info("Start extracting data")
+    extracted = {}
     for (dirpath, dirnames, filenames) in walk(input_dir):
         for filename in tqdm(filenames):
             try:
+                if manifest is not None:
+                    if manifest.is_archive_done(os.path.join(input_dir, filename)):
+                        continue
+                    start_archive(manifest, os.path.join(input_dir, filename))
+                directory = os.path.splitext(filename)[0]
                 with zipfile.ZipFile(os.path.join(input_dir, filename), 'r') as zip_ref:
-                    zip_ref.extractall(os.path.join(output_dir, filename.strip('.zip')))
+                    zip_ref.extractall(os.path.join(output_dir, directory))
+                extracted[directory] = os.path.join(input_dir, filename)
             except Exception as e:
                 log.debug(e)
+    return extracted
 
 
-def load_nicknames(path):
+def load_nicknames(path) -> FrozenSet[str]:
     with open(path) as fin:
-        return [line.strip() for line in fin]
+        return frozenset(line.strip() for line in fin if line.strip())
 
 
-def parse_file(fe: FeatureExtractor, fpath, datasets_path: str, filename: str, dir: str):
-    features = []
-    parser = Parser()
-    with open(fpath) as f:
+def list_archive_members(input_dir: str, manifest: Manifest = None) -> List[WorkItem]:
+    members = []
+    for filename in sorted(os.listdir(input_dir)):
+        archive_path = os.path.join(input_dir, filename)
         try:
-            lines = [x.strip() for x in filter(lambda x: x != '\n', list(f))]
-            parser.add_lines(dir, lines)
-        except:
-            pass
-    for hand_id in parser.hands:
-        features.extend(fe.extract_features(parser.hands[hand_id][0]))
-    if features:
-        if filename.endswith('.txt'):
-            filename = filename[:-4]
-        pd.DataFrame(features).to_csv(os.path.join(datasets_path, dir + filename + '.csv'), index=False,
-                                      header=FeaturesPack.features_names() +
-                                             Board.features_names() +
-                                             Combination.features_names())
-
-
-def parse_files(fe: FeatureExtractor, path: str, datasets_path: str):
+            if manifest is not None:
+                if manifest.is_archive_done(archive_path):
+                    continue
+                start_archive(manifest, archive_path)
+            with zipfile.ZipFile(archive_path, 'r') as zip_ref:
+                archive_members = [WorkItem(archive_path, info.filename, os.path.splitext(filename)[0], info.file_size)
+                                   for info in zip_ref.infolist()
+                                   if not info.is_dir() and
+                                   (manifest is None or not manifest.is_member_done(archive_path, info.filename))]
+            if manifest is not None and not archive_members:
+                # Every member was parsed by a previous run
+                manifest.finish_archive(archive_path)
+            members.extend(archive_members)
+        except Exception as e:
+            log.debug(e)
+    return members
+
+
+def list_files(path: str, archives: Dict[str, str] = None) -> List[WorkItem]:
+    """ Files of every directory under path, archives are the archive paths the directories were extracted from """
+    archives = archives or {}
     all_files = []
     for (dirpath, dirnames, filenames) in walk(path):
         for directory in dirnames:
             filenames = os.listdir(os.path.join(path, directory))
             for filename in filenames:
-                all_files.append((os.path.join(path, directory, filename), filename, directory))
-    log.info(f"Found {len(all_files)} files")
-    Parallel(n_jobs=-1, verbose=10)(delayed(parse_file)(fe, fpath, datasets_path, filename, directory)
-                                    for fpath, filename, directory in all_files)
-
-
-def parse_directory_impl(directory, datasets_path, nicknames_path):
+                fpath = os.path.join(path, directory, filename)
+                if os.path.isfile(fpath):
+                    all_files.append(WorkItem(fpath, None, directory, os.path.getsize(fpath),
+                                              archive=archives.get(directory)))
+    return all_files
+
+
+def record_members(manifest: Manifest, items: List[WorkItem], archives: Iterable[str] = ()) \
+        -> Optional[Callable[[List[WorkItem], List[str]], None]]:
+    """
+    on_chunk_done of parse_items which records every member of items in the manifest with its outputs,
+    and finishes an archive with its last member. Archives without items are finished at once.
+    A file split into several items is recorded when all of its bytes are parsed, with the outputs of every part.
+    """
+    if manifest is None:
+        return None
+    remaining = Counter(item_origin(item)[0] for item in items)
+    for archive_path in archives:
+        if remaining[archive_path] == 0:
+            manifest.finish_archive(archive_path)
+    remaining_bytes = {item_origin(item): item.size for item in items}
+    member_outputs = {}
+
+    def on_chunk_done(done_items: List[WorkItem], outputs: List[str]):
+        for item in done_items:
+            archive_path, member = item_origin(item)
+            remaining_bytes[archive_path, member] -= item.size
+            member_outputs.setdefault((archive_path, member), set()).update(outputs)
+            if remaining_bytes[archive_path, member] > 0:
+                continue
+            manifest.finish_member(archive_path, member, sorted(member_outputs.pop((archive_path, member))))
+            remaining[archive_path] -= 1
+            if remaining[archive_path] == 0:
+                manifest.finish_archive(archive_path)
+
+    return on_chunk_done
+
+
+def record_outputs(manifest: Manifest) -> Optional[Callable[[List[WorkItem], List[str]], None]]:
+    """
+    on_chunk_written of parse_items which records outputs of every item in the manifest before they are committed,
+    the member stays unfinished until record_members finishes it
+    """
+    if manifest is None:
+        return None
+
+    def on_chunk_written(items: List[WorkItem], outputs: List[str]):
+        for item in items:
+            manifest.add_member_outputs(*item_origin(item), outputs)
+
+    return on_chunk_written
+
+
+def parse_archives(nicknames: FrozenSet[str], input_dir: str, datasets_path: str, output_format: str = 'csv',
+                   manifest: Manifest = None, processes: int = None, hand_index_path: str = None,
+                   report: MetricsReport = None, stats_path: str = None, cache_path: str = None,
+                   hands_path: str = None):
+    all_members = list_archive_members(input_dir, manifest)
+    parse_items(all_members, nicknames, datasets_path, output_format, processes,
+                record_members(manifest, all_members), hand_index_path, report, stats_path, cache_path, hands_path,
+                record_outputs(manifest))
+
+
+def parse_directory_impl(directory, datasets_path, nicknames_path, stream_zip=False, output_format='csv',
+                         manifest: Manifest = None, processes: int = None, hand_index_path: str = None,
+                         report: MetricsReport = None, stats_path: str = None, cache_path: str = None,
+                         hands_path: str = None):
+    nicknames = load_nicknames(nicknames_path)
+    log.debug(f"Loaded follow players: {nicknames}")
+    if stream_zip:
+        parse_archives(nicknames, directory, datasets_path, output_format, manifest, processes, hand_index_path,
+                       report, stats_path, cache_path, hands_path)
+        return
     with tempfile.TemporaryDirectory() as output_dir:
-        extract_data(directory, output_dir)
-        nicknames = load_nicknames(nicknames_path)
-        log.debug(f"Loaded follow players: {nicknames}")
-        fe = FeatureExtractor(nicknames)
-        parse_files(fe, output_dir, datasets_path)
+        extracted = extract_data(directory, output_dir, manifest)
+        items = list_files(output_dir, extracted)
+        if manifest is not None:
+            # Members parsed by a previous run which crashed before the archive was finished
+            items = [item for item in items if not manifest.is_member_done(*item_origin(item))]
+        parse_items(items, nicknames, datasets_path, output_format, processes,
+                    record_members(manifest, items, extracted.values()), hand_index_path, report, stats_path,
+                    cache_path, hands_path, record_outputs(manifest))
 
 
 @click.command()
 @click.option('--input_dir', type=click.Path(), help='Path to directory with zip arhives')
 @click.option('--datasets_path', type=click.Path(), help='Path to result dataset')
 @click.option('--nicknames_path', type=click.Path(), help='Path to nicknames dataset')
-def parse_directory(input_dir, datasets_path, nicknames_path):
+@click.option('--stream_zip', is_flag=True, default=False,
+              help='Read archive members directly instead of extracting them to a temporary directory')
+@click.option('--output_format', type=click.Choice(['csv', 'parquet']), default='csv',
+              help='csv - one file per input file, parquet - dataset partitioned by site, stakes and month')
+@click.option('--manifest_path', type=click.Path(), default=None,
+              help='Path to sqlite ledger of processed archives, unchanged archives are skipped on re-runs')
+@click.option('--n_jobs', type=int, default=None, help='Number of worker processes, all cores by default')
+@click.option('--hand_index_path', type=click.Path(), default=None,
+              help='Path to sqlite index of parsed hands, every hand is featurized once across files and runs')
+@click.option('--metrics_path', type=click.Path(), default=None,
+              help='Path to json report with per stage metrics of every worker and totals')
+@click.option('--stats_path', type=click.Path(), default=None,
+              help='Path to sqlite store of player statistics, updated with every hand and added as opponent features')
+@click.option('--cache_path', type=click.Path(), default=None,
+              help='Path to sqlite cache of parsed hands and feature groups by hand content, reused across runs')
+@click.option('--hands_path', type=click.Path(), default=None,
+              help='Path to directory with parsed hands in the binary format, one indexed file per input file')
+def parse_directory(input_dir, datasets_path, nicknames_path, stream_zip, output_format, manifest_path, n_jobs,
+                    hand_index_path, metrics_path, stats_path, cache_path, hands_path):
     setup_logging()
+    manifest = Manifest(manifest_path) if manifest_path else None
+    report = MetricsReport() if metrics_path else None
     for dirname in os.listdir(input_dir):
         path = os.path.join(input_dir, dirname)
         if os.path.isdir(path):
-            parse_directory_impl(path, datasets_path, nicknames_path)
+            parse_directory_impl(path, datasets_path, nicknames_path, stream_zip, output_format, manifest, n_jobs,
+                                 hand_index_path, report, stats_path, cache_path, hands_path)
+    if manifest is not None:
+        manifest.close()
+    if report is not None:
+        report.write(metrics_path)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,101 @@
+import json
+import os
+import sqlite3
+from typing import List
+
+
+class Manifest(object):
+    """
+    Ledger of processed archives stored in sqlite.
+    An archive is identified by its path, size and modification time, so a changed archive is parsed again.
+    Members are recorded as soon as they are parsed, which allows to resume a run after a crash.
+    Outputs of a member are recorded before they are committed, so outputs of a member which was not finished
+    can be removed before it is parsed again.
+    """
+
+    def __init__(self, path: str):
+        self.__connection = sqlite3.connect(path, timeout=60)
+        with self.__connection:
+            self.__connection.execute("CREATE TABLE IF NOT EXISTS archives ("
+                                      "path TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER, completed INTEGER)")
+            self.__connection.execute("CREATE TABLE IF NOT EXISTS members ("
+                                      "archive TEXT, member TEXT, outputs TEXT, completed INTEGER, "
+                                      "PRIMARY KEY (archive, member))")
+
+    @staticmethod
+    def __stat(archive_path: str):
+        stat = os.stat(archive_path)
+        return stat.st_size, stat.st_mtime_ns
+
+    def __row(self, archive_path: str):
+        return self.__connection.execute("SELECT size, mtime_ns, completed FROM archives WHERE path = ?",
+                                         (os.path.abspath(archive_path),)).fetchone()
+
+    def is_archive_done(self, archive_path: str) -> bool:
+        row = self.__row(archive_path)
+        return row is not None and tuple(row[:2]) == self.__stat(archive_path) and bool(row[2])
+
+    def start_archive(self, archive_path: str) -> List[str]:
+        """
+        Registers the archive and returns outputs the caller should remove. If a previous version of the archive
+        was recorded, its member records are dropped and all outputs produced from it are returned.
+        Otherwise outputs of unfinished members are returned and their records dropped, together with finished
+        members which share any of those outputs, so every member with removed outputs is parsed again.
+        """
+        path = os.path.abspath(archive_path)
+        size, mtime_ns = self.__stat(archive_path)
+        row = self.__row(archive_path)
+        members = {member: (set(json.loads(outputs)), bool(completed)) for member, outputs, completed in
+                   self.__connection.execute("SELECT member, outputs, completed FROM members WHERE archive = ?",
+                                             (path,))}
+        if row is not None and tuple(row[:2]) == (size, mtime_ns):
+            stale = {member for member, (outputs, completed) in members.items() if not completed}
+            stale_outputs = set().union(*(members[member][0] for member in stale))
+            while True:
+                shared = {member for member, (outputs, completed) in members.items()
+                          if member not in stale and outputs & stale_outputs}
+                if not shared:
+                    break
+                stale |= shared
+                stale_outputs = stale_outputs.union(*(members[member][0] for member in shared))
+            with self.__connection:
+                self.__connection.executemany("DELETE FROM members WHERE archive = ? AND member = ?",
+                                              ((path, member) for member in stale))
+            return sorted(stale_outputs)
+        with self.__connection:
+            self.__connection.execute("DELETE FROM members WHERE archive = ?", (path,))
+            self.__connection.execute("INSERT OR REPLACE INTO archives VALUES (?, ?, ?, 0)", (path, size, mtime_ns))
+        return sorted(set().union(*(outputs for outputs, completed in members.values())))
+
+    def finish_archive(self, archive_path: str):
+        with self.__connection:
+            self.__connection.execute("UPDATE archives SET completed = 1 WHERE path = ?",
+                                      (os.path.abspath(archive_path),))
+
+    def is_member_done(self, archive_path: str, member: str) -> bool:
+        return self.__connection.execute("SELECT 1 FROM members WHERE archive = ? AND member = ? AND completed = 1",
+                                         (os.path.abspath(archive_path), member)).fetchone() is not None
+
+    def add_member_outputs(self, archive_path: str, member: str, outputs: List[str]):
+        """ Records outputs of a member which is not finished yet, before they are committed """
+        path = os.path.abspath(archive_path)
+        with self.__connection:
+            recorded = set(outputs)
+            for row in self.__connection.execute("SELECT outputs FROM members WHERE archive = ? AND member = ?",
+                                                 (path, member)):
+                recorded.update(json.loads(row[0]))
+            self.__connection.execute("INSERT OR REPLACE INTO members VALUES (?, ?, ?, 0)",
+                                      (path, member, json.dumps(sorted(recorded))))
+
+    def finish_member(self, archive_path: str, member: str, outputs: List[str]):
+        with self.__connection:
+            self.__connection.execute("INSERT OR REPLACE INTO members VALUES (?, ?, ?, 1)",
+                                      (os.path.abspath(archive_path), member, json.dumps(outputs)))
+
+    def member_outputs(self, archive_path: str, member: str) -> List[str]:
+        row = self.__connection.execute("SELECT outputs FROM members WHERE archive = ? AND member = ?",
+                                        (os.path.abspath(archive_path), member)).fetchone()
+        return json.loads(row[0]) if row else []
+
+    def close(self):
+        self.__connection.close()
@@ -0,0 +1,100 @@
+import json
+import time
+from collections import Counter
+from contextlib import contextmanager
+from typing import Dict, Iterable, Iterator
+
+
+class Metrics(object):
+    """
+    Counters and per stage wall time of one worker. Cheap enough for the per hand loop
+    and small enough to be sent back with every chunk.
+    """
+
+    def __init__(self):
+        self.__counters = Counter()
+        self.__seconds = Counter()
+
+    @property
+    def counters(self) -> Counter:
+        return self.__counters
+
+    @property
+    def seconds(self) -> Counter:
+        return self.__seconds
+
+    def count(self, name: str, value: int = 1):
+        self.__counters[name] += value
+
+    @contextmanager
+    def timer(self, stage: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.__seconds[stage] += time.perf_counter() - started
+
+    def timed(self, iterable: Iterable, stage: str) -> Iterator:
+        """ Yields items of iterable, time spent producing them is added to the stage """
+        iterator = iter(iterable)
+        while True:
+            started = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                self.__seconds[stage] += time.perf_counter() - started
+                return
+            self.__seconds[stage] += time.perf_counter() - started
+            yield item
+
+    def merge(self, other: 'Metrics'):
+        self.__counters.update(other.counters)
+        self.__seconds.update(other.seconds)
+
+    def stage_shares(self) -> Dict[str, float]:
+        total = sum(self.__seconds.values()) or 1.
+        return {stage: seconds / total for stage, seconds in self.__seconds.most_common()}
+
+    def to_dict(self) -> dict:
+        return {
+            'counters': dict(sorted(self.__counters.items())),
+            'seconds': {stage: round(seconds, 3) for stage, seconds in sorted(self.__seconds.items())},
+        }
+
+
+class MetricsReport(object):
+    """
+    Metrics of a run per worker and aggregated, written as json at the end of the run
+    """
+
+    def __init__(self):
+        self.__started = time.monotonic()
+        self.__workers: Dict[str, Metrics] = {}
+
+    @property
+    def total(self) -> Metrics:
+        total = Metrics()
+        for metrics in self.__workers.values():
+            total.merge(metrics)
+        return total
+
+    def add(self, worker: str, metrics: Metrics):
+        self.__workers.setdefault(worker, Metrics()).merge(metrics)
+
+    def to_dict(self) -> dict:
+        elapsed = max(time.monotonic() - self.__started, 1e-9)
+        total = self.total
+        return {
+            'elapsed_seconds': round(elapsed, 3),
+            'rates': {
+                'mb_per_second': round(total.counters['bytes_read'] / 2 ** 20 / elapsed, 3),
+                'hands_per_second': round(total.counters['hands_split'] / elapsed, 1),
+                'rows_per_second': round(total.counters['rows'] / elapsed, 1),
+            },
+            'total': total.to_dict(),
+            'workers': {worker: metrics.to_dict() for worker, metrics in sorted(self.__workers.items())},
+        }
+
+    def write(self, path: str):
+        with open(path, 'w') as fout:
+            json.dump(self.to_dict(), fout, indent=2)
@@ -1,51 +1,105 @@
 import logging
-from typing import List
+from collections import Counter
+from typing import List, Iterable, Iterator, Callable, Type
 
+from dialect import Dialect, detect_dialect
 from hand import Hand
-from regexp import *
 
 log = logging.getLogger(__name__)
 
 
 class Parser(object):
-    def __init__(self):
+    def __init__(self, hand_class: Type[Hand] = Hand):
+        self.__hand_class = hand_class
         self.__hands = {}
+        self.__total_hands = 0
+        self.__bad_hands = 0
+        self.__bad_hand_reasons = Counter()
+        self.__filtered_hands = 0
 
     @property
     def hands(self):
         return self.__hands
 
+    @property
+    def total_hands(self) -> int:
+        return self.__total_hands
+
+    @property
+    def bad_hands(self) -> int:
+        return self.__bad_hands
+
+    @property
+    def bad_hand_reasons(self) -> Counter:
+        """ Number of bad hands per exception type """
+        return self.__bad_hand_reasons
+
+    @property
+    def filtered_hands(self) -> int:
+        return self.__filtered_hands
+
     def handle_hand(self, id_prefix: str, hand: List[str]):
-        h = Hand(id_prefix, hand)
+        self.__store_hand(self.__hand_class(id_prefix, hand))
+
+    def __store_hand(self, h: Hand):
         if h.hand_id in self.__hands:
             self.__hands[h.hand_id].append(h)
         else:
             self.__hands[h.hand_id] = [h]
 
-    def add_lines(self, id_prefix, lines):
+    @staticmethod
+    def split_hands(lines: Iterable[str], dialect: Dialect = None) -> Iterator[List[str]]:
+        """
+        Lazily groups stripped lines into hands, a new hand starts on every hand start line of the dialect.
+        If no dialect is given, it is detected from the first hand start line of any known site.
+        Only the lines of the current hand are kept in memory.
+        """
         hand = []
         hand_started = False
-        bad_hands = 0
         for line in lines:
             line = line.strip()
-            if hand_regexp.match(line):
+            if not line:
                 continue
-            if game_type_regexp.match(line):
+            if dialect is None:
+                dialect = detect_dialect(line)
+                if dialect is None:
+                    continue
+            if dialect.is_separator(line):
+                continue
+            if dialect.is_hand_start(line):
                 hand_started = True
                 # Start new hand
                 if len(hand) > 0:
-                    try:
-                        self.handle_hand(id_prefix, hand)
-                    except Exception as e:
-                        log.debug(e)
-                        bad_hands += 1
+                    yield hand
                     hand = []
             if hand_started:
                 hand.append(line)
         if len(hand) > 0:
+            yield hand
+
+    def iter_hands(self, fileobj: Iterable[str], id_prefix: str = '',
+                   hand_filter: Callable[[List[str]], bool] = None) -> Iterator[Hand]:
+        """
+        Reads hand history incrementally and yields parsed hands one by one.
+        Hands which can't be parsed are skipped and counted in bad_hands.
+        hand_filter is applied to raw lines of a hand, rejected hands are not parsed at all.
+        """
+        for lines in self.split_hands(fileobj):
+            self.__total_hands += 1
+            if hand_filter is not None and not hand_filter(lines):
+                self.__filtered_hands += 1
+                continue
             try:
-                self.handle_hand(id_prefix, hand)
+                hand = self.__hand_class(id_prefix, lines)
             except Exception as e:
                 log.debug(e)
-                bad_hands += 1
-        log.debug(f"Bad hands: {bad_hands}")
+                self.__bad_hands += 1
+                self.__bad_hand_reasons[type(e).__name__] += 1
+                continue
+            yield hand
+
+    def add_lines(self, id_prefix, lines):
+        bad_hands = self.__bad_hands
+        for hand in self.iter_hands(lines, id_prefix):
+            self.__store_hand(hand)
+        log.debug(f"Bad hands: {self.__bad_hands - bad_hands}")
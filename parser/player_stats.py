@@ -0,0 +1,207 @@
+import datetime
+import math
+import sqlite3
+from functools import lru_cache
+from typing import List, Dict, Tuple, Iterable, Optional
+
+from core.types import ActionType
+from hand import Hand
+
+# Counters of one player, every hand adds at most 1 to each of them except aggressive and passive actions
+stats_counters = ['hands', 'vpip', 'pfr', 'three_bet_chances', 'three_bets', 'cbet_chances', 'cbets',
+                  'fold_to_cbet_chances', 'folds_to_cbet', 'aggressive', 'passive']
+(HANDS, VPIP, PFR, THREE_BET_CHANCES, THREE_BETS, CBET_CHANCES, CBETS,
+ FOLD_TO_CBET_CHANCES, FOLDS_TO_CBET, AGGRESSIVE, PASSIVE) = range(len(stats_counters))
+
+voluntary_types = (ActionType.CALL, ActionType.BET, ActionType.RAISE)
+
+
+def hand_counters(hand: Hand) -> Dict[str, List[int]]:
+    """
+    Counters of every player dealt into the hand:
+    vpip - put money in preflop voluntarily, pfr - raised preflop,
+    3-bet - re-raised an open raise, a chance is acting when facing exactly one raise,
+    c-bet - the last preflop raiser bets the flop before anybody else, a chance is the first flop action of the raiser
+    while nobody has bet yet, fold to c-bet - folds as the first response to a c-bet,
+    aggressive and passive - postflop bets and raises, and calls, their ratio is the aggression factor.
+    """
+    counters = {player_name: [1] + [0] * (len(stats_counters) - 1) for player_name in hand.players}
+    raises = 0
+    preflop_raiser = None
+    for action in hand.preflop_actions:
+        counts = counters.get(action.player)
+        if counts is None or action.action_type in (ActionType.SMALLBLIND, ActionType.BIGBLIND):
+            continue
+        if raises == 1:
+            counts[THREE_BET_CHANCES] = 1
+        if action.action_type in voluntary_types:
+            counts[VPIP] = 1
+        if action.action_type == ActionType.RAISE:
+            counts[PFR] = 1
+            if raises == 1:
+                counts[THREE_BETS] = 1
+            raises += 1
+            preflop_raiser = action.player
+
+    cbettor = None
+    for action in hand.flop_actions:
+        counts = counters.get(action.player)
+        if counts is None:
+            continue
+        if cbettor is not None:
+            # Nobody acts twice after the c-bet until it is raised
+            counts[FOLD_TO_CBET_CHANCES] = 1
+            counts[FOLDS_TO_CBET] = int(action.action_type == ActionType.FOLD)
+            if action.action_type == ActionType.RAISE:
+                break
+        elif action.player == preflop_raiser:
+            counts[CBET_CHANCES] = 1
+            if action.action_type != ActionType.BET:
+                break
+            counts[CBETS] = 1
+            cbettor = action.player
+        elif action.action_type in (ActionType.BET, ActionType.RAISE):
+            break
+
+    for actions in (hand.flop_actions, hand.turn_actions, hand.river_actions):
+        for action in actions:
+            counts = counters.get(action.player)
+            if counts is None:
+                continue
+            if action.action_type in (ActionType.BET, ActionType.RAISE):
+                counts[AGGRESSIVE] += 1
+            elif action.action_type == ActionType.CALL:
+                counts[PASSIVE] += 1
+    return counters
+
+
+def hand_day(hand: Hand) -> Optional[int]:
+    return hand.date.toordinal() if hand.date else None
+
+
+class PlayerStatsDelta(object):
+    """
+    Counters of parsed hands by their site hand id, added to the store in one transaction.
+    A hand repeated in the delta is counted once. Hands without a date are not counted,
+    they can't be placed in time.
+    """
+
+    def __init__(self):
+        self.__hands: Dict[str, Tuple[int, Dict[str, List[int]]]] = {}
+
+    def __len__(self):
+        return len(self.__hands)
+
+    def add_hand(self, hand: Hand):
+        day = hand_day(hand)
+        if day is None or hand.site_hand_id in self.__hands:
+            return
+        self.__hands[hand.site_hand_id] = day, hand_counters(hand)
+
+    def hand_ids(self) -> List[str]:
+        return list(self.__hands)
+
+    def counters(self, hand_ids: Iterable[str]) -> Dict[Tuple[str, int], List[int]]:
+        """ Counters of the hands summed per player and day """
+        total = {}
+        for hand_id in hand_ids:
+            day, counters = self.__hands[hand_id]
+            for player_name, counts in counters.items():
+                sums = total.get((player_name, day))
+                if sums is None:
+                    total[player_name, day] = list(counts)
+                    continue
+                for i, value in enumerate(counts):
+                    sums[i] += value
+        return total
+
+
+def ratio(count: int, chances: int) -> float:
+    return count / chances if chances else math.nan
+
+
+class PlayerStats(object):
+    """
+    On-disk store of player statistics in sqlite: counters per player and day, nicknames are interned
+    into integer ids. Ids of counted hands are kept as well, so a hand is counted once however often
+    it is added, by several workers, files or runs.
+    Lookups are point-in-time: statistics of a hand played on some day include only hands of earlier days,
+    so features never see the hand itself or anything after it. Memory is bounded by the lookup cache,
+    the store itself may hold millions of nicknames.
+    """
+
+    def __init__(self, path: str, cache_size: int = 1 << 16):
+        self.__connection = sqlite3.connect(path, timeout=60)
+        self.__connection.execute("PRAGMA journal_mode=WAL")
+        self.__connection.execute("PRAGMA synchronous=NORMAL")
+        with self.__connection:
+            self.__connection.execute("CREATE TABLE IF NOT EXISTS players (id INTEGER PRIMARY KEY, name TEXT UNIQUE)")
+            self.__connection.execute(f"CREATE TABLE IF NOT EXISTS daily (player INTEGER, day INTEGER, "
+                                      f"{', '.join(f'{name} INTEGER' for name in stats_counters)}, "
+                                      f"PRIMARY KEY (player, day)) WITHOUT ROWID")
+            self.__connection.execute("CREATE TABLE IF NOT EXISTS hands (id TEXT PRIMARY KEY) WITHOUT ROWID")
+        self.__counters = lru_cache(maxsize=cache_size)(self.__query)
+
+    @staticmethod
+    def features_names() -> List[str]:
+        return ['opponents_hands', 'opponents_vpip', 'opponents_pfr', 'opponents_three_bet', 'opponents_cbet',
+                'opponents_fold_to_cbet', 'opponents_aggression_factor']
+
+    def __player_ids(self, player_names: List[str], batch_size: int = 500) -> Dict[str, int]:
+        self.__connection.executemany("INSERT OR IGNORE INTO players (name) VALUES (?)",
+                                      ((player_name,) for player_name in player_names))
+        ids = {}
+        for i in range(0, len(player_names), batch_size):
+            batch = player_names[i:i + batch_size]
+            ids.update(self.__connection.execute(
+                f"SELECT name, id FROM players WHERE name IN ({','.join('?' * len(batch))})", batch))
+        return ids
+
+    def add(self, delta: PlayerStatsDelta) -> int:
+        """ Adds counters of hands of the delta which were not counted yet in one transaction, returns their number """
+        if not len(delta):
+            return 0
+        columns = ', '.join(stats_counters)
+        updates = ', '.join(f"{name} = {name} + excluded.{name}" for name in stats_counters)
+        with self.__connection:
+            # The first insert locks the store, the hands can't be counted by another writer in between
+            new_hands = [hand_id for hand_id in delta.hand_ids() if self.__connection.execute(
+                "INSERT OR IGNORE INTO hands (id) VALUES (?)", (hand_id,)).rowcount]
+            counters = delta.counters(new_hands)
+            ids = self.__player_ids(list({player_name for player_name, day in counters}))
+            self.__connection.executemany(
+                f"INSERT INTO daily (player, day, {columns}) VALUES ({','.join('?' * (len(stats_counters) + 2))}) "
+                f"ON CONFLICT (player, day) DO UPDATE SET {updates}",
+                ((ids[player_name], day, *counts) for (player_name, day), counts in counters.items()))
+        return len(new_hands)
+
+    def __query(self, player_name: str, day: int) -> Tuple[int, ...]:
+        sums = ', '.join(f"TOTAL({name})" for name in stats_counters)
+        row = self.__connection.execute(f"SELECT {sums} FROM daily JOIN players ON players.id = daily.player "
+                                        f"WHERE players.name = ? AND day < ?", (player_name, day)).fetchone()
+        return tuple(int(value) for value in row)
+
+    def counters(self, player_name: str, date: datetime.date) -> Tuple[int, ...]:
+        """ Counters of the player over hands played before the date """
+        return self.__counters(player_name, date.toordinal())
+
+    def features(self, player_names: Iterable[str], date: Optional[datetime.date]) -> list:
+        """
+        Statistics of the players pooled over their hands before the date: the number of hands,
+        vpip, pfr, 3-bet, c-bet and fold to c-bet frequencies and the aggression factor.
+        Frequencies without a single chance are NaN, as are all of them for hands without a date.
+        """
+        total = [0] * len(stats_counters)
+        if date is not None:
+            for player_name in player_names:
+                for i, value in enumerate(self.counters(player_name, date)):
+                    total[i] += value
+        return [total[HANDS], ratio(total[VPIP], total[HANDS]), ratio(total[PFR], total[HANDS]),
+                ratio(total[THREE_BETS], total[THREE_BET_CHANCES]), ratio(total[CBETS], total[CBET_CHANCES]),
+                ratio(total[FOLDS_TO_CBET], total[FOLD_TO_CBET_CHANCES]), ratio(total[AGGRESSIVE], total[PASSIVE])]
+
+    def __len__(self):
+        return self.__connection.execute("SELECT COUNT(*) FROM players").fetchone()[0]
+
+    def close(self):
+        self.__connection.close()
@@ -0,0 +1,437 @@
+import logging
+import mmap
+import multiprocessing
+import os
+import time
+import uuid
+import zipfile
+from collections import namedtuple
+from contextlib import contextmanager
+from typing import List, Dict, Callable, FrozenSet, Iterator, Tuple, Optional
+
+from decoder import LineReader
+from feature_cache import FeatureCache
+from feature_extractor import FeatureExtractor, followed_players
+from hand import Hand, LazyHand
+from hand_codec import HandWriter, BINARY_SUFFIX
+from hand_index import HandIndex
+from metrics import Metrics, MetricsReport
+from parser import Parser
+from player_stats import PlayerStats, PlayerStatsDelta
+from sink import FeatureBatch, sinks
+from splitter import Span, split_file
+
+log = logging.getLogger(__name__)
+
+# One hand history file, either a plain file (member is None) or a member of a zip archive at path.
+# A large plain file is split into several items, each covers length bytes from offset and starts on a hand boundary.
+# A plain file extracted from a zip archive keeps the path of the archive in archive
+WorkItem = namedtuple('WorkItem', ['path', 'member', 'dir', 'size', 'offset', 'length', 'archive'],
+                      defaults=(0, None, None))
+ChunkResult = namedtuple('ChunkResult', ['items', 'failed', 'batches', 'worker', 'metrics'])
+
+
+def item_source(item: WorkItem) -> str:
+    return item.dir + os.path.basename(item.member if item.member is not None else item.path)
+
+
+def item_origin(item: WorkItem) -> Tuple[str, Optional[str]]:
+    """
+    Archive and member name the item comes from, the path and None for a plain file which is not from an archive.
+    Unlike the path of an extracted file it is the same on every run. Extracted files are listed from the top
+    directory of their archive, so the member name is the file name.
+    """
+    if item.member is not None:
+        return item.path, item.member
+    if item.archive is not None:
+        return item.archive, os.path.basename(item.path)
+    return item.path, None
+
+
+def item_owner(item: WorkItem) -> str:
+    """
+    Stable name of the item in the hand index. Parts of a split file share the name of the file,
+    their offsets depend on the items and processes of the run.
+    """
+    archive, member = item_origin(item)
+    return archive if member is None else f"{archive}:{member}"
+
+
+@contextmanager
+def open_item(item: WorkItem):
+    """ Lines of the item decoded by LineReader, parts of a split file are read from a memory map """
+    if item.length is not None:
+        with open(item.path, 'rb') as raw, mmap.mmap(raw.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            span = Span(mapped, item.offset, item.length)
+            try:
+                yield LineReader(span)
+            finally:
+                span.close()
+    elif item.member is None:
+        with open(item.path, 'rb') as raw:
+            yield LineReader(raw)
+    else:
+        with zipfile.ZipFile(item.path, 'r') as zip_ref, zip_ref.open(item.member) as raw:
+            yield LineReader(raw)
+
+
+def chunk_target(items: List[WorkItem], processes: int, chunks_per_process: int = 8,
+                 max_chunk_bytes: int = 256 * 1024 * 1024) -> int:
+    total = sum(item.size for item in items)
+    return min(max_chunk_bytes, max(1, total // max(1, processes * chunks_per_process)))
+
+
+def split_large_items(items: List[WorkItem], target: int) -> List[WorkItem]:
+    """
+    Splits plain files bigger than target into items of about target bytes on hand boundaries,
+    so one big file is parsed by several workers. Zip members are compressed and can't be split without reading.
+    """
+    split_items = []
+    for item in items:
+        if item.member is not None or item.length is not None or item.size <= target:
+            split_items.append(item)
+            continue
+        try:
+            spans = split_file(item.path, target)
+        except (OSError, ValueError) as e:
+            log.debug(e)
+            split_items.append(item)
+            continue
+        split_items.extend(item._replace(size=length, offset=offset, length=length) for offset, length in spans)
+    return split_items
+
+
+def make_chunks(items: List[WorkItem], processes: int, chunks_per_process: int = 8,
+                max_chunk_bytes: int = 256 * 1024 * 1024) -> List[List[WorkItem]]:
+    """
+    Packs items into chunks of roughly equal byte size, the biggest chunks go first to avoid stragglers.
+    Items from different archives never share a chunk, so outputs of a chunk belong to a single archive.
+    """
+    target = chunk_target(items, processes, chunks_per_process, max_chunk_bytes)
+    chunks = []
+    by_archive = {}
+    for item in items:
+        by_archive.setdefault(item_origin(item)[0], []).append(item)
+    for archive_items in by_archive.values():
+        chunk, chunk_size = [], 0
+        for item in sorted(archive_items, key=lambda i: i.size, reverse=True):
+            if chunk and chunk_size + item.size > target:
+                chunks.append(chunk)
+                chunk, chunk_size = [], 0
+            chunk.append(item)
+            chunk_size += item.size
+        if chunk:
+            chunks.append(chunk)
+    chunks.sort(key=lambda c: sum(item.size for item in c), reverse=True)
+    return chunks
+
+
+# Per process state, initialized once when the worker starts
+_extractor: FeatureExtractor = None
+_sink_class = None
+_hand_index: HandIndex = None
+_hands_path: str = None
+_run: str = None
+_player_stats: PlayerStats = None
+
+
+def init_worker(nicknames: FrozenSet[str], output_format: str, hand_index_path: str = None, stats_path: str = None,
+                cache_path: str = None, hands_path: str = None, run: str = None):
+    global _extractor, _sink_class, _hand_index, _hands_path, _run
+    _extractor = FeatureExtractor(nicknames, PlayerStats(stats_path) if stats_path else None,
+                                  FeatureCache(cache_path) if cache_path else None)
+    _sink_class = sinks[output_format]
+    _hand_index = HandIndex(hand_index_path) if hand_index_path else None
+    _hands_path = hands_path
+    _run = run
+
+
+def init_counter(stats_path: str):
+    global _player_stats
+    _player_stats = PlayerStats(stats_path)
+
+
+def unique_hands(hands: Iterator[Hand], owner: str, hand_index: HandIndex = None,
+                 batch_size: int = 1000, metrics: Metrics = None, run: str = None, part: int = None) -> Iterator[Hand]:
+    """
+    Drops hands repeated in the file and, with a hand index, hands owned by other files
+    or, for a part of a split file, by other parts in the same run.
+    Hands are claimed in the index in batches to keep the number of transactions low.
+    """
+    metrics = metrics or Metrics()
+
+    def claim(batch: List[Hand]) -> List[Hand]:
+        with metrics.timer('dedup'):
+            claimed = hand_index.claim([h.site_hand_id for h in batch], owner, run, part)
+        metrics.count('hands_rejected.duplicate', len(batch) - len(claimed))
+        return [h for h in batch if h.site_hand_id in claimed]
+
+    seen_hands = set()
+    batch = []
+    for hand in hands:
+        if hand.hand_id in seen_hands:
+            metrics.count('hands_rejected.duplicate')
+            continue
+        seen_hands.add(hand.hand_id)
+        if hand_index is None:
+            yield hand
+            continue
+        batch.append(hand)
+        if len(batch) >= batch_size:
+            yield from claim(batch)
+            batch = []
+    if batch:
+        yield from claim(batch)
+
+
+def extract_batch(hands: List[Hand], source: str, batches: Dict[str, FeatureBatch], metrics: Metrics):
+    """
+    Features of a batch of parsed hands computed at once. An error in any hand fails the whole batch,
+    then the hands are extracted one by one and only the bad ones are rejected.
+    """
+    with metrics.timer('extract'):
+        try:
+            features = _extractor.extract_features_batch(hands)
+        except Exception as e:
+            log.debug(e)
+            features = None
+    for i, hand in enumerate(hands):
+        if features is None:
+            try:
+                with metrics.timer('extract'):
+                    hand_features = _extractor.extract_features(hand)
+            except Exception as e:
+                log.debug(e)
+                metrics.count(f'hands_rejected.{type(e).__name__}')
+                continue
+        else:
+            hand_features = features[i]
+        metrics.count('hands_parsed')
+        if hand_features:
+            batches.setdefault(_sink_class.partition(hand, source), FeatureBatch()).extend(hand_features)
+            metrics.count('rows', len(hand_features))
+
+
+def hands_file_base(item: WorkItem) -> str:
+    source = item_source(item)
+    return source[:-4] if source.endswith('.txt') else source
+
+
+def hands_file_name(item: WorkItem) -> str:
+    """ Binary hands file of an item, parts of a split file get their own files """
+    source = hands_file_base(item)
+    if item.length is not None:
+        source += f"@{item.offset}"
+    return source + BINARY_SUFFIX
+
+
+def remove_hands_files(items: List[WorkItem], hands_path: str):
+    """ Removes binary hands files of the items written by earlier runs, which may have split them differently """
+    bases = {hands_file_base(item) for item in items}
+    for name in os.listdir(hands_path):
+        stem, suffix, _ = name.partition(BINARY_SUFFIX)
+        if suffix and stem.split('@')[0] in bases:
+            os.remove(os.path.join(hands_path, name))
+
+
+def parse_item(item: WorkItem, batches: Dict[str, FeatureBatch], metrics: Metrics, batch_size: int = 1000,
+               hands_writer: HandWriter = None):
+    """
+    Stages timed in metrics: read - decompression, splitting, prefilter and header parsing,
+    dedup - hand index claims, parse - summary and action regexps, extract - features.
+    Features are extracted for batch_size parsed hands at once.
+    With a feature cache actions are parsed during extraction, only for hands which are not cached.
+    With hands_writer every accepted hand is parsed and written in the binary format, stage encode.
+    """
+    # Lazy hands skip parsing of actions for hands where followed players have no known cards
+    parser = Parser(LazyHand)
+    source = item_source(item)
+    with open_item(item) as lines:
+        parsed_hands = metrics.timed(parser.iter_hands(lines, item.dir, _extractor.accepts_lines), 'read')
+        hands = []
+        part = item.offset if item.length is not None else None
+        for hand in unique_hands(parsed_hands, item_owner(item), _hand_index, metrics=metrics,
+                                 run=_run if part is not None else None, part=part):
+            try:
+                with metrics.timer('parse'):
+                    if hands_writer is not None or (
+                            _extractor.cache is None and followed_players(hand, _extractor.nicknames)):
+                        hand.parse_actions()
+                if hands_writer is not None:
+                    with metrics.timer('encode'):
+                        hands_writer.write(hand)
+            except Exception as e:
+                log.debug(e)
+                metrics.count(f'hands_rejected.{type(e).__name__}')
+                continue
+            hands.append(hand)
+            if len(hands) >= batch_size:
+                extract_batch(hands, source, batches, metrics)
+                hands = []
+        if hands:
+            extract_batch(hands, source, batches, metrics)
+        metrics.count(f'files_encoding.{lines.encoding}')
+        metrics.count('replaced_chars', lines.replaced)
+    metrics.count('bytes_read', item.size)
+    metrics.count('hands_split', parser.total_hands)
+    metrics.count('hands_rejected.filtered', parser.filtered_hands)
+    for reason, count in parser.bad_hand_reasons.items():
+        metrics.count(f'hands_rejected.{reason}', count)
+
+
+def parse_chunk(chunk: List[WorkItem]) -> ChunkResult:
+    done, failed = [], []
+    batches: Dict[str, FeatureBatch] = {}
+    metrics = Metrics()
+    for item in chunk:
+        item_batches = {}
+        item_metrics = Metrics()
+        try:
+            if _hands_path is not None:
+                with HandWriter(os.path.join(_hands_path, hands_file_name(item))) as hands_writer:
+                    parse_item(item, item_batches, item_metrics, hands_writer=hands_writer)
+            else:
+                parse_item(item, item_batches, item_metrics)
+        except Exception as e:
+            log.warning(f"Failed to parse {item_source(item)}: {e!r}")
+            failed.append(item)
+            metrics.count('files_failed')
+            metrics.count(f'files_failed.{type(e).__name__}')
+            continue
+        for partition, batch in item_batches.items():
+            batches.setdefault(partition, FeatureBatch()).merge(batch)
+        done.append(item)
+        metrics.merge(item_metrics)
+        metrics.count('files_parsed')
+    return ChunkResult(done, failed, batches, f"worker-{os.getpid()}", metrics)
+
+
+def count_item(item: WorkItem, metrics: Metrics, batch_size: int = 1000):
+    """
+    Adds counters of every hand of the item to the statistics store, batch_size hands per transaction.
+    Reading, parsing, counting and store writes are all timed as the stats stage.
+    """
+    parser = Parser(Hand)
+    delta = PlayerStatsDelta()
+    with open_item(item) as lines:
+        for hand in metrics.timed(parser.iter_hands(lines, item.dir), 'stats'):
+            with metrics.timer('stats'):
+                try:
+                    delta.add_hand(hand)
+                except Exception as e:
+                    log.debug(e)
+                    continue
+                if len(delta) >= batch_size:
+                    metrics.count('hands_counted', _player_stats.add(delta))
+                    delta = PlayerStatsDelta()
+    with metrics.timer('stats'):
+        metrics.count('hands_counted', _player_stats.add(delta))
+
+
+def count_chunk(chunk: List[WorkItem]) -> ChunkResult:
+    done, failed = [], []
+    metrics = Metrics()
+    for item in chunk:
+        try:
+            count_item(item, metrics)
+        except Exception as e:
+            log.warning(f"Failed to count hands of {item_source(item)}: {e!r}")
+            failed.append(item)
+            continue
+        done.append(item)
+    return ChunkResult(done, failed, {}, f"worker-{os.getpid()}", metrics)
+
+
+def count_items(items: List[WorkItem], stats_path: str, processes: int, report: MetricsReport = None):
+    """
+    Counts hands of the items into the statistics store on a pool of workers, which write to the store themselves.
+    The store counts a hand once, so the items may repeat hands of each other and of earlier runs.
+    """
+    with multiprocessing.Pool(processes, initializer=init_counter, initargs=(stats_path,)) as pool:
+        for result in pool.imap_unordered(count_chunk, make_chunks(items, processes)):
+            if result.failed:
+                log.warning(f"Failed to count hands of {len(result.failed)} files")
+            if report is not None:
+                report.add(result.worker, result.metrics)
+
+
+class Throughput(object):
+    """
+    Collects metrics of chunks and logs a progress line every interval seconds
+    """
+
+    def __init__(self, total_bytes: int, interval: float = 30., report: MetricsReport = None):
+        self.__total_bytes = total_bytes
+        self.__interval = interval
+        self.__started = time.monotonic()
+        self.__last_report = self.__started
+        self.__metrics = Metrics()
+        self.__report = report
+
+    @property
+    def metrics(self) -> Metrics:
+        return self.__metrics
+
+    def update(self, worker: str, metrics: Metrics):
+        self.__metrics.merge(metrics)
+        if self.__report is not None:
+            self.__report.add(worker, metrics)
+        if time.monotonic() - self.__last_report >= self.__interval:
+            self.report()
+
+    def report(self):
+        self.__last_report = time.monotonic()
+        elapsed = max(self.__last_report - self.__started, 1e-9)
+        counters = self.__metrics.counters
+        stages = ', '.join(f"{stage} {share:.0%}" for stage, share in self.__metrics.stage_shares().items())
+        log.info(f"Parsed {counters['bytes_read'] / 2 ** 20:.1f}/{self.__total_bytes / 2 ** 20:.1f} MB "
+                 f"({counters['bytes_read'] / 2 ** 20 / elapsed:.2f} MB/s, {counters['hands_split'] / elapsed:.0f} "
+                 f"hands/s, {counters['rows'] / elapsed:.0f} rows/s), time: {stages or '-'}")
+
+
+def parse_items(items: List[WorkItem], nicknames: FrozenSet[str], datasets_path: str, output_format: str = 'csv',
+                processes: int = None, on_chunk_done: Callable[[List[WorkItem], List[str]], None] = None,
+                hand_index_path: str = None, report: MetricsReport = None, stats_path: str = None,
+                cache_path: str = None, hands_path: str = None,
+                on_chunk_written: Callable[[List[WorkItem], List[str]], None] = None):
+    """
+    Parses items on a pool of long-lived worker processes. Workers send back compact feature batches
+    and the calling process is the only writer of the dataset.
+    on_chunk_written is called with parsed items and the outputs they are written to before the outputs
+    are committed, on_chunk_done once the outputs are on disk.
+    With hand_index_path every hand is featurized once across all items and runs sharing the index.
+    With stats_path every hand of the items is first counted into the statistics store, then rows get statistics
+    of the opponents from the store, which doesn't change while features are extracted.
+    With cache_path feature groups and parsed hands are cached by hand content across runs.
+    With hands_path parsed hands of every item are written into a binary file of their own in that directory.
+    Metrics of workers and of the writer are added to report.
+    """
+    processes = processes or os.cpu_count()
+    items = split_large_items(items, chunk_target(items, processes))
+    chunks = make_chunks(items, processes)
+    throughput = Throughput(sum(item.size for item in items), report=report)
+    log.info(f"Found {len(items)} files in {len(chunks)} chunks")
+    if stats_path:
+        count_items(items, stats_path, processes, report)
+    initargs = (nicknames, output_format, hand_index_path, stats_path, cache_path, hands_path, uuid.uuid4().hex)
+    if hands_path:
+        os.makedirs(hands_path, exist_ok=True)
+        remove_hands_files(items, hands_path)
+    features_names = FeatureExtractor.features_names(bool(stats_path))
+    with sinks[output_format](datasets_path, features_names) as sink, \
+            multiprocessing.Pool(processes, initializer=init_worker, initargs=initargs) as pool:
+        for result in pool.imap_unordered(parse_chunk, chunks):
+            writer_metrics = Metrics()
+            with writer_metrics.timer('write'):
+                for partition, batch in result.batches.items():
+                    sink.write(partition, batch)
+                if on_chunk_written is not None:
+                    on_chunk_written(result.items, sink.pending_outputs())
+                outputs = sink.commit()
+            if result.failed:
+                log.warning(f"Failed to parse {len(result.failed)} files")
+            if on_chunk_done is not None:
+                on_chunk_done(result.items, outputs)
+            throughput.update(result.worker, result.metrics)
+            throughput.update('writer', writer_metrics)
+    throughput.report()
@@ -11,6 +11,7 @@ showdown = '*** SUMMARY ***'
 
 hand_regexp = re.compile(r"^Hand #[0-9]+$")
 game_type_regexp = re.compile(r".*Hand #([0-9].*):  (Hold'em No Limit|Omaha Pot Limit) \((.\d+(\.\d+)?\/.\d+(\.\d+)?).*\).*")
+hand_date_regexp = re.compile(r" - (\d{4})/(\d{1,2})/(\d{1,2}) ")
 seat_regexp = re.compile('^Seat (\d): (.*) \((.\d+(\.\d+)?) in chips\)')
 button_regexp = re.compile('^Table.*Seat #(\d) is the button')
 skip_player_regexp = re.compile('^(.*) will be allowed to play after the button')
@@ -22,6 +23,11 @@ call_action_regexp = re.compile("^(.*): calls [$€£]?(\d+(\.\d+)?)")
 bet_action_regexp = re.compile("^(.*): bets [$€£]?(\d+(\.\d+)?)")
 raise_action_regexp = re.compile("^(.*): raises [$€£]?(\d+(\.\d+)?) to [$€£]?(\d+(\.\d+)?)")
 check_action_regexp = re.compile("^(.*): checks")
+# Classifies and extracts any player action in one match, the verb is reported by the name of the last matched group
+action_regexp = re.compile(r"^(?P<player>.*): (?:(?P<fold>folds)|(?P<check>checks)"
+                           r"|calls [$€£]?(?P<call>\d+(?:\.\d+)?)"
+                           r"|bets [$€£]?(?P<bet>\d+(?:\.\d+)?)"
+                           r"|raises [$€£]?\d+(?:\.\d+)? to [$€£]?(?P<raise>\d+(?:\.\d+)?))")
 flop_cards_regexp = re.compile('^\*\*\* FLOP \*\*\* \[(.*)\]')
 turn_cards_regexp = re.compile('^\*\*\* TURN \*\*\* \[(.*)\] \[(.*)\]')
 river_cards_regexp = re.compile('^\*\*\* RIVER \*\*\* \[(.*)\] \[(.*)\]')
@@ -0,0 +1,127 @@
+import sqlite3
+import zlib
+from collections import namedtuple
+from typing import List, Iterator, Iterable
+
+from core.types import ActionType
+from feature_extractor import FeatureExtractor
+from hand import Hand
+
+# Raw hand text with the search keys of the hand, produced by workers and stored by the single writer
+IndexEntry = namedtuple('IndexEntry', ['hand_id', 'site_hand_id', 'id_prefix', 'keys', 'text'])
+
+rank_order = 'AKQJT98765432'
+action_letters = {
+    ActionType.CHECK: 'X',
+    ActionType.CALL: 'C',
+    ActionType.BET: 'B',
+    ActionType.RAISE: 'R',
+}
+
+
+def flop_keys(hand: Hand) -> List[str]:
+    flop = hand.flop_cards[:3]
+    if len(flop) < 3:
+        return []
+    suits = len({card.suit for card in flop})
+    ranks = len({card.rank for card in flop})
+    return [
+        f"flop_suits:{['monotone', 'two_tone', 'rainbow'][suits - 1]}",
+        f"flop_pairing:{['trips', 'paired', 'unpaired'][ranks - 1]}",
+        f"flop_ranks:{''.join(sorted((card.rank for card in flop), key=rank_order.index))}",
+    ]
+
+
+def preflop_keys(hand: Hand) -> List[str]:
+    """
+    preflop - line of voluntary preflop actions without folds, e.g. RRC for open, 3-bet and call,
+    preflop_<n>bet - the player who made the n-th bet, the big blind is the first one and an open raise the second
+    """
+    keys = []
+    line = []
+    level = 1
+    for action in hand.preflop_actions:
+        if action.action_type == ActionType.RAISE:
+            level += 1
+            keys.append(f"preflop_{level}bet:{action.player}")
+        if action.action_type in action_letters:
+            line.append(action_letters[action.action_type])
+    keys.append(f"preflop:{''.join(line)}")
+    return keys
+
+
+def index_keys(hand: Hand) -> List[str]:
+    keys = [f"player:{nickname}" for nickname in hand.players]
+    keys.extend(f"button:{player.nick}" for player in hand.players.values() if player.position == hand.button)
+    keys.extend(preflop_keys(hand))
+    keys.extend(flop_keys(hand))
+    return keys
+
+
+def criteria_keys(criteria: dict) -> List[str]:
+    return [f"{name}:{value}" for name, value in criteria.items()]
+
+
+class SearchIndex(object):
+    """
+    On-disk inverted index of parsed hands stored in sqlite.
+    Every hand is stored once as compressed raw text, together with postings of its search keys:
+    players, the button, preflop action line and bettors, flop suits, pairing and ranks.
+    Criteria are given as keyword arguments and combined with AND, e.g.
+
+        index.hand_ids(preflop_3bet='ValeraBart', button='ValeraBart', flop_suits='monotone')
+    """
+
+    def __init__(self, path: str):
+        self.__connection = sqlite3.connect(path, timeout=60)
+        with self.__connection:
+            self.__connection.execute("CREATE TABLE IF NOT EXISTS hands (id INTEGER PRIMARY KEY, "
+                                      "hand_id TEXT, site_hand_id TEXT UNIQUE, id_prefix TEXT, text BLOB)")
+            self.__connection.execute("CREATE TABLE IF NOT EXISTS postings ("
+                                      "key TEXT, hand INTEGER, PRIMARY KEY (key, hand)) WITHOUT ROWID")
+
+    @staticmethod
+    def entry(hand: Hand, lines: List[str], id_prefix: str) -> IndexEntry:
+        return IndexEntry(hand.hand_id, hand.site_hand_id, id_prefix, index_keys(hand),
+                          zlib.compress('\n'.join(lines).encode()))
+
+    def add(self, entries: Iterable[IndexEntry]) -> int:
+        """ Stores entries in one transaction, hands already in the index are skipped. Returns the number added """
+        added = 0
+        with self.__connection:
+            for entry in entries:
+                cursor = self.__connection.execute(
+                    "INSERT OR IGNORE INTO hands (hand_id, site_hand_id, id_prefix, text) VALUES (?, ?, ?, ?)",
+                    (entry.hand_id, entry.site_hand_id, entry.id_prefix, entry.text))
+                if not cursor.rowcount:
+                    continue
+                self.__connection.executemany("INSERT OR IGNORE INTO postings VALUES (?, ?)",
+                                              ((key, cursor.lastrowid) for key in entry.keys))
+                added += 1
+        return added
+
+    def __rows(self, criteria: dict, columns: str):
+        keys = criteria_keys(criteria)
+        if not keys:
+            return self.__connection.execute(f"SELECT {columns} FROM hands ORDER BY id")
+        postings = ' INTERSECT '.join(['SELECT hand FROM postings WHERE key = ?'] * len(keys))
+        return self.__connection.execute(f"SELECT {columns} FROM hands WHERE id IN ({postings}) ORDER BY id", keys)
+
+    def hand_ids(self, **criteria) -> List[str]:
+        return [hand_id for hand_id, in self.__rows(criteria, 'hand_id')]
+
+    def hands(self, **criteria) -> Iterator[Hand]:
+        for id_prefix, text in self.__rows(criteria, 'id_prefix, text'):
+            yield Hand(id_prefix, zlib.decompress(text).decode().split('\n'))
+
+    def features(self, nicknames: Iterable[str], **criteria) -> Iterator[list]:
+        """ Feature rows of followed players in matching hands, same columns as the parser datasets """
+        extractor = FeatureExtractor(nicknames)
+        for hand in self.hands(**criteria):
+            yield from extractor.extract_features(hand)
+
+    def __len__(self):
+        return self.__connection.execute("SELECT COUNT(*) FROM hands").fetchone()[0]
+
+    def close(self):
+        self.__connection.close()
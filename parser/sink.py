@@ -0,0 +1,250 @@
+import csv
+import os
+import uuid
+from array import array
+from typing import List, Dict, Iterator
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from feature_extractor import FeatureExtractor
+from hand import Hand
+
+string_columns = {'hand_id', 'player_name'}
+categorical_columns = {'street', 'action', 'ready_combination'}
+
+
+def features_schema(features_names: List[str] = None) -> pa.Schema:
+    fields = []
+    for name in features_names or FeatureExtractor.features_names():
+        if name in string_columns:
+            fields.append(pa.field(name, pa.string()))
+        elif name in categorical_columns:
+            fields.append(pa.field(name, pa.dictionary(pa.int32(), pa.string())))
+        else:
+            fields.append(pa.field(name, pa.float32()))
+    return pa.schema(fields)
+
+
+def partition_path(hand: Hand) -> str:
+    """
+    Hive style partition of a hand: site=PokerStars/stakes=0.05-0.1/month=2019-09
+    """
+    month = hand.date.strftime('%Y-%m') if hand.date else 'unknown'
+    return os.path.join(f"site={hand.site}", f"stakes={hand.small_blind:g}-{hand.big_blind:g}", f"month={month}")
+
+
+class FeatureBatch(object):
+    """
+    Column oriented block of feature rows. Integer and float columns are kept in typed arrays,
+    which makes the batch compact in memory and cheap to send between processes.
+    An integer column becomes a float column with the first float, any other value, e.g. None,
+    turns a typed column into a list.
+    """
+
+    def __init__(self):
+        self.__columns = None
+        self.__size = 0
+
+    def __len__(self):
+        return self.__size
+
+    @property
+    def columns(self) -> list:
+        return self.__columns or []
+
+    def extend(self, rows: List[list]):
+        for row in rows:
+            if self.__columns is None:
+                self.__columns = [self.__new_column(value) for value in row]
+            for i, value in enumerate(row):
+                column = self.__columns[i]
+                try:
+                    column.append(value)
+                except TypeError:
+                    column = self.__columns[i] = self.__widen(column, value)
+                    column.append(value)
+            self.__size += 1
+
+    def merge(self, other: 'FeatureBatch'):
+        if not len(other):
+            return
+        if self.__columns is None:
+            self.__columns = [array(c.typecode) if isinstance(c, array) else [] for c in other.columns]
+        for i, values in enumerate(other.columns):
+            column = self.__columns[i]
+            if isinstance(column, array) and not (isinstance(values, array) and column.typecode == values.typecode):
+                if isinstance(values, array):
+                    column = self.__columns[i] = array('d', column)
+                    values = array('d', values)
+                else:
+                    column = self.__columns[i] = list(column)
+            column.extend(values)
+        self.__size += len(other)
+
+    @staticmethod
+    def __new_column(value):
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            return []
+        return array('q') if isinstance(value, int) else array('d')
+
+    @staticmethod
+    def __widen(column: array, value):
+        """ Column which can hold the values of column and value """
+        if column.typecode == 'q' and isinstance(value, float):
+            return array('d', column)
+        return list(column)
+
+    def rows(self) -> Iterator[list]:
+        return (list(row) for row in zip(*self.columns))
+
+
+class CsvSink(object):
+    """
+    Writes features of every input file into its own csv file under datasets_path,
+    a file is created only if there is at least one row for it.
+    Rows of a file split into several items are appended to the file created by the first commit.
+    """
+
+    def __init__(self, datasets_path: str, features_names: List[str] = None):
+        self.__datasets_path = datasets_path
+        self.__features_names = features_names or FeatureExtractor.features_names()
+        self.__files = {}
+        self.__created = set()
+
+    @staticmethod
+    def partition(hand: Hand, source: str) -> str:
+        if source.endswith('.txt'):
+            source = source[:-4]
+        return source + '.csv'
+
+    def write(self, partition: str, rows):
+        if not len(rows):
+            return
+        if partition not in self.__files:
+            if partition in self.__created:
+                fout = open(os.path.join(self.__datasets_path, partition), 'a', newline='')
+                writer = csv.writer(fout)
+            else:
+                fout = open(os.path.join(self.__datasets_path, partition), 'w', newline='')
+                writer = csv.writer(fout)
+                writer.writerow(self.__features_names)
+                self.__created.add(partition)
+            self.__files[partition] = (fout, writer)
+        writer = self.__files[partition][1]
+        writer.writerows(rows.rows() if isinstance(rows, FeatureBatch) else rows)
+
+    def pending_outputs(self) -> List[str]:
+        """ Paths of files written since the last commit """
+        return [fout.name for fout, writer in self.__files.values()]
+
+    def commit(self) -> List[str]:
+        """ Closes files written since the last commit and returns their paths """
+        outputs = []
+        for fout, writer in self.__files.values():
+            fout.close()
+            outputs.append(fout.name)
+        self.__files = {}
+        return outputs
+
+    def close(self):
+        self.commit()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+class ParquetSink(object):
+    """
+    Appends features to a parquet dataset partitioned by site, stakes and month.
+    Every commit produces its own part file inside each partition it touches, so several sinks can write
+    into the same dataset concurrently. Rows are buffered per partition and flushed as row groups.
+    Part files are written under a hidden name and renamed on commit, so readers never see unfinished files.
+    """
+
+    def __init__(self, datasets_path: str, features_names: List[str] = None, row_group_size: int = 100000):
+        self.__datasets_path = datasets_path
+        self.__row_group_size = row_group_size
+        self.__schema = features_schema(features_names)
+        self.__part_name = None
+        self.__buffers: Dict[str, FeatureBatch] = {}
+        self.__writers = {}
+
+    @staticmethod
+    def partition(hand: Hand, source: str) -> str:
+        return partition_path(hand)
+
+    def write(self, partition: str, rows):
+        if not len(rows):
+            return
+        buffer = self.__buffers.setdefault(partition, FeatureBatch())
+        if isinstance(rows, FeatureBatch):
+            buffer.merge(rows)
+        else:
+            buffer.extend(rows)
+        if len(buffer) >= self.__row_group_size:
+            self.__flush(partition)
+
+    def __flush(self, partition: str):
+        batch = self.__buffers.pop(partition)
+        if not len(batch):
+            return
+        if self.__part_name is None:
+            self.__part_name = f"part-{uuid.uuid4().hex}.parquet"
+        if partition not in self.__writers:
+            directory = os.path.join(self.__datasets_path, partition)
+            os.makedirs(directory, exist_ok=True)
+            self.__writers[partition] = pq.ParquetWriter(os.path.join(directory, '.' + self.__part_name),
+                                                         self.__schema)
+        self.__writers[partition].write_table(self.__to_table(batch), row_group_size=len(batch))
+
+    def __to_table(self, batch: FeatureBatch) -> pa.Table:
+        columns = []
+        for field, values in zip(self.__schema, batch.columns):
+            if pa.types.is_dictionary(field.type):
+                columns.append(pa.array(values, type=pa.string()).dictionary_encode())
+            elif isinstance(values, array):
+                arrow_type = pa.int64() if values.typecode == 'q' else pa.float64()
+                columns.append(pa.Array.from_buffers(arrow_type, len(values), [None, pa.py_buffer(values)])
+                               .cast(field.type))
+            else:
+                columns.append(pa.array(values, type=field.type))
+        return pa.Table.from_arrays(columns, schema=self.__schema)
+
+    def pending_outputs(self) -> List[str]:
+        """ Flushes buffered rows and returns paths which part files written since the last commit get on commit """
+        for partition in list(self.__buffers):
+            self.__flush(partition)
+        return [os.path.join(self.__datasets_path, partition, self.__part_name) for partition in self.__writers]
+
+    def commit(self) -> List[str]:
+        """ Flushes buffered rows, closes part files written since the last commit and returns their paths """
+        for partition in list(self.__buffers):
+            self.__flush(partition)
+        outputs = []
+        for partition, writer in self.__writers.items():
+            writer.close()
+            directory = os.path.join(self.__datasets_path, partition)
+            os.replace(os.path.join(directory, '.' + self.__part_name), os.path.join(directory, self.__part_name))
+            outputs.append(os.path.join(directory, self.__part_name))
+        self.__writers = {}
+        self.__part_name = None
+        return outputs
+
+    def close(self):
+        self.commit()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+sinks = {
+    'csv': CsvSink,
+    'parquet': ParquetSink,
+}
@@ -0,0 +1,65 @@
+import mmap
+from typing import List, Optional, Tuple
+
+from decoder import sniff_encoding, split_lines
+from dialect import detect_dialect
+
+# Encodings where a line starting with an ascii prefix can be found by scanning bytes
+byte_scan_encodings = ('utf-8', 'cp1252')
+
+
+def find_hand_prefix(head: bytes) -> Optional[bytes]:
+    """ Encoded hand start prefix of the site of the first hand in head, None if the file can't be split on bytes """
+    encoding, bom_length = sniff_encoding(head)
+    if encoding not in byte_scan_encodings:
+        return None
+    for line in split_lines(head[bom_length:].decode(encoding, errors='replace')):
+        dialect = detect_dialect(line.strip())
+        if dialect is not None:
+            return dialect.hand_start_prefix.encode(encoding)
+    return None
+
+
+def next_hand_start(data, prefix: bytes, position: int) -> int:
+    """ Offset of the first line beginning with prefix at or after position, len(data) if there is none """
+    if position <= 0:
+        return 0
+    found = data.find(b'\n' + prefix, position - 1)
+    return len(data) if found == -1 else found + 1
+
+
+def split_spans(data, prefix: bytes, target: int) -> List[Tuple[int, int]]:
+    """ (offset, length) of pieces of roughly target bytes, every piece starts on a hand boundary """
+    spans = []
+    offset = 0
+    while offset < len(data):
+        end = next_hand_start(data, prefix, offset + max(target, 1))
+        spans.append((offset, end - offset))
+        offset = end
+    return spans
+
+
+def split_file(path: str, target: int) -> List[Tuple[int, int]]:
+    """ Memory maps the file and splits it into pieces which can be parsed independently """
+    with open(path, 'rb') as raw, mmap.mmap(raw.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+        prefix = find_hand_prefix(mapped[:1 << 16])
+        if prefix is None:
+            return [(0, len(mapped))]
+        return split_spans(mapped, prefix, target)
+
+
+class Span(object):
+    """ Read only binary file object over a window of a buffer, e.g. a part of a memory mapped file """
+
+    def __init__(self, buffer, offset: int, length: int):
+        self.__view = memoryview(buffer)[offset:offset + length]
+        self.__position = 0
+
+    def read(self, size: int = -1) -> bytes:
+        end = len(self.__view) if size is None or size < 0 else min(self.__position + size, len(self.__view))
+        data = bytes(self.__view[self.__position:end])
+        self.__position = end
+        return data
+
+    def close(self):
+        self.__view.release()
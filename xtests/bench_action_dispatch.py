@@ -0,0 +1,55 @@
+"""
+Micro-benchmark of action line dispatching over the hands from xtests/examples.py
+
+    PYTHONPATH='.:parser' python3 xtests/bench_action_dispatch.py
+"""
+import timeit
+
+from action import Action
+from core.types import ActionType
+from hand import parse_action
+from regexp import *
+from xtests import examples
+
+
+def sequential_parse_action(line):
+    """ Previous implementation: probe every action regexp in turn and match the winner once more """
+    if fold_action_regexp.search(line):
+        return Action(fold_action_regexp.search(line).group(1), ActionType.FOLD)
+    elif call_action_regexp.search(line):
+        match = call_action_regexp.search(line)
+        return Action(match.group(1), ActionType.CALL, float(match.group(2)))
+    elif bet_action_regexp.search(line):
+        match = bet_action_regexp.search(line)
+        return Action(match.group(1), ActionType.BET, float(match.group(2)))
+    elif check_action_regexp.search(line):
+        return Action(check_action_regexp.search(line).group(1), ActionType.CHECK)
+    elif raise_action_regexp.search(line):
+        match = raise_action_regexp.search(line)
+        return Action(match.group(1), ActionType.RAISE, float(match.group(4)))
+    for marker in ["doesn't show hand", "leaves the table", "Uncalled bet", "is disconnected", "said,",
+                   " collected ", "has timed out", "joins the table at seat", "is connected",
+                   "was removed from the table for failing to post"]:
+        if line.find(marker) != -1:
+            return None
+    return None
+
+
+def example_lines():
+    lines = []
+    for name in dir(examples):
+        if name.startswith('hand'):
+            lines.extend(x.strip() for x in getattr(examples, name).split("\n") if x.strip())
+    return lines
+
+
+def main(repeat=5, number=200):
+    lines = example_lines()
+    assert [sequential_parse_action(line) for line in lines] == [parse_action(line) for line in lines]
+    for name, fn in [('sequential', sequential_parse_action), ('single pass', parse_action)]:
+        best = min(timeit.repeat(lambda: [fn(line) for line in lines], repeat=repeat, number=number))
+        print(f"{name:>12}: {len(lines) * number / best:,.0f} lines/s")
+
+
+if __name__ == '__main__':
+    main()
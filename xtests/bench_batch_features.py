@@ -0,0 +1,35 @@
+"""
+Micro-benchmark of FeaturesPack columns over random hands, one by one and in a batch
+
+    PYTHONPATH='.:parser' python3 xtests/bench_batch_features.py
+"""
+import random
+import time
+
+from features.batch import BatchFeaturesPack
+from xtests.test_batch import random_hand, pack_rows
+
+
+def main(hands_count=20000):
+    rng = random.Random(1)
+    hands = [random_hand(rng, str(i)) for i in range(hands_count)]
+    player_names = [rng.sample(list(hand.players), min(2, len(hand.players))) for hand in hands]
+
+    started = time.perf_counter()
+    expected = [row for hand, names in zip(hands, player_names) for name in names for row in pack_rows(hand, name)]
+    pack_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    batch = BatchFeaturesPack(hands, player_names)
+    batch_seconds = time.perf_counter() - started
+    rows = [row for _, _, _, row in batch.rows()]
+    rows_seconds = time.perf_counter() - started
+    assert repr(rows) == repr(expected)
+
+    print(f"{'FeaturesPack':>20}: {len(expected) / pack_seconds:,.0f} rows/s")
+    print(f"{'batch':>20}: {len(rows) / batch_seconds:,.0f} rows/s")
+    print(f"{'batch with rows':>20}: {len(rows) / rows_seconds:,.0f} rows/s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,57 @@
+"""
+Micro-benchmark of reloading hands from the binary format against parsing their text again
+
+    PYTHONPATH='.:parser' python3 xtests/bench_hand_codec.py
+"""
+import os
+import tempfile
+import time
+
+from decoder import LineReader
+from hand import Hand
+from hand_codec import HandWriter, HandReader
+from parser import Parser
+from xtests.examples import hand127, hand192510344085, hand204214924894, hand207718751903, hand888
+
+
+def main(hands_count=50000):
+    texts = [hand127, hand192510344085, hand204214924894, hand207718751903, hand888]
+    with tempfile.TemporaryDirectory() as directory:
+        text_path = os.path.join(directory, 'hands.txt')
+        with open(text_path, 'w') as fout:
+            for i in range(hands_count):
+                fout.write(texts[i % len(texts)].replace('#', f'#{i}', 1) + '\n\n')
+
+        with open(text_path, 'rb') as raw:
+            hands = [Hand('xx', lines) for lines in Parser.split_hands(LineReader(raw))]
+
+        binary_path = os.path.join(directory, 'hands.bin')
+        started = time.perf_counter()
+        with HandWriter(binary_path) as writer:
+            for hand in hands:
+                writer.write(hand)
+        write_seconds = time.perf_counter() - started
+
+        # Hands are not kept, garbage collection of millions of live objects would dominate both
+        started = time.perf_counter()
+        with open(text_path, 'rb') as raw:
+            parsed_count = sum(1 for lines in Parser.split_hands(LineReader(raw)) if Hand('xx', lines))
+        parse_seconds = time.perf_counter() - started
+
+        started = time.perf_counter()
+        with HandReader(binary_path) as reader:
+            read_count = sum(1 for hand in reader)
+        read_seconds = time.perf_counter() - started
+        assert parsed_count == read_count == len(hands)
+        with HandReader(binary_path) as reader:
+            assert reader.hand(hands[-1].hand_id).river_actions == hands[-1].river_actions
+
+        print(f"{'parse text':>20}: {len(hands) / parse_seconds:,.0f} hands/s, "
+              f"{os.path.getsize(text_path) / len(hands):.0f} bytes/hand")
+        print(f"{'write binary':>20}: {len(hands) / write_seconds:,.0f} hands/s, "
+              f"{os.path.getsize(binary_path) / len(hands):.0f} bytes/hand")
+        print(f"{'read binary':>20}: {len(hands) / read_seconds:,.0f} hands/s")
+
+
+if __name__ == '__main__':
+    main()
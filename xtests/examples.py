@@ -228,3 +228,40 @@ Seat 1: 0Human0 folded before Flop (didn't bet)\n\
 Seat 2: MMAsherdog (button) showed [7c 7h] and won ($19797) with a full house, Fives full of Sevens\n\
 Seat 3: Stefan11222 (small blind) showed [As Js] and lost with three of a kind, Fives\n\
 Seat 6: ga207 (big blind) folded before Flop"
+
+
+hand888 = "#Game No : 1010101010\n\
+***** 888poker Hand History for Game 1010101010 *****\n\
+$0.05/$0.10 Blinds No Limit Holdem - *** 13 09 2019 10:12:34\n\
+Table Aberdeen 6 Max (Real Money)\n\
+Seat 4 is the button\n\
+Total number of players : 5\n\
+Seat 1: ValeraBart ( $10.00 )\n\
+Seat 2: Tigriana ( $12.35 )\n\
+Seat 4: cpatras1 ( $9.80 )\n\
+Seat 5: rodito_139 ( $10 )\n\
+Seat 6: AcceptMe77 ( $4.12 )\n\
+rodito_139 posts small blind [$0.05]\n\
+AcceptMe77 posts big blind [$0.10]\n\
+** Dealing down cards **\n\
+Dealt to ValeraBart [ 7c, 8d ]\n\
+ValeraBart raises [$0.30]\n\
+Tigriana folds\n\
+cpatras1 folds\n\
+rodito_139 folds\n\
+AcceptMe77 calls [$0.20]\n\
+** Dealing flop ** [ 2h, 5d, Kc ]\n\
+AcceptMe77 checks\n\
+ValeraBart bets [$0.35]\n\
+AcceptMe77 raises [$1]\n\
+ValeraBart calls [$0.65]\n\
+** Dealing turn ** [ 9s ]\n\
+AcceptMe77 checks\n\
+ValeraBart checks\n\
+** Dealing river ** [ 4c ]\n\
+AcceptMe77 bets [$1.50]\n\
+ValeraBart calls [$1.50]\n\
+** Summary **\n\
+AcceptMe77 shows [ Kd, 5s ]\n\
+ValeraBart mucks [ 7c, 8d ]\n\
+AcceptMe77 collected [ $5.37 ]"
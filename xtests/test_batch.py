@@ -0,0 +1,104 @@
+import random
+from collections import namedtuple
+
+import numpy as np
+import pytest
+
+from action import ActionLog
+from core.types import ActionType, Street
+from feature_extractor import FeatureExtractor
+import features.batch
+from features.batch import BatchFeaturesPack, segment_cumsum
+from features.features import FeaturesPack
+from hand import Hand
+from player import Player
+from xtests.examples import hand192510344085, hand204214924894, hand888
+
+# Only what BatchFeaturesPack and FeaturesPack read from a hand
+PackHand = namedtuple('PackHand', ['hand_id', 'actions', 'players', 'big_blind'])
+
+
+def random_hand(rng: random.Random, hand_id: str) -> PackHand:
+    """ Arbitrary action sequences, including ones no site produces: repeated calls, bets after bets """
+    names = [f"player{i}" for i in range(rng.randint(2, 9))]
+    players = {name: Player(i, name, round(rng.uniform(1, 500), 2)) for i, name in enumerate(names)}
+    big_blind = rng.choice([0.02, 0.1, 0.25, 0.5, 2.0])
+    log = ActionLog()
+    log.append(names[0], ActionType.SMALLBLIND, Street.PREFLOP, big_blind / 2)
+    log.append(names[1], ActionType.BIGBLIND, Street.PREFLOP, big_blind)
+    for street in Street:
+        for _ in range(rng.randint(0, 12)):
+            action_type = rng.choice([ActionType.CHECK, ActionType.FOLD, ActionType.CALL, ActionType.BET,
+                                      ActionType.RAISE])
+            bet_size = round(rng.uniform(0.01, 30), 2) if action_type in [ActionType.CALL, ActionType.BET,
+                                                                           ActionType.RAISE] else 0
+            log.append(rng.choice(names), action_type, street, bet_size)
+    return PackHand(hand_id, log, players, big_blind)
+
+
+def pack_rows(hand: PackHand, player_name: str):
+    pack = FeaturesPack(hand.players, player_name, hand.big_blind)
+    rows = []
+    for street in Street:
+        pack.street_start(street)
+        for i in range(len(hand.actions)):
+            if hand.actions.streets[i] != street.value:
+                continue
+            action = hand.actions.action(i)
+            if action.player == player_name and action.action_type not in [ActionType.SMALLBLIND,
+                                                                           ActionType.BIGBLIND]:
+                rows.append([hand.hand_id, player_name, street.name, action.action_type.name,
+                             action.bet_size / hand.big_blind] + pack.collect_features())
+            pack.collect_action(action)
+    return rows
+
+
+def test_segment_cumsum():
+    values = np.array([0.1, 0.2, 0.3, 0.1, 0.7, 0.2])
+    starts = np.array([True, False, False, True, False, False])
+    expected = [0.1, 0.1 + 0.2, 0.1 + 0.2 + 0.3, 0.1, 0.1 + 0.7, 0.1 + 0.7 + 0.2]
+    assert segment_cumsum(values, starts).tolist() == expected
+    assert segment_cumsum(values, starts, np.array([10., 1.])).tolist() == [
+        10 + 0.1, 10 + 0.1 + 0.2, 10 + 0.1 + 0.2 + 0.3, 1 + 0.1, 1 + 0.1 + 0.7, 1 + 0.1 + 0.7 + 0.2]
+
+
+def test_random_hands_identical_to_features_pack():
+    rng = random.Random(16)
+    hands = [random_hand(rng, str(i)) for i in range(300)]
+    player_names = [rng.sample(list(hand.players), rng.randint(0, min(3, len(hand.players)))) for hand in hands]
+    expected = [row for hand, names in zip(hands, player_names) for name in names for row in pack_rows(hand, name)]
+    batch = BatchFeaturesPack(hands, player_names)
+    assert len(batch) == len(expected)
+    rows = [row for _, _, _, row in batch.rows()]
+    # repr tells 1 from 1.0 and compares floats bitwise
+    assert repr(rows) == repr(expected)
+
+
+def test_columns_follow_feature_columns(monkeypatch):
+    assert BatchFeaturesPack.features_names() == FeaturesPack.features_names()
+    rng = random.Random(3)
+    hands = [random_hand(rng, str(i)) for i in range(20)]
+    player_names = [list(hand.players)[:1] for hand in hands]
+    rows = [row for _, _, _, row in BatchFeaturesPack(hands, player_names).rows()]
+    monkeypatch.setattr(features.batch, 'batch_columns', features.batch.batch_columns[::-1])
+    reversed_rows = [row for _, _, _, row in BatchFeaturesPack(hands, player_names).rows()]
+    assert reversed_rows == [row[:5] + row[5:][::-1] for row in rows]
+    monkeypatch.setattr(features.batch, 'batch_columns', features.batch.batch_columns[1:])
+    with pytest.raises(AssertionError):
+        BatchFeaturesPack(hands, player_names)
+
+
+def test_empty_batch():
+    assert list(BatchFeaturesPack([], []).rows()) == []
+    rng = random.Random(0)
+    assert list(BatchFeaturesPack([random_hand(rng, '0')], [[]]).rows()) == []
+
+
+def test_extract_features_batch():
+    hands = []
+    for i, text in enumerate([hand192510344085, hand204214924894, hand888, hand192510344085]):
+        hands.append(Hand(f"xx{i}", [x.strip() for x in filter(lambda x: x != '', text.split("\n"))]))
+    fe = FeatureExtractor(['BigBlindBets', '0Human0', 'ValeraBart', 'MMAsherdog', 'AcceptMe77'])
+    expected = [fe.extract_features(hand) for hand in hands]
+    assert sum(map(len, expected)) > 0
+    assert repr(fe.extract_features_batch(hands)) == repr(expected)
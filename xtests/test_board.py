@@ -1,7 +1,7 @@
 import pytest
 
 from core.card import Card
-from features.board import Board
+from features.board import Board, canonical_board
 
 
 @pytest.mark.parametrize(
@@ -24,3 +24,30 @@ from features.board import Board
 )
 def test_board(board, expected):
     assert board.extract_features() == expected
+
+
+def cards(text):
+    return [Card(card[1], card[0]) for card in text.split()]
+
+
+@pytest.mark.parametrize(
+    "board, expected",
+    [('', [0, 0, 0, 0, 0, 0, 0, 0, 0]),
+     ('AS KS QS', [0, 0, 3, 1, 0, 1, 3, 1, 14]),
+     ('2H 2D 7C', [1, 0, 1, 0, 1, 0, 1, 0, 7]),
+     ('AS 2D 3C 4H', [0, 0, 1, 0, 1, 0, 4, 2, 14]),
+     ('9S 8S 2D 2C 2H', [0, 1, 2, 0, 0, 0, 2, 0, 9]),
+     ('TS JD QC', [0, 0, 1, 0, 1, 0, 3, 3, 12]),
+     ('KH KD 5H 5S', [2, 0, 2, 0, 0, 0, 1, 0, 13]),
+     ],
+)
+def test_texture(board, expected):
+    assert Board(cards(board)).texture_features() == expected
+    assert len(Board.texture_names()) == len(expected)
+
+
+def test_texture_is_suit_independent():
+    assert canonical_board(cards('AS KS 7D')) == canonical_board(cards('KH AH 7C'))
+    assert canonical_board(cards('AS KS 7D')) != canonical_board(cards('AS KD 7D'))
+    assert Board(cards('9C 8C 2D 3H')).texture_features() == Board(cards('9H 8H 2S 3C')).texture_features()
+    assert Board(cards('9C 8C 2D')).extract_features() != Board(cards('9H 8H 2S')).extract_features()
@@ -0,0 +1,30 @@
+import copy
+import pickle
+
+import pytest
+
+from core.card import Card
+from hand import create_cards
+
+
+def test_cards_are_interned():
+    assert len(Card.deck) == len({id(card) for card in Card.deck}) == 52
+    assert [card.id for card in Card.deck] == list(range(52))
+    assert Card('H', 'A') is Card.from_str('Ah') is Card.from_str('AH') is Card.from_id(Card('H', 'A').id)
+    assert create_cards(['Td', '2s']) == [Card('D', 'T'), Card('S', '2')]
+    card = Card('C', '7')
+    assert pickle.loads(pickle.dumps(card)) is card and copy.deepcopy(card) is card
+    assert (card.suit, card.rank, str(card), card.get_index()) == ('C', '7', '7C', 'C7')
+    with pytest.raises(AttributeError):
+        card.rank = '8'
+    with pytest.raises(ValueError):
+        Card('X', '7')
+    with pytest.raises(ValueError):
+        Card.from_str('1x')
+
+
+def test_card_equality_and_hash():
+    assert Card('S', 'K') == Card('S', 'K') and Card('S', 'K') != Card('H', 'K')
+    assert Card('S', 'K') != 'KS' and Card('S', 'K') in {Card('S', 'K')}
+    assert hash(Card('S', 'A')) == 0 and hash(Card('C', 'K')) == 312
+    assert len({Card(suit, rank) for suit in Card.valid_suit for rank in Card.valid_rank}) == 52
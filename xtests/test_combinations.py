@@ -1,7 +1,11 @@
+import random
+
+import numpy as np
 import pytest
 
 from core.card import Card
-from features.combinations import Combination, ReadyCombinationType, DrawCombinationType
+from features.combinations import Combination, ReadyCombinationType, DrawCombinationType, card_mask, evaluate, \
+    evaluate_batch
 
 
 @pytest.mark.parametrize(
@@ -206,3 +210,46 @@ def test_ready_combination_type(test_input, expected):
 )
 def test_draw_combination_type(test_input, expected_output):
     assert test_input.draw_combination() == expected_output
+
+
+def test_card_mask():
+    assert card_mask([]) == 0
+    assert card_mask([Card('S', '2')]) == 1
+    assert card_mask([Card('C', 'A'), Card('S', '3')]) == (1 << (12 + 16)) | (1 << 1)
+
+
+@pytest.mark.parametrize(
+    "board, hole, expected",
+    [([Card('C', 'A'), Card('D', '2'), Card('S', '9')], [Card('H', '4'), Card('C', '5')],
+      (ReadyCombinationType.AIR, DrawCombinationType.GUTSHOT)),  # wheel gutshot
+     ([Card('C', '8'), Card('D', '8'), Card('S', 'J')], [Card('H', '9'), Card('C', 'Q')],
+      (ReadyCombinationType.ONE_PAIR, DrawCombinationType.BACKDOOR_STRAIGHT)),  # paired rank doesn't fill a gutshot
+     ([Card('C', '8'), Card('D', 'J'), Card('S', 'J')], [Card('H', '9'), Card('C', 'Q')],
+      (ReadyCombinationType.ONE_PAIR, DrawCombinationType.GUTSHOT)),
+     ([Card('S', '8'), Card('D', '9'), Card('H', '2')], [Card('S', 'T'), Card('S', 'K')],
+      (ReadyCombinationType.HIGH_CARD, DrawCombinationType.DOUBLE_BACKDOOR)),
+     ([Card('C', 'T'), Card('D', 'J'), Card('S', '3')], [Card('H', 'K'), Card('C', 'A')],
+      (ReadyCombinationType.HIGH_CARD, DrawCombinationType.BACKDOOR_STRAIGHT)),  # ten to ace is not a gutshot
+     ([Card('C', 'T'), Card('D', 'J'), Card('S', 'Q')], [Card('H', 'K'), Card('C', '2')],
+      (ReadyCombinationType.HIGH_CARD, DrawCombinationType.DOUBLE_STRAIGHT_DRAW)),
+     ]
+)
+def test_evaluate_draw_edge_cases(board, hole, expected):
+    assert evaluate(card_mask(board), card_mask(hole)) == expected
+    ready, draw = evaluate_batch(np.array([card_mask(board)]), np.array([card_mask(hole)]))
+    assert (ReadyCombinationType(ready[0]), DrawCombinationType(draw[0])) == expected
+
+
+def test_evaluate_batch():
+    rng = random.Random(20)
+    deck = [Card(suit, rank) for suit in Card.valid_suit for rank in Card.valid_rank]
+    boards, holes, expected = [], [], []
+    for _ in range(5000):
+        cards = rng.sample(deck, rng.choice([0, 3, 4, 5]) + 2)
+        combination = Combination(cards[2:], cards[:2])
+        boards.append(card_mask(cards[2:]))
+        holes.append(card_mask(cards[:2]))
+        expected.append((combination.ready_combination(), combination.draw_combination()))
+        assert evaluate(boards[-1], holes[-1]) == expected[-1]
+    ready, draw = evaluate_batch(np.array(boards), np.array(holes))
+    assert [(ReadyCombinationType(r), DrawCombinationType(d)) for r, d in zip(ready, draw)] == expected
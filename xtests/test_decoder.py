@@ -0,0 +1,62 @@
+import io
+
+import pytest
+
+from decoder import LineReader, sniff_encoding
+from parser import Parser
+from xtests.examples import hand204214924894
+
+
+@pytest.mark.parametrize(
+    "data, encoding",
+    [(b'\xef\xbb\xbfPokerStars', 'utf-8'),
+     ('PokerStars €0.05'.encode('utf-16'), 'utf-16-le'),
+     ('€0.05/€0.10'.encode('utf-8'), 'utf-8'),
+     ('€0.05/€0.10 £'.encode('cp1252'), 'cp1252')],
+)
+def test_sniff_encoding(data, encoding):
+    assert sniff_encoding(data)[0] == encoding
+
+
+@pytest.mark.parametrize("block_size", [1, 2, 3, 7, 1 << 20])
+def test_line_reader_blocks(block_size):
+    text = "first €1\r\nsecond\rthird\n\nlast"
+    reader = LineReader(io.BytesIO(b'\xef\xbb\xbf' + text.encode('utf-8')), block_size)
+    assert list(reader) == ['first €1', 'second', 'third', '', 'last']
+    assert reader.encoding == 'utf-8'
+    assert reader.replaced == 0
+
+
+@pytest.mark.parametrize("block_size", [1, 5, 1 << 20])
+def test_line_reader_splits_only_on_line_endings(block_size):
+    text = "Seat 1: a\x0bb\x0cc\x1cd\x1de\x1ef\x85g\u2028h\u2029i ($10)\r\nnext\r"
+    assert list(LineReader(io.BytesIO(text.encode('utf-8')), block_size)) == [text[:-7], 'next']
+
+
+def test_line_reader_parses_hands_in_any_encoding(parser):
+    for data in [hand204214924894.encode('utf-8'), hand204214924894.encode('cp1252'),
+                 hand204214924894.replace('\n', '\r\n').encode('utf-16')]:
+        hands = list(Parser().iter_hands(LineReader(io.BytesIO(data), 64), 'xx'))
+        assert [hand.hand_id for hand in hands] == ['xx_204214924894']
+        assert hands[0].small_blind == 0.05
+
+
+def test_line_reader_replaces_bad_bytes():
+    reader = LineReader(io.BytesIO(b'ok\n\x81\x8d\n'), fallback='cp1252')
+    assert list(reader) == ['ok', '��']
+    assert reader.replaced == 2
+
+
+@pytest.mark.parametrize("block_size", [4, 16])
+def test_line_reader_falls_back_after_ascii_block(block_size):
+    # The first block is ASCII and sniffed as utf-8, a pound sign in cp1252 comes later
+    reader = LineReader(io.BytesIO('ascii only\nPlayer£ ($10)\n'.encode('cp1252')), block_size)
+    assert list(reader) == ['ascii only', 'Player£ ($10)']
+    assert reader.encoding == 'cp1252'
+    assert reader.replaced == 0
+
+    # Bad bytes of a utf-8 file are replaced
+    reader = LineReader(io.BytesIO('€ first line of the file\n'.encode('utf-8') + b'bad \x81\n'), block_size)
+    assert list(reader) == ['€ first line of the file', 'bad �']
+    assert reader.encoding == 'utf-8'
+    assert reader.replaced == 1
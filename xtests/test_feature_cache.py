@@ -0,0 +1,80 @@
+import feature_extractor
+from feature_cache import FeatureCache
+from feature_extractor import FeatureExtractor, FeatureGroup, feature_groups
+from hand import Hand, LazyHand
+from xtests.examples import hand192510344085, hand204214924894, hand888
+
+nicknames = ['BigBlindBets', '0Human0', 'ValeraBart', 'MMAsherdog', 'AcceptMe77']
+
+
+def make_hands(hand_class=Hand):
+    hands = []
+    for i, text in enumerate([hand192510344085, hand204214924894, hand888, hand192510344085]):
+        hands.append(hand_class(f"xx{i}", [x.strip() for x in filter(lambda x: x != '', text.split("\n"))]))
+    return hands
+
+
+def failing(*args):
+    raise AssertionError("cached group is computed again")
+
+
+def test_cached_features_are_identical(tmp_path, monkeypatch):
+    expected = FeatureExtractor(nicknames).extract_features_batch(make_hands())
+    assert sum(map(len, expected)) > 0
+    cache = FeatureCache(str(tmp_path / 'cache.db'))
+    assert FeatureExtractor(nicknames, cache=cache).extract_features_batch(make_hands(LazyHand)) == expected
+    # The same hand in two files is cached once and keeps the hand_id of each file,
+    # hands without followed players with known cards are not parsed at all
+    assert len(cache) == 2
+    assert expected[0][0][0] == 'xx0_192510344085' and expected[3][0][0] == 'xx3_192510344085'
+    cache.close()
+
+    # Every group comes from the cache, actions are never parsed
+    cache = FeatureCache(str(tmp_path / 'cache.db'))
+    monkeypatch.setattr(Hand, 'parse_actions', failing)
+    assert FeatureExtractor(nicknames, cache=cache).extract_features_batch(make_hands(LazyHand)) == expected
+
+
+def test_only_new_and_changed_groups_are_computed(tmp_path, monkeypatch):
+    cache = FeatureCache(str(tmp_path / 'cache.db'))
+    expected = FeatureExtractor(nicknames, cache=cache).extract_features_batch(make_hands(LazyHand))
+
+    def street_names(hands, players):
+        return [[[[len(hand.actions)]] * len(row_streets) for row_streets in
+                 [feature_extractor.decision_streets(hand, player_name) for player_name in hand_players]]
+                for hand, hand_players in zip(hands, players)]
+
+    pack, board, combination = feature_groups
+    monkeypatch.setattr(feature_extractor, 'feature_groups', [
+        pack._replace(extract=failing),
+        board._replace(extract=failing),
+        combination._replace(version=2),
+        FeatureGroup('actions', 1, lambda: ['hand_actions'], street_names),
+    ])
+    rows = FeatureExtractor(nicknames, cache=cache).extract_features_batch(make_hands(LazyHand))
+    assert [[row[:-1] for row in hand_rows] for hand_rows in rows] == expected
+    assert rows[0][0][-1] == len(make_hands()[0].actions)
+
+    # Both groups are cached now
+    monkeypatch.setattr(feature_extractor, 'feature_groups', [
+        group._replace(extract=failing) for group in feature_extractor.feature_groups])
+    assert FeatureExtractor(nicknames, cache=cache).extract_features_batch(make_hands(LazyHand)) == rows
+
+
+def test_cached_hands_are_loaded_at_once(tmp_path, monkeypatch):
+    cache = FeatureCache(str(tmp_path / 'cache.db'))
+    FeatureExtractor(nicknames, cache=cache).extract_features_batch(make_hands(LazyHand))
+    keys = [hand.content_hash for hand in make_hands()] + [b'missing']
+    cached = cache.hands(keys, batch_size=1)
+    assert len(cached) == 2 and b'missing' not in cached
+    assert {key: hand.site_hand_id for key, hand in cache.hands(keys).items()} == \
+           {key: hand.site_hand_id for key, hand in cached.items()}
+
+    # A changed group takes the parsed hands of the whole batch from the cache in one call
+    calls = []
+    hands = cache.hands
+    monkeypatch.setattr(cache, 'hands', lambda keys: calls.append(keys) or hands(keys))
+    pack, board, combination = feature_groups
+    monkeypatch.setattr(feature_extractor, 'feature_groups', [pack, board, combination._replace(version=2)])
+    FeatureExtractor(nicknames, cache=cache).extract_features_batch(make_hands(LazyHand))
+    assert len(calls) == 1 and len(set(calls[0])) == 2
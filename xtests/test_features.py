@@ -1,8 +1,12 @@
 from feature_extractor import FeatureExtractor
-from features.features import FeaturesPack, CallTotalAmount
+import pytest
+
+from core.types import ActionType, Street
+from features.features import FeaturesPack, CallTotalAmount, Feature, feature_columns, register_feature
+from action import Action
 from hand import Hand
 from player import Player
-from xtests.examples import hand192510344085, hand204214924894
+from xtests.examples import hand192510344085, hand204214924894, hand888
 
 
 def test_order_players():
@@ -68,6 +72,7 @@ def test_hand192510344085(parser):
                            4,  # Fold street amount
                            0,  # Player position
                            0,  # Players in pot
+                           0,  # After us decision players
                            1.5,  # Current pot size
                            101.95,  # Current player stack size
                            0.5,  # Paid on all streets
@@ -92,6 +97,7 @@ def test_hand192510344085(parser):
                            0,  # Fold street amount
                            0,  # Player position
                            2,  # Players in pot
+                           1,  # After us decision players
                            6.0,  # Current pot size
                            99.45,  # Current player stack size
                            3.0,  # % Which we already pay
@@ -117,6 +123,7 @@ def test_hand192510344085(parser):
                            0,  # Fold street amount
                            0,  # Player position
                            2,  # Players in pot
+                           1,  # After us decision players
                            6.0,  # Current pot size
                            99.45,  # Current player stack size
                            3.0,  # % Which we already pay
@@ -142,6 +149,7 @@ def test_hand192510344085(parser):
                            0,  # Fold street amount
                            0,  # Player position
                            2,  # Players in pot
+                           1,  # After us decision players
                            6.0,  # Current pot size
                            99.45,  # Current player stack size
                            3.,  # % Which we already pay
@@ -175,6 +183,7 @@ def test_hand204214924894(parser):
                            0,  # Fold street amount
                            2,  # Player position
                            0,  # Players in pot
+                           4,  # After us decision players
                            1.5000000000000002,  # Current pot size
                            87.89999999999999,  # Current player stack size
                            0.,  # Paid on all streets
@@ -200,6 +209,7 @@ def test_hand204214924894(parser):
                            3,  # Fold street amount
                            2,  # Player position
                            3,  # Players in pot
+                           0,  # After us decision players
                            10.5,  # Current pot size
                            86.89999999999999,  # Current player stack size
                            0.9999999999999964,  # Paid on all streets
@@ -225,6 +235,7 @@ def test_hand204214924894(parser):
                            1,  # Fold street amount
                            5,  # Player position
                            2,  # Players in pot
+                           3,  # After us decision players
                            6.5,  # Current pot size
                            42.5,  # Current player stack size
                            0.,  # Paid on all streets
@@ -250,6 +261,7 @@ def test_hand204214924894(parser):
                            4,  # Fold street amount
                            5,  # Player position
                            2,  # Players in pot
+                           0,  # After us decision players
                            97.39999999999999,  # Current pot size
                            38.5,  # Current player stack size
                            3.999999999999999,  # Paid on all streets
@@ -259,3 +271,117 @@ def test_hand204214924894(parser):
                            0, 0, 0, 0,  # Suits
                            'AIR'  # Current combination
                            ]
+
+
+def test_accepts_lines():
+    lines = [x.strip() for x in filter(lambda x: x != '', hand192510344085.split("\n"))]
+    assert FeatureExtractor(['BigBlindBets']).accepts_lines(lines)
+    assert not FeatureExtractor(['EthanBinder_']).accepts_lines(lines)
+    assert not FeatureExtractor([]).accepts_lines(lines)
+    lines = [x.strip() for x in filter(lambda x: x != '', hand888.split("\n"))]
+    assert FeatureExtractor(['AcceptMe77']).accepts_lines(lines)
+    assert not FeatureExtractor(['BigBlindBets']).accepts_lines(lines)
+    assert len(FeatureExtractor(['ValeraBart']).extract_features(Hand('xx', lines))) > 0
+
+
+def test_iter_hands_with_prefilter(parser):
+    fe = FeatureExtractor(['BigBlindBets'])
+    text = hand192510344085 + "\n\n" + hand204214924894
+    hands = list(parser.iter_hands(text.split("\n"), 'xx', fe.accepts_lines))
+    assert [hand.hand_id for hand in hands] == ['xx_192510344085']
+    assert parser.filtered_hands == 1
+
+
+class RaisesOfPlayer(Feature):
+    def __init__(self, player_name: str):
+        self.__player_name = player_name
+        self.__raises = 0
+
+    @classmethod
+    def create(cls, pack: FeaturesPack) -> Feature:
+        return cls(pack.player_name)
+
+    def street_start(self, street: Street):
+        pass
+
+    def handle_action(self, action: Action):
+        if action.player == self.__player_name and action.action_type == ActionType.RAISE:
+            self.__raises += 1
+
+    def snapshot(self):
+        return self.__raises
+
+    def restore(self, state):
+        self.__raises = state
+
+    @property
+    def value(self):
+        return self.__raises
+
+
+@pytest.fixture
+def raises_feature():
+    register_feature('player_raises', RaisesOfPlayer)
+    yield
+    feature_columns.pop()
+
+
+def test_collect_features_into_row():
+    players = {'ab': Player(0, 'ab', 10), 'ac': Player(1, 'ac', 15)}
+    pack = FeaturesPack(players, 'ac', 0.5)
+    pack.street_start(Street.PREFLOP)
+    pack.collect_action(Action('ab', ActionType.SMALLBLIND, 0.25))
+    pack.collect_action(Action('ac', ActionType.BIGBLIND, 0.5))
+    pack.collect_action(Action('ab', ActionType.RAISE, 1.5))
+    row = [None] * len(feature_columns)
+    assert pack.collect_features(row) is row
+    assert row == pack.collect_features()
+    assert row == [0, 0, 0, 1, 0, 0, 0, 0, 1, 0, 1, 1, 0, 4.0, 29.0, 1.0, 2.0, 3.0]
+
+
+def test_register_feature(raises_feature):
+    assert FeaturesPack.features_names()[-1] == 'player_raises'
+    with pytest.raises(ValueError):
+        register_feature('player_raises', RaisesOfPlayer)
+    lines = [x.strip() for x in filter(lambda x: x != '', hand192510344085.split("\n"))]
+    hand = Hand('xx', lines)
+    fe = FeatureExtractor(['BigBlindBets'])
+    features = fe.extract_features(hand)
+    assert len(features[0]) == len(fe.features_names())
+    assert [row[len(FeaturesPack.features_names()) - 1] for row in features] == [0, 1, 1, 1]
+    assert fe.extract_features_batch([hand]) == [features]
+
+
+def test_snapshot_restore():
+    lines = [x.strip() for x in filter(lambda x: x != '', hand192510344085.split("\n"))]
+    hand = Hand('xx', lines)
+    pack = FeaturesPack(hand.players, 'BigBlindBets', hand.big_blind)
+    replayed = FeaturesPack(hand.players, 'BigBlindBets', hand.big_blind)
+    for street, actions in [(Street.PREFLOP, hand.preflop_actions), (Street.FLOP, hand.flop_actions),
+                            (Street.TURN, hand.turn_actions), (Street.RIVER, hand.river_actions)]:
+        pack.street_start(street)
+        replayed.street_start(street)
+        for action in actions:
+            snapshot = pack.snapshot()
+            # Immutable values only
+            hash(snapshot)
+            for branch in [ActionType.FOLD, ActionType.CALL, ActionType.RAISE]:
+                pack.collect_action(Action('BigBlindBets', branch, 10.))
+                pack.collect_action(Action('0Human0', ActionType.RAISE, 30.))
+                pack.street_start(Street.RIVER)
+                pack.restore(snapshot)
+                assert pack.collect_features() == replayed.collect_features()
+            pack.collect_action(action)
+            replayed.collect_action(action)
+    assert pack.collect_features() == replayed.collect_features()
+
+
+def test_incomplete_feature_is_not_registered():
+    class NoValueRaises(RaisesOfPlayer):
+        value = Feature.value
+
+    with pytest.raises(TypeError, match='value'):
+        register_feature('player_raises', NoValueRaises)
+    with pytest.raises(TypeError):
+        NoValueRaises('ab')
+    assert 'player_raises' not in FeaturesPack.features_names()
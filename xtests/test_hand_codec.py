@@ -0,0 +1,68 @@
+import os
+
+import pytest
+
+from feature_extractor import FeatureExtractor
+from hand import Hand, LazyHand
+from hand_codec import encode_hand, decode_hand, HandWriter, HandReader, read_hands
+from parser import Parser
+from xtests.examples import hand127, hand192510344085, hand204214924894, hand207718751903, hand228, hand5222, \
+    hand888
+
+
+texts = [hand127, hand192510344085, hand204214924894, hand207718751903, hand228, hand5222, hand888]
+
+
+def parse_hands(id_prefix='xx', hand_class=Hand):
+    return [hand_class(id_prefix, lines) for text in texts for lines in Parser.split_hands(text.split("\n"))]
+
+
+def assert_same_hand(decoded: Hand, hand: Hand):
+    assert decoded.hand_id == hand.hand_id and decoded.site_hand_id == hand.site_hand_id
+    assert decoded.header == hand.header and decoded.dialect is hand.dialect
+    assert decoded.content_hash == hand.content_hash
+    assert list(decoded.players.items()) == list(hand.players.items())
+    assert [p.player_cards for p in decoded.players.values()] == [p.player_cards for p in hand.players.values()]
+    assert (decoded.flop_cards, decoded.turn_cards, decoded.river_cards) == \
+           (hand.flop_cards, hand.turn_cards, hand.river_cards)
+    assert (decoded.preflop_actions, decoded.flop_actions, decoded.turn_actions, decoded.river_actions) == \
+           (hand.preflop_actions, hand.flop_actions, hand.turn_actions, hand.river_actions)
+    assert (decoded.total_pot, decoded.rake) == (hand.total_pot, hand.rake)
+    extractor = FeatureExtractor(hand.players)
+    assert repr(extractor.extract_features(decoded)) == repr(extractor.extract_features(hand))
+
+
+def test_encode_decode_hand():
+    for hand in parse_hands():
+        assert_same_hand(decode_hand(encode_hand(hand)), hand)
+    for hand in parse_hands(hand_class=LazyHand):
+        decoded = decode_hand(encode_hand(hand), LazyHand)
+        assert isinstance(decoded, LazyHand)
+        assert_same_hand(decoded, hand)
+
+
+def test_writer_and_reader(tmp_path):
+    hands = parse_hands()
+    path = str(tmp_path / 'hands.bin')
+    with HandWriter(path) as writer:
+        for hand in hands:
+            writer.write(hand)
+    assert len(writer) == len(hands)
+    assert sorted(os.listdir(tmp_path)) == ['hands.bin', 'hands.bin.idx']
+    assert os.path.getsize(path) < sum(map(len, texts)) / 2
+
+    with HandReader(path) as reader:
+        assert len(reader) == len(hands)
+        for decoded, hand in zip(reader, hands):
+            assert_same_hand(decoded, hand)
+        assert_same_hand(reader.hand(hands[3].hand_id), hands[3])
+        assert reader.hand('xx_1') is None
+    assert [hand.hand_id for hand in read_hands(str(tmp_path))] == [hand.hand_id for hand in hands]
+
+
+def test_writer_discards_unfinished_files(tmp_path):
+    with pytest.raises(ValueError):
+        with HandWriter(str(tmp_path / 'hands.bin')) as writer:
+            writer.write(parse_hands()[0])
+            raise ValueError("source failed")
+    assert os.listdir(tmp_path) == []
@@ -0,0 +1,29 @@
+from hand_index import HandIndex
+
+
+def test_hand_index_claims_each_hand_once(tmp_path):
+    index = HandIndex(str(tmp_path / 'hands.db'))
+    assert index.claim(['PokerStars_1', 'PokerStars_2'], 'a.zip:h1.txt') == {'PokerStars_1', 'PokerStars_2'}
+    assert index.claim(['PokerStars_2', 'PokerStars_3'], 'b.zip:h1.txt') == {'PokerStars_3'}
+    assert index.claim([], 'b.zip:h1.txt') == set()
+    index.close()
+
+    # A source parsed again after a crash keeps its hands
+    index = HandIndex(str(tmp_path / 'hands.db'))
+    assert index.claim(['PokerStars_1', 'PokerStars_2', 'PokerStars_3'], 'a.zip:h1.txt') == {'PokerStars_1',
+                                                                                              'PokerStars_2'}
+    assert len(index) == 3
+
+
+def test_parts_of_a_split_source(tmp_path):
+    index = HandIndex(str(tmp_path / 'hands.db'))
+    assert index.claim(['PokerStars_1', 'PokerStars_2'], 'h1.txt', 'run1', 0) == {'PokerStars_1', 'PokerStars_2'}
+    # A hand repeated in another part of the file belongs to the part which claimed it first
+    assert index.claim(['PokerStars_2', 'PokerStars_3'], 'h1.txt', 'run1', 100) == {'PokerStars_3'}
+    assert index.claim(['PokerStars_3'], 'h2.txt', 'run1', 0) == set()
+
+    # The next run splits the file differently and still gets all of its hands
+    assert index.claim(['PokerStars_1'], 'h1.txt', 'run2', 0) == {'PokerStars_1'}
+    assert index.claim(['PokerStars_2', 'PokerStars_3'], 'h1.txt', 'run2', 50) == {'PokerStars_2', 'PokerStars_3'}
+    assert index.claim(['PokerStars_1', 'PokerStars_2', 'PokerStars_3'], 'h1.txt') == {'PokerStars_1', 'PokerStars_2',
+                                                                                       'PokerStars_3'}
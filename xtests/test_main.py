@@ -0,0 +1,104 @@
+import os
+import zipfile
+
+import pyarrow.parquet as pq
+import pytest
+
+from hand_index import HandIndex
+from manifest import Manifest
+from main import parse_directory_impl
+from xtests.examples import hand127, hand192510344085, hand204214924894
+
+
+def make_input(tmp_path):
+    directory = tmp_path / 'input'
+    directory.mkdir()
+    with zipfile.ZipFile(directory / 'hands.zip', 'w') as zip_ref:
+        zip_ref.writestr('h1.txt', hand127 + "\n\n" + hand192510344085)
+        zip_ref.writestr('h2.txt', hand204214924894)
+    nicknames = tmp_path / 'nicknames.txt'
+    nicknames.write_text("ValeraBart\nBigBlindBets\n")
+    return str(directory), str(nicknames)
+
+
+def read_outputs(path):
+    return {name: (path / name).read_text() for name in sorted(os.listdir(path))}
+
+
+def test_extracted_files_keep_their_hands_across_runs(tmp_path):
+    directory, nicknames = make_input(tmp_path)
+    index_path = str(tmp_path / 'hands.db')
+    outputs = []
+    for run in range(2):
+        datasets_path = tmp_path / f'out{run}'
+        datasets_path.mkdir()
+        # Every run extracts into a new temporary directory, the hands are still owned by the same files
+        parse_directory_impl(directory, str(datasets_path), nicknames, processes=1, hand_index_path=index_path)
+        outputs.append(read_outputs(datasets_path))
+    assert outputs[0] and outputs[1] == outputs[0]
+    assert len(HandIndex(index_path)) > 0
+
+
+def test_extract_mode_records_outputs_in_manifest(tmp_path):
+    directory, nicknames = make_input(tmp_path)
+    archive = os.path.join(directory, 'hands.zip')
+    datasets_path = tmp_path / 'out'
+    datasets_path.mkdir()
+    manifest = Manifest(str(tmp_path / 'manifest.db'))
+    parse_directory_impl(directory, str(datasets_path), nicknames, manifest=manifest, processes=1)
+    assert manifest.is_archive_done(archive)
+    assert manifest.member_outputs(archive, 'h1.txt') == [str(datasets_path / 'handsh1.csv')]
+
+    # A changed archive is parsed again without outputs of its previous version
+    with zipfile.ZipFile(archive, 'w') as zip_ref:
+        zip_ref.writestr('h3.txt', hand204214924894)
+    os.utime(archive, ns=(1, 1))
+    parse_directory_impl(directory, str(datasets_path), nicknames, manifest=manifest, processes=1)
+    assert 'handsh1.csv' not in os.listdir(datasets_path)
+    assert manifest.is_archive_done(archive) and manifest.is_member_done(archive, 'h3.txt')
+
+
+def test_extract_mode_resumes_unfinished_archive(tmp_path):
+    directory, nicknames = make_input(tmp_path)
+    archive = os.path.join(directory, 'hands.zip')
+    datasets_path = tmp_path / 'out'
+    datasets_path.mkdir()
+    manifest = Manifest(str(tmp_path / 'manifest.db'))
+    # A run which crashed after h1.txt was parsed, h2.txt has no rows
+    manifest.start_archive(archive)
+    manifest.finish_member(archive, 'h1.txt', [str(datasets_path / 'handsh1.csv')])
+    parse_directory_impl(directory, str(datasets_path), nicknames, manifest=manifest, processes=1)
+    assert os.listdir(datasets_path) == []
+    assert manifest.is_archive_done(archive)
+
+
+def test_parquet_run_resumes_after_crash(tmp_path, monkeypatch):
+    directory, nicknames = make_input(tmp_path)
+    archive = os.path.join(directory, 'hands.zip')
+    expected_path = tmp_path / 'expected'
+    expected_path.mkdir()
+    parse_directory_impl(directory, str(expected_path), nicknames, output_format='parquet', processes=1)
+    expected = pq.read_table(str(expected_path)).num_rows
+    assert expected > 0
+
+    # The run crashes after its first chunk is committed, before the member is finished
+    datasets_path = tmp_path / 'out'
+    datasets_path.mkdir()
+    manifest = Manifest(str(tmp_path / 'manifest.db'))
+
+    def crash(*args):
+        raise RuntimeError("crash")
+
+    monkeypatch.setattr(Manifest, 'finish_member', crash)
+    with pytest.raises(RuntimeError):
+        parse_directory_impl(directory, str(datasets_path), nicknames, stream_zip=True, output_format='parquet',
+                             manifest=manifest, processes=1)
+    assert pq.read_table(str(datasets_path)).num_rows > 0
+    assert not manifest.is_member_done(archive, 'h1.txt') and not manifest.is_member_done(archive, 'h2.txt')
+    monkeypatch.undo()
+
+    # Committed parts of unfinished members are removed before they are parsed again
+    parse_directory_impl(directory, str(datasets_path), nicknames, stream_zip=True, output_format='parquet',
+                         manifest=manifest, processes=1)
+    assert manifest.is_archive_done(archive)
+    assert pq.read_table(str(datasets_path)).num_rows == expected
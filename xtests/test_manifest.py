@@ -0,0 +1,63 @@
+import os
+
+from manifest import Manifest
+
+
+def test_manifest_resume(tmp_path):
+    archive = tmp_path / 'a.zip'
+    archive.write_bytes(b'first')
+    manifest = Manifest(str(tmp_path / 'manifest.db'))
+
+    assert not manifest.is_archive_done(str(archive))
+    assert manifest.start_archive(str(archive)) == []
+    manifest.finish_member(str(archive), 'h1.txt', ['out/h1.csv'])
+    manifest.close()
+
+    # Crash before the archive was finished
+    manifest = Manifest(str(tmp_path / 'manifest.db'))
+    assert not manifest.is_archive_done(str(archive))
+    assert manifest.start_archive(str(archive)) == []
+    assert manifest.is_member_done(str(archive), 'h1.txt')
+    assert not manifest.is_member_done(str(archive), 'h2.txt')
+    assert manifest.member_outputs(str(archive), 'h1.txt') == ['out/h1.csv']
+    manifest.finish_member(str(archive), 'h2.txt', [])
+    manifest.finish_archive(str(archive))
+    assert manifest.is_archive_done(str(archive))
+
+
+def test_manifest_changed_archive(tmp_path):
+    archive = tmp_path / 'a.zip'
+    archive.write_bytes(b'first')
+    manifest = Manifest(str(tmp_path / 'manifest.db'))
+    manifest.start_archive(str(archive))
+    manifest.finish_member(str(archive), 'h1.txt', ['out/h1.csv'])
+    manifest.finish_archive(str(archive))
+
+    archive.write_bytes(b'second version')
+    os.utime(archive, ns=(1, 1))
+    assert not manifest.is_archive_done(str(archive))
+    assert manifest.start_archive(str(archive)) == ['out/h1.csv']
+    assert not manifest.is_member_done(str(archive), 'h1.txt')
+
+
+def test_manifest_unfinished_members(tmp_path):
+    archive = tmp_path / 'a.zip'
+    archive.write_bytes(b'first')
+    manifest = Manifest(str(tmp_path / 'manifest.db'))
+    manifest.start_archive(str(archive))
+    # h1 and h2 were written into the same part, h3 into its own, the part of h4 is not committed yet
+    manifest.add_member_outputs(str(archive), 'h1.txt', ['out/part-1'])
+    manifest.finish_member(str(archive), 'h1.txt', ['out/part-1'])
+    manifest.add_member_outputs(str(archive), 'h2.txt', ['out/part-1'])
+    manifest.add_member_outputs(str(archive), 'h2.txt', ['out/part-2'])
+    manifest.finish_member(str(archive), 'h3.txt', ['out/part-3'])
+    manifest.add_member_outputs(str(archive), 'h4.txt', ['out/part-4'])
+    assert not manifest.is_member_done(str(archive), 'h2.txt')
+    assert manifest.member_outputs(str(archive), 'h2.txt') == ['out/part-1', 'out/part-2']
+    manifest.close()
+
+    # Resumed after a crash, h1 lost its rows together with h2
+    manifest = Manifest(str(tmp_path / 'manifest.db'))
+    assert manifest.start_archive(str(archive)) == ['out/part-1', 'out/part-2', 'out/part-4']
+    assert [manifest.is_member_done(str(archive), f'h{i}.txt') for i in range(1, 5)] == [False, False, True, False]
+    assert manifest.start_archive(str(archive)) == []
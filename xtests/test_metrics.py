@@ -0,0 +1,29 @@
+import json
+
+from metrics import Metrics, MetricsReport
+
+
+def test_metrics_merge_and_report(tmp_path):
+    first = Metrics()
+    first.count('hands_split', 3)
+    first.count('hands_rejected.filtered')
+    assert list(first.timed(iter([1, 2, 3]), 'read')) == [1, 2, 3]
+    with first.timer('extract'):
+        pass
+    second = Metrics()
+    second.count('hands_split', 2)
+    second.count('rows', 7)
+
+    report = MetricsReport()
+    report.add('worker-1', first)
+    report.add('worker-2', second)
+    report.add('worker-2', second)
+    assert report.total.counters == {'hands_split': 7, 'hands_rejected.filtered': 1, 'rows': 14}
+    assert set(report.total.stage_shares()) == {'read', 'extract'}
+
+    report.write(str(tmp_path / 'metrics.json'))
+    with open(tmp_path / 'metrics.json') as fin:
+        data = json.load(fin)
+    assert data['total']['counters']['rows'] == 14
+    assert data['workers']['worker-2']['counters'] == {'hands_split': 4, 'rows': 14}
+    assert set(data['rates']) == {'mb_per_second', 'hands_per_second', 'rows_per_second'}
@@ -1,8 +1,17 @@
+import datetime
+import io
+
+import pytest
+
 from action import Action
 from core.card import Card
 from core.types import GameType, ActionType
-from hand import Hand
-from xtests.examples import hand228, hand127, hand5222, hand192510344085, hand204214924894, hand207718751903
+from dialect import Dialect, PokerStarsDialect, detect_dialect
+from hand import Hand, LazyHand, parse_action
+from parser import Parser
+from player import Player
+from xtests.examples import hand228, hand127, hand5222, hand192510344085, hand204214924894, hand207718751903, \
+    hand888
 
 
 def test_parser_hand199880364584(parser):
@@ -302,4 +311,122 @@ def test_parser_hand207718751903(parser):
     # Check river actions
     assert hand.river_actions == [Action('Stefan11222', ActionType.CHECK),
                                   Action('MMAsherdog', ActionType.BET, 5553.72),
-                                  Action('Stefan11222', ActionType.CALL, 5553.72)]
\ No newline at end of file
+                                  Action('Stefan11222', ActionType.CALL, 5553.72)]
+
+
+def test_iter_hands_streams_hands_one_by_one(parser):
+    fileobj = io.StringIO(hand228 + "\n\n" + hand127 + "\n\n" + hand228)
+    hands = parser.iter_hands(fileobj, 'xx')
+    assert next(hands).hand_id == 'xx_199880364584'
+    assert next(hands).hand_id == 'xx_199880482022'
+    assert next(hands).hand_id == 'xx_199880364584'
+    assert next(hands, None) is None
+    assert parser.bad_hands == 0
+    assert parser.hands == {}
+
+
+def test_iter_hands_skips_bad_hands(parser):
+    broken = "PokerStars Hand #1:  Hold'em No Limit ($0.01/$0.02 USD) - 2019/04/30 22:46:38 ET\nTable 'x'\n"
+    fileobj = io.StringIO(broken + hand127)
+    assert [h.hand_id for h in parser.iter_hands(fileobj, 'xx')] == ['xx_199880482022']
+    assert parser.bad_hands == 1
+    assert parser.total_hands == 2
+    assert sum(parser.bad_hand_reasons.values()) == 1
+
+
+@pytest.mark.parametrize(
+    "line, expected",
+    [("AIvers2: folds ", Action('AIvers2', ActionType.FOLD)),
+     ("cryingkevin: checks ", Action('cryingkevin', ActionType.CHECK)),
+     ("cryingkevin: calls $3.30", Action('cryingkevin', ActionType.CALL, 3.3)),
+     ("sauloCosta10: bets $3.02", Action('sauloCosta10', ActionType.BET, 3.02)),
+     ("sauloCosta10: raises $2.30 to $4.30", Action('sauloCosta10', ActionType.RAISE, 4.3)),
+     ("Stefan11222: raises 950 to 1200 and is all-in", Action('Stefan11222', ActionType.RAISE, 1200.)),
+     ("Uncalled bet ($3) returned to VilelaVictor", None),
+     ("VilelaVictor: doesn't show hand ", None)],
+)
+def test_parse_action(line, expected):
+    assert parse_action(line) == expected
+
+
+def test_lazy_hand_parses_on_access():
+    lines = list(Parser.split_hands(hand127.split("\n")))[0]
+    hand = LazyHand('xx', lines)
+    assert hand.hand_id == 'xx_199880482022'
+    assert hand.game_type == GameType.HOLDEM_NO_LIMIT
+    assert hand.players_count == 6
+    assert hand.total_pot == 48.26
+    assert hand.players['cryingkevin'].player_cards == [Card('C', '6'), Card('D', '9')]
+    assert hand.river_actions == [Action('cryingkevin', ActionType.BET, 15.81),
+                                  Action('sauloCosta10', ActionType.CALL, 15.81)]
+    assert hand.preflop_actions == Hand('xx', lines).preflop_actions
+
+
+def test_lazy_hand_defers_errors():
+    lines = list(Parser.split_hands(hand127.split("\n")))[0]
+    lines = [line for line in lines if not line.startswith('cpatras1: posts big blind')]
+    hand = LazyHand('xx', lines)
+    assert hand.game_type == GameType.HOLDEM_NO_LIMIT
+    with pytest.raises(Exception):
+        hand.preflop_actions
+
+
+def test_hand_actions_share_one_log():
+    lines = list(Parser.split_hands(hand228.split("\n")))[0]
+    hand = Hand('xx', lines)
+    log = hand.actions
+    assert len(log) == sum(len(a) for a in (hand.preflop_actions, hand.flop_actions,
+                                            hand.turn_actions, hand.river_actions))
+    assert list(log.view()) == hand.preflop_actions[:] + hand.flop_actions[:] \
+        + hand.turn_actions[:] + hand.river_actions[:]
+    assert hand.preflop_actions[-1] == hand.preflop_actions[len(hand.preflop_actions) - 1]
+    assert len(log.players) == len(set(log.players))
+
+
+def test_parser_hand888(parser):
+    fileobj = io.StringIO(hand888 + "\n\n" + hand888.replace('1010101010', '1010101011'))
+    hands = list(parser.iter_hands(fileobj, 'xx'))
+    assert [h.hand_id for h in hands] == ['xx_1010101010', 'xx_1010101011']
+    hand = hands[0]
+    assert hand.site == '888poker'
+    assert hand.date == datetime.date(2019, 9, 13)
+    assert hand.game_type == GameType.HOLDEM_NO_LIMIT
+    assert hand.small_blind == 0.05
+    assert hand.big_blind == 0.1
+    assert hand.players_count == 5
+    assert hand.players['AcceptMe77'] == Player(6, 'AcceptMe77', 4.12)
+    assert hand.players['ValeraBart'].player_cards == [Card('C', '7'), Card('D', '8')]
+    assert hand.players['AcceptMe77'].player_cards == [Card('D', 'K'), Card('S', '5')]
+    assert hand.total_pot == 5.37
+    assert hand.rake == 0
+    assert hand.flop_cards == [Card('H', '2'), Card('D', '5'), Card('C', 'K')]
+    assert hand.turn_cards == hand.flop_cards + [Card('S', '9')]
+    assert hand.river_cards == hand.turn_cards + [Card('C', '4')]
+    # Raises are converted to the total amount like on PokerStars
+    assert hand.preflop_actions == [Action('rodito_139', ActionType.SMALLBLIND, 0.05),
+                                    Action('AcceptMe77', ActionType.BIGBLIND, 0.1),
+                                    Action('ValeraBart', ActionType.RAISE, 0.3),
+                                    Action('Tigriana', ActionType.FOLD),
+                                    Action('cpatras1', ActionType.FOLD),
+                                    Action('rodito_139', ActionType.FOLD),
+                                    Action('AcceptMe77', ActionType.CALL, 0.2)]
+    assert hand.flop_actions == [Action('AcceptMe77', ActionType.CHECK),
+                                 Action('ValeraBart', ActionType.BET, 0.35),
+                                 Action('AcceptMe77', ActionType.RAISE, 1.),
+                                 Action('ValeraBart', ActionType.CALL, 0.65)]
+    assert hand.river_actions == [Action('AcceptMe77', ActionType.BET, 1.5),
+                                  Action('ValeraBart', ActionType.CALL, 1.5)]
+
+
+def test_detect_dialect():
+    assert detect_dialect(hand888.split("\n")[0]).name == '888poker'
+    assert detect_dialect(hand192510344085.split("\n")[0]).name == 'PokerStars'
+    assert detect_dialect("Hand #228") is None
+
+
+def test_incomplete_dialect_fails_on_creation():
+    class NoSummaryDialect(PokerStarsDialect):
+        parse_summary = Dialect.parse_summary
+
+    with pytest.raises(TypeError):
+        NoSummaryDialect()
@@ -0,0 +1,98 @@
+import datetime
+import math
+
+from feature_extractor import FeatureExtractor
+from hand import Hand
+from parser import Parser
+from player_stats import PlayerStats, PlayerStatsDelta, hand_counters, stats_counters
+from xtests.examples import hand127, hand207718751903
+
+
+def parse_hand(text):
+    return Hand('xx', list(Parser.split_hands(text.split("\n")))[0])
+
+
+def named(counts):
+    return {name: value for name, value in zip(stats_counters, counts) if value}
+
+
+def test_hand_counters():
+    counters = hand_counters(parse_hand(hand207718751903))
+    # Open raise, 3-bet by the small blind, c-bet called, bet and call on the river
+    assert named(counters['MMAsherdog']) == {'hands': 1, 'vpip': 1, 'pfr': 1, 'fold_to_cbet_chances': 1,
+                                             'aggressive': 1, 'passive': 2}
+    assert named(counters['Stefan11222']) == {'hands': 1, 'vpip': 1, 'pfr': 1, 'three_bet_chances': 1,
+                                              'three_bets': 1, 'cbet_chances': 1, 'cbets': 1, 'aggressive': 2,
+                                              'passive': 1}
+    assert named(counters['ga207']) == {'hands': 1}
+    assert named(counters['0Human0']) == {'hands': 1}
+
+    counters = hand_counters(parse_hand(hand127))
+    assert named(counters['ValeraBart']) == {'hands': 1, 'three_bet_chances': 1}
+    assert named(counters['cryingkevin']) == {'hands': 1, 'vpip': 1, 'three_bet_chances': 1,
+                                              'fold_to_cbet_chances': 1, 'aggressive': 1, 'passive': 1}
+    assert named(counters['sauloCosta10']) == {'hands': 1, 'vpip': 1, 'pfr': 1, 'cbet_chances': 1, 'cbets': 1,
+                                               'aggressive': 1, 'passive': 1}
+
+
+def test_player_stats_are_point_in_time(tmp_path):
+    hand = parse_hand(hand207718751903)
+    stats = PlayerStats(str(tmp_path / 'stats.db'))
+    delta = PlayerStatsDelta()
+    delta.add_hand(hand)
+    delta.add_hand(parse_hand(hand207718751903.replace('207718751903', '207718751904')))
+    other = PlayerStatsDelta()
+    other.add_hand(parse_hand(hand207718751903.replace('207718751903', '207718751905')))
+    assert stats.add(delta) == 2
+    assert stats.add(other) == 1
+    assert len(stats) == 4
+
+    day = hand.date
+    assert stats.counters('Stefan11222', day) == (0,) * len(stats_counters)
+    assert stats.counters('Stefan11222', day + datetime.timedelta(days=1)) == (3, 3, 3, 3, 3, 3, 3, 0, 0, 6, 3)
+    assert stats.counters('unknown', day + datetime.timedelta(days=1)) == (0,) * len(stats_counters)
+    stats.close()
+
+    # Counters persist and opponents are pooled
+    stats = PlayerStats(str(tmp_path / 'stats.db'))
+    hands, vpip, pfr, three_bet, cbet, fold_to_cbet, aggression = stats.features(
+        ['Stefan11222', 'ga207'], day + datetime.timedelta(days=1))
+    assert (hands, vpip, pfr, three_bet, cbet, aggression) == (6, 0.5, 0.5, 1.0, 1.0, 2.0)
+    assert math.isnan(fold_to_cbet)
+    assert stats.features(['Stefan11222'], day)[0] == 0
+    assert all(math.isnan(value) for value in stats.features(['Stefan11222'], None)[1:])
+
+
+def test_hands_are_counted_once(tmp_path):
+    hand = parse_hand(hand207718751903)
+    stats = PlayerStats(str(tmp_path / 'stats.db'))
+    delta = PlayerStatsDelta()
+    delta.add_hand(hand)
+    delta.add_hand(parse_hand(hand207718751903))
+    assert len(delta) == 1
+    assert stats.add(delta) == 1
+    stats.close()
+
+    # A re-run adds the same hands again
+    stats = PlayerStats(str(tmp_path / 'stats.db'))
+    assert stats.add(delta) == 0
+    assert stats.counters('Stefan11222', hand.date + datetime.timedelta(days=1)) == (1, 1, 1, 1, 1, 1, 1, 0, 0, 2, 1)
+
+
+def test_extractor_appends_opponents_stats(tmp_path):
+    stats = PlayerStats(str(tmp_path / 'stats.db'))
+    delta = PlayerStatsDelta()
+    hand = parse_hand(hand207718751903)
+    delta.add_hand(hand)
+    # The same hand a day later sees the statistics of the first one
+    stats.add(delta)
+    later = parse_hand(hand207718751903.replace('2020/01/01', '2020/01/02'))
+    rows = FeatureExtractor(['MMAsherdog'], stats).extract_features(later)
+    plain = FeatureExtractor(['MMAsherdog']).extract_features(later)
+    names = FeatureExtractor.features_names(player_stats=True)
+    assert len(names) == len(FeatureExtractor.features_names()) + len(PlayerStats.features_names())
+    assert len(rows) == len(plain) and all(len(row) == len(names) for row in rows)
+    assert [row[:len(plain[0])] for row in rows] == plain
+    assert rows[0][len(plain[0]):len(plain[0]) + 3] == [3, 1 / 3, 1 / 3]
+    assert FeatureExtractor(['MMAsherdog'], stats).extract_features_batch([later]) == [rows]
+    assert FeatureExtractor(['MMAsherdog'], stats).extract_features(hand)[0][len(plain[0])] == 0
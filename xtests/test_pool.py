@@ -0,0 +1,133 @@
+import csv
+import io
+import os
+
+from feature_extractor import FeatureExtractor
+from hand import Hand, LazyHand
+from hand_codec import read_hands
+from hand_index import HandIndex
+from parser import Parser
+from pool import WorkItem, make_chunks, unique_hands, parse_items, split_large_items, chunk_target
+from xtests.examples import hand228, hand127, hand192510344085, hand204214924894, hand207718751903, hand888
+
+
+def test_make_chunks_balances_by_size():
+    items = [WorkItem(f'a.zip', f'{i}.txt', 'a', size) for i, size in enumerate([50, 10, 10, 10, 10, 5, 5])] + \
+            [WorkItem(f'b.zip', '0.txt', 'b', 20)]
+    chunks = make_chunks(items, processes=2, chunks_per_process=2)
+    assert sorted(item for chunk in chunks for item in chunk) == sorted(items)
+    assert chunks[0] == [items[0]]
+    assert [sum(item.size for item in chunk) for chunk in chunks] == [50, 30, 20, 20]
+    # Items from different archives are never mixed
+    assert all(len({item.dir for item in chunk}) == 1 for chunk in chunks)
+
+
+def test_make_chunks_groups_by_archive():
+    # Archives with the same directory name and files extracted from two archives
+    items = [WorkItem('1.zip', '0.txt', '1', 10), WorkItem('1.zip', '1.txt', '1', 10),
+             WorkItem('zip1.zip', '0.txt', '1', 10),
+             WorkItem('/tmp/x/a/0.txt', None, 'a', 10, archive='a.zip'),
+             WorkItem('/tmp/y/a/0.txt', None, 'a', 10, archive='../a.zip')]
+    chunks = make_chunks(items, processes=1, chunks_per_process=1)
+    assert sorted(map(sorted, chunks)) == sorted([items[:2], [items[2]], [items[3]], [items[4]]])
+
+
+def test_unique_hands_across_files(tmp_path):
+    index = HandIndex(str(tmp_path / 'hands.db'))
+    text = hand228 + "\n\n" + hand127 + "\n\n" + hand228
+    first = list(unique_hands(Parser(LazyHand).iter_hands(text.split("\n"), 'a'), 'a.zip:1.txt', index, 1))
+    assert [hand.hand_id for hand in first] == ['a_199880364584', 'a_199880482022']
+    second = list(unique_hands(Parser(LazyHand).iter_hands(hand127.split("\n"), 'b'), 'b.zip:1.txt', index))
+    assert second == []
+    without_index = list(unique_hands(Parser(LazyHand).iter_hands(hand127.split("\n"), 'b'), 'b.zip:1.txt'))
+    assert len(without_index) == 1
+
+
+def test_parse_items_matches_serial_extractor(tmp_path):
+    nicknames = frozenset(['ValeraBart', 'BigBlindBets', '0Human0', 'MMAsherdog'])
+    files = {'h1.txt': [hand127, hand192510344085], 'h2.txt': [hand204214924894, hand207718751903],
+             'h3.txt': [hand888, hand228]}
+    (tmp_path / 'a').mkdir()
+    items = []
+    for name, texts in files.items():
+        path = tmp_path / 'a' / name
+        path.write_text("\n\n".join(texts))
+        items.append(WorkItem(str(path), None, 'a', os.path.getsize(path)))
+    datasets_path = tmp_path / 'out'
+    datasets_path.mkdir()
+    parse_items(items, nicknames, str(datasets_path), processes=2)
+
+    extractor = FeatureExtractor(nicknames)
+    expected = {}
+    for name, texts in files.items():
+        rows = [row for hand in Parser(Hand).iter_hands("\n\n".join(texts).split("\n"), 'a')
+                for row in extractor.extract_features(hand)]
+        if rows:
+            out = io.StringIO(newline='')
+            writer = csv.writer(out)
+            writer.writerow(FeatureExtractor.features_names())
+            writer.writerows(rows)
+            expected['a' + name[:-4] + '.csv'] = out.getvalue()
+    assert len(expected) >= 2
+
+    def lines(text):
+        # Parts of a split file are appended in the order their chunks finish
+        header, *rows = text.splitlines()
+        return header, sorted(rows)
+
+    assert {name: lines((datasets_path / name).read_bytes().decode()) for name in os.listdir(datasets_path)} == \
+           {name: lines(text) for name, text in expected.items()}
+
+
+def test_parse_items_opponents_stats_are_deterministic(tmp_path):
+    nicknames = frozenset(['MMAsherdog'])
+    later = hand207718751903.replace('2020/01/01', '2020/01/02').replace('207718751903', '207718751904')
+    files = {'h1.txt': [hand207718751903, hand127], 'h2.txt': [later, hand207718751903], 'h3.txt': [later]}
+    (tmp_path / 'a').mkdir()
+    items = []
+    for name, texts in files.items():
+        path = tmp_path / 'a' / name
+        path.write_text("\n\n".join(texts))
+        items.append(WorkItem(str(path), None, 'a', os.path.getsize(path)))
+
+    def run(name, stats_name, processes):
+        datasets_path = tmp_path / name
+        datasets_path.mkdir()
+        parse_items(items, nicknames, str(datasets_path), processes=processes,
+                    stats_path=str(tmp_path / stats_name))
+        # Parts of a split file are appended in the order their chunks finish
+        return {name: sorted(csv.reader(io.StringIO((datasets_path / name).read_bytes().decode())))
+                for name in os.listdir(datasets_path)}
+
+    outputs = run('out1', 'stats1.db', 1)
+    # The later hand sees the earlier one once, however often it was exported
+    header, *rows = csv.reader(io.StringIO((tmp_path / 'out1' / 'ah3.csv').read_bytes().decode()))
+    assert rows and all(row[header.index('opponents_hands')] == '3' for row in rows)
+    assert outputs == run('out2', 'stats2.db', 3)
+    # A re-run doesn't count the hands again
+    assert outputs == run('out3', 'stats1.db', 2)
+
+
+def test_resumed_run_splits_file_differently(tmp_path):
+    nicknames = frozenset(['MMAsherdog'])
+    texts = [hand207718751903.replace('207718751903', f"2077187519{i:02d}") for i in range(10, 40)]
+    path = tmp_path / 'h1.txt'
+    path.write_text("\n\n".join(texts))
+    items = [WorkItem(str(path), None, 'a', os.path.getsize(path))]
+    assert split_large_items(items, chunk_target(items, 1)) != split_large_items(items, chunk_target(items, 3))
+
+    def run(name, processes, **kwargs):
+        datasets_path = tmp_path / name
+        datasets_path.mkdir()
+        parse_items(items, nicknames, str(datasets_path), processes=processes, **kwargs)
+        # Parts of a split file are appended in the order their chunks finish
+        return sorted(csv.reader(io.StringIO((datasets_path / 'ah1.csv').read_bytes().decode())))
+
+    expected = run('out', 1)
+    hand_index_path, hands_path = str(tmp_path / 'index.db'), tmp_path / 'hands'
+    assert run('out1', 1, hand_index_path=hand_index_path, hands_path=str(hands_path)) == expected
+    # Parsed again split at other offsets against the same index, every hand is kept
+    assert run('out2', 3, hand_index_path=hand_index_path, hands_path=str(hands_path)) == expected
+    assert len({row[0] for row in expected}) == len(texts) + 1
+    # Binary parts of the first split are removed
+    assert sorted(hand.hand_id for hand in read_hands(str(hands_path))) == sorted({row[0] for row in expected[:-1]})
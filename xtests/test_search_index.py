@@ -0,0 +1,40 @@
+from feature_extractor import FeatureExtractor
+from hand import Hand
+from parser import Parser
+from search_index import SearchIndex
+from xtests.examples import hand127, hand5222, hand204214924894, hand207718751903
+
+
+def build_index(path, hands):
+    index = SearchIndex(path)
+    entries = []
+    for text in hands:
+        for lines in Parser.split_hands(text.split("\n")):
+            entries.append(SearchIndex.entry(Hand('xx', lines), lines, 'xx'))
+    index.add(entries)
+    return index
+
+
+def test_search_index_queries(tmp_path):
+    index = build_index(str(tmp_path / 'index.db'), [hand127, hand5222, hand204214924894, hand207718751903])
+    assert len(index) == 4
+    assert index.hand_ids(player='ValeraBart') == ['xx_199880482022', 'xx_195114127680']
+    assert index.hand_ids(player='ValeraBart', flop_suits='rainbow') == ['xx_195114127680']
+    assert index.hand_ids(preflop_3bet='Stefan11222') == ['xx_207718751903']
+    assert index.hand_ids(preflop='RRC', button='MMAsherdog') == ['xx_207718751903']
+    assert index.hand_ids(flop_pairing='paired', flop_ranks='J66') == ['xx_204214924894']
+    assert index.hand_ids(preflop_3bet='Stefan11222', flop_suits='monotone') == []
+    assert len(index.hand_ids()) == 4
+
+
+def test_search_index_returns_hands_and_features(tmp_path):
+    index = build_index(str(tmp_path / 'index.db'), [hand127, hand207718751903])
+    # Hands already in the index are not added twice
+    assert index.add([SearchIndex.entry(Hand('yy', lines), lines, 'yy')
+                      for lines in Parser.split_hands(hand127.split("\n"))]) == 0
+    hand, = index.hands(player='MMAsherdog')
+    expected = Hand('xx', list(Parser.split_hands(hand207718751903.split("\n")))[0])
+    assert hand.hand_id == expected.hand_id
+    assert hand.river_actions == expected.river_actions
+    rows = list(index.features(['MMAsherdog'], player='MMAsherdog'))
+    assert rows == FeatureExtractor(['MMAsherdog']).extract_features(expected)
@@ -0,0 +1,75 @@
+import pyarrow.parquet as pq
+
+from feature_extractor import FeatureExtractor
+from sink import CsvSink, ParquetSink, FeatureBatch, partition_path
+from xtests.examples import hand192510344085, hand204214924894
+
+
+def parse_hand(parser, text):
+    return next(parser.iter_hands(text.split("\n"), 'xx'))
+
+
+def test_partition_path(parser):
+    hand = parse_hand(parser, hand204214924894)
+    assert partition_path(hand) == 'site=PokerStars/stakes=0.05-0.1/month=2019-09'
+
+
+def test_feature_batch(parser):
+    hand = parse_hand(parser, hand192510344085)
+    rows = FeatureExtractor(['BigBlindBets', '0Human0']).extract_features(hand)
+    batch = FeatureBatch()
+    batch.extend(rows[:1])
+    other = FeatureBatch()
+    other.extend(rows[1:])
+    batch.merge(other)
+    assert len(batch) == len(rows)
+    assert list(batch.rows()) == rows
+
+
+def test_feature_batch_mixed_types():
+    rows = [['a', 1, 1, 1.5], ['b', 2.5, None, 'x'], ['c', 3, 'y', 2]]
+    batch = FeatureBatch()
+    batch.extend(rows)
+    assert list(batch.rows()) == [['a', 1, 1, 1.5], ['b', 2.5, None, 'x'], ['c', 3, 'y', 2]]
+    typed = FeatureBatch()
+    typed.extend([['d', 4, 4, 4.5]])
+    other = FeatureBatch()
+    other.extend(rows[1:])
+    typed.merge(other)
+    assert list(typed.rows()) == [['d', 4, 4, 4.5]] + rows[1:]
+
+
+def test_csv_sink_skips_empty_files(parser, tmp_path):
+    hand = parse_hand(parser, hand192510344085)
+    with CsvSink(str(tmp_path)) as sink:
+        sink.write(CsvSink.partition(hand, 'empty.txt'), [])
+    assert not (tmp_path / 'empty.csv').exists()
+
+
+def test_csv_sink_appends_later_commits(parser, tmp_path):
+    hand = parse_hand(parser, hand192510344085)
+    rows = FeatureExtractor(['BigBlindBets']).extract_features(hand)
+    with CsvSink(str(tmp_path)) as sink:
+        sink.write('h1.csv', rows)
+        assert sink.commit() == [str(tmp_path / 'h1.csv')]
+        sink.write('h1.csv', rows)
+    lines = (tmp_path / 'h1.csv').read_text().splitlines()
+    assert len(lines) == 1 + 2 * len(rows)
+    assert lines[0].startswith('hand_id,')
+
+
+def test_parquet_sink(parser, tmp_path):
+    hand = parse_hand(parser, hand192510344085)
+    rows = FeatureExtractor(['BigBlindBets', '0Human0']).extract_features(hand)
+    with ParquetSink(str(tmp_path), row_group_size=3) as sink:
+        for row in rows:
+            sink.write(ParquetSink.partition(hand, 'source.txt'), [row])
+
+    files = list(tmp_path.glob('site=PokerStars/stakes=50-100/month=2018-10/*.parquet'))
+    assert len(files) == 1
+    table = pq.read_table(files[0])
+    assert table.num_rows == len(rows)
+    assert pq.ParquetFile(files[0]).metadata.num_row_groups == 2
+    assert table.column_names == FeatureExtractor.features_names()
+    assert table.column('street').to_pylist() == [row[2] for row in rows]
+    assert table.column('player_bet_size').to_pylist() == [row[4] for row in rows]
@@ -0,0 +1,57 @@
+from hand import Hand
+from parser import Parser
+from pool import WorkItem, open_item, split_large_items
+from splitter import Span, find_hand_prefix, split_spans, split_file
+from xtests.examples import hand228, hand127, hand192510344085, hand888
+
+text = '﻿' + hand228 + "\r\n\r\n" + hand127 + "\r\n\r\n" + hand192510344085.replace('\n', '\r\n') + "\n"
+data = text.encode('utf-8')
+
+
+def hand_ids(lines):
+    return [Hand('xx', hand_lines).hand_id for hand_lines in Parser.split_hands(lines)]
+
+
+def test_find_hand_prefix():
+    assert find_hand_prefix(data) == b'PokerStars '
+    assert find_hand_prefix(hand888.encode()) == b'#Game No : '
+    assert find_hand_prefix(hand228.encode('utf-16')) is None
+
+
+def test_split_spans():
+    prefix = find_hand_prefix(data)
+    assert split_spans(data, prefix, len(data)) == [(0, len(data))]
+    # Pieces of one byte end on every hand start, the separator line before the first hand is a piece too
+    spans = split_spans(data, prefix, 1)
+    assert len(spans) == 4
+    assert sum(length for offset, length in spans) == len(data)
+    assert all(data[offset:].startswith(prefix) for offset, length in spans[1:])
+    assert [hand_ids(Span(data, offset, length).read().decode('utf-8-sig').splitlines())
+            for offset, length in spans] == [[], ['xx_199880364584'], ['xx_199880482022'], ['xx_192510344085']]
+    spans = split_spans(data, prefix, len(data) // 2)
+    assert len(spans) == 2
+    pieces = [Span(data, offset, length).read().decode('utf-8-sig') for offset, length in spans]
+    assert [i for piece in pieces for i in hand_ids(piece.splitlines())] == hand_ids(text.splitlines())
+
+
+def test_split_file(tmp_path):
+    path = tmp_path / 'h1.txt'
+    path.write_bytes(data)
+    assert split_file(str(path), 1) == split_spans(data, b'PokerStars ', 1)
+    path.write_bytes(hand228.encode('utf-16'))
+    assert split_file(str(path), 1) == [(0, len(hand228.encode('utf-16')))]
+
+
+def test_split_large_items(tmp_path):
+    path = tmp_path / 'h1.txt'
+    path.write_bytes(data)
+    item = WorkItem(str(path), None, 'a', len(data))
+    assert split_large_items([item], len(data)) == [item]
+    items = split_large_items([item], 1)
+    assert len(items) == 4
+    assert sum(i.size for i in items) == len(data)
+    parsed = []
+    for piece in items:
+        with open_item(piece) as lines:
+            parsed.extend(hand_ids(lines))
+    assert parsed == ['xx_199880364584', 'xx_199880482022', 'xx_192510344085']